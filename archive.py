@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+import struct
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from gamma_client import GammaClient
+from market_snapshot import MarketSnapshot
+
+# ================== НАСТРОЙКИ ==================
+
+ARCHIVE_DIR = "archive"
+INTERVAL_SECONDS = 15 * 60
+CONCURRENCY = 4          # одновременных пакетных запросов к Gamma
+BATCH_SIZE = 50          # slug-ов в одном запросе
+SYNC_EVERY = 20          # fsync каждые N пакетов
+
+# ========== ФОРМАТ АРХИВА ==========
+#
+# Один файл на монету, записи фиксированной длины 80 байт, по одной на
+# каждый 15-минутный интервал подряд, без пропусков:
+#   timestamp  uint32   начало интервала (slug {coin}-updown-15m-{timestamp})
+#   outcome    int8     +1 Up, -1 Down, 0 неизвестно
+#   status     uint8    0 рынок не найден, 1 не разрешен, 2 разрешен
+#   (2 байта выравнивания)
+#   up_price   float32  итоговые outcomePrices
+#   down_price float32
+#   up_token   32 байта clobTokenIds[0] (uint256, big-endian)
+#   down_token 32 байта clobTokenIds[1]
+# Запись i относится к интервалу first_timestamp + i * 900, поэтому файл
+# можно открыть через mmap/numpy.memmap и читать без разбора JSON.
+
+RECORD = struct.Struct("<IbBxxff32s32s")
+RECORD_SIZE = RECORD.size
+
+STATUS_MISSING = 0
+STATUS_UNRESOLVED = 1
+STATUS_RESOLVED = 2
+
+def archive_path(coin, directory=ARCHIVE_DIR):
+    return os.path.join(directory, f"{coin.lower()}-updown-15m.bin")
+
+def numpy_dtype():
+    import numpy as np
+    return np.dtype([
+        ("timestamp", "<u4"),
+        ("outcome", "i1"),
+        ("status", "u1"),
+        ("pad", "V2"),
+        ("up_price", "<f4"),
+        ("down_price", "<f4"),
+        ("up_token", "S32"),
+        ("down_token", "S32")
+    ])
+
+def token_bytes(token_id):
+    try:
+        return int(token_id).to_bytes(32, "big")
+    except (TypeError, ValueError, OverflowError):
+        return bytes(32)
+
+def token_id(raw):
+    value = int.from_bytes(raw, "big")
+    return str(value) if value else None
+
+def pack_market(timestamp, market):
+    """Запись архива для рынка (словарь Gamma или MarketSnapshot, None - рынок не найден)"""
+    if market is None:
+        return RECORD.pack(timestamp, 0, STATUS_MISSING, 0.0, 0.0, bytes(32), bytes(32))
+    if not isinstance(market, MarketSnapshot):
+        market = MarketSnapshot.from_market(market)
+
+    if market.final:
+        status = STATUS_RESOLVED
+        outcome = 1 if market.up_price > market.down_price else -1
+    else:
+        status = STATUS_UNRESOLVED
+        outcome = 0
+    return RECORD.pack(timestamp, outcome, status, market.up_price, market.down_price,
+                       token_bytes(market.up_token), token_bytes(market.down_token))
+
+# ========== ЧТЕНИЕ ==========
+
+def iter_records(path):
+    """Записи архива без numpy: (timestamp, outcome, status, up, down, up_token, down_token)"""
+    with open(path, "rb") as f:
+        while True:
+            raw = f.read(RECORD_SIZE)
+            if len(raw) < RECORD_SIZE:
+                return
+            yield RECORD.unpack(raw)
+
+def read_archive(path):
+    """Архив как numpy.memmap структурированных записей (только чтение)"""
+    import numpy as np
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=numpy_dtype())
+    return np.memmap(path, dtype=numpy_dtype(), mode="r")
+
+def last_record(path):
+    size = os.path.getsize(path)
+    if size < RECORD_SIZE:
+        return None
+    with open(path, "rb") as f:
+        f.seek(size - size % RECORD_SIZE - RECORD_SIZE)
+        return RECORD.unpack(f.read(RECORD_SIZE))
+
+# ========== ЗАГРУЗКА ==========
+
+def resume_point(path):
+    """Timestamp, с которого продолжать, после обрезки хвоста.
+
+    Недописанная запись и неразрешенные рынки в конце файла удаляются -
+    они будут запрошены заново.
+    """
+    if not os.path.exists(path):
+        return None
+    size = os.path.getsize(path)
+    keep = size - size % RECORD_SIZE
+    with open(path, "r+b") as f:
+        while keep >= RECORD_SIZE:
+            f.seek(keep - RECORD_SIZE)
+            record = RECORD.unpack(f.read(RECORD_SIZE))
+            if record[2] != STATUS_UNRESOLVED:
+                break
+            keep -= RECORD_SIZE
+        f.truncate(keep)
+    record = last_record(path)
+    return record[0] + INTERVAL_SECONDS if record else None
+
+def download(coin, start_ts, end_ts, directory=ARCHIVE_DIR, gamma=None, concurrency=CONCURRENCY):
+    """Скачивает интервалы [start_ts, end_ts) монеты в архив, продолжая с места остановки"""
+    gamma = gamma or GammaClient()
+    os.makedirs(directory, exist_ok=True)
+    path = archive_path(coin, directory)
+
+    resume_ts = resume_point(path)
+    if resume_ts is not None:
+        if start_ts < resume_ts:
+            print(f"📂 {path}: продолжаем с {datetime.fromtimestamp(resume_ts, tz=timezone.utc)}")
+        start_ts = resume_ts
+    start_ts -= start_ts % INTERVAL_SECONDS
+
+    timestamps = list(range(start_ts, end_ts, INTERVAL_SECONDS))
+    if not timestamps:
+        print(f"✅ {coin}: архив уже актуален")
+        return 0
+    batches = [timestamps[i:i + BATCH_SIZE] for i in range(0, len(timestamps), BATCH_SIZE)]
+
+    def fetch(batch):
+        slugs = [f"{coin.lower()}-updown-15m-{ts}" for ts in batch]
+        markets = gamma.get_markets_by_slugs(slugs)
+        return b"".join(pack_market(ts, markets[slug]) for ts, slug in zip(batch, slugs))
+
+    written = 0
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, open(path, "ab") as f:
+        # map отдает результаты по порядку, поэтому файл остается непрерывным
+        for i, data in enumerate(pool.map(fetch, batches), 1):
+            f.write(data)
+            written += len(data) // RECORD_SIZE
+            if i % SYNC_EVERY == 0:
+                f.flush()
+                os.fsync(f.fileno())
+                print(f"   {coin}: {written}/{len(timestamps)} интервалов")
+        f.flush()
+        os.fsync(f.fileno())
+
+    print(f"✅ {coin}: записано {written} интервалов за {time.time() - started:.1f} сек ({path})")
+    print(gamma.latency_summary())
+    return written
+
+# ========== ЗАПУСК ИЗ КОМАНДНОЙ СТРОКИ ==========
+
+def parse_date(value):
+    return int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+
+def main():
+    """python archive.py btc,eth 2025-01-01 [2025-12-31]"""
+    if len(sys.argv) < 3:
+        print(main.__doc__)
+        return
+    coins = sys.argv[1].split(",")
+    start_ts = parse_date(sys.argv[2])
+    if len(sys.argv) > 3:
+        end_ts = parse_date(sys.argv[3])
+    else:
+        # Только закончившиеся интервалы (с запасом на разрешение рынка)
+        end_ts = int(time.time()) - 2 * INTERVAL_SECONDS
+    gamma = GammaClient()
+    for coin in coins:
+        download(coin, start_ts, end_ts, gamma=gamma)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import sys
+import csv
+import time
+
+import numpy as np
+
+# ================== НАСТРОЙКИ ==================
+# Значения по умолчанию совпадают с константами bot.py / test_bot.py
+
+BASE_BET = 2.0
+MAX_BET = 64.0
+MIN_MULTIPLIER = 1.7
+PRICE_BUFFER = 0.01
+LOOKBACK_INTERVALS = 2
+
+DEFAULT_ENTRY_PRICE = 0.5   # если цены входа не записаны (в загрузчиках - NaN)
+INTERVAL_SECONDS = 15 * 60
+
+UP = 1
+DOWN = -1
+
+# ========== ЗАГРУЗКА ДАННЫХ ==========
+
+def outcome_code(outcome):
+    if outcome == "Up":
+        return UP
+    if outcome == "Down":
+        return DOWN
+    return 0
+
+def to_grid(timestamps, outcomes, up_prices=None, down_prices=None, step=INTERVAL_SECONDS):
+    """Раскладывает интервалы на непрерывную сетку по времени.
+
+    Пропущенные интервалы получают исход 0, поэтому серия одинаковых
+    исходов через дыру в данных не считается сигналом. Неизвестные цены
+    входа - NaN (см. missing_entry_prices).
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    order = np.argsort(timestamps)
+    timestamps = timestamps[order]
+    start = timestamps[0] - timestamps[0] % step
+    index = (timestamps - start) // step
+    size = int(index[-1]) + 1
+
+    grid_ts = start + np.arange(size, dtype=np.int64) * step
+    grid_outcomes = np.zeros(size, dtype=np.int8)
+    grid_outcomes[index] = np.asarray(outcomes, dtype=np.int8)[order]
+    grid_up = np.full(size, np.nan)
+    grid_down = np.full(size, np.nan)
+    if up_prices is not None:
+        grid_up[index] = np.asarray(up_prices, dtype=np.float64)[order]
+    if down_prices is not None:
+        grid_down[index] = np.asarray(down_prices, dtype=np.float64)[order]
+    return grid_ts, grid_outcomes, grid_up, grid_down
+
+def load_csv(path):
+    """CSV с колонками timestamp,outcome[,up_price,down_price]"""
+    timestamps, outcomes, up_prices, down_prices = [], [], [], []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            timestamps.append(int(row["timestamp"]))
+            outcomes.append(outcome_code(row["outcome"]))
+            up_prices.append(float(row.get("up_price") or "nan"))
+            down_prices.append(float(row.get("down_price") or "nan"))
+    return to_grid(timestamps, outcomes, up_prices, down_prices)
+
+def load_history_db(path, coin, timeframe="15m"):
+    """Исходы интервалов серии из SQLite истории (history_store.py), без цен входа"""
+    from history_store import HistoryStore
+    from market_series import TIMEFRAME_MINUTES
+    if timeframe not in TIMEFRAME_MINUTES:
+        raise ValueError(f"Неизвестный таймфрейм {timeframe}, доступны: {', '.join(TIMEFRAME_MINUTES)}")
+    store = HistoryStore(path)
+    rows = store.interval_outcomes(coin, timeframe)
+    store.close()
+    if not rows:
+        raise ValueError(f"Нет исходов интервалов для {coin} {timeframe} в {path}")
+    return to_grid([ts for ts, _ in rows], [outcome_code(o) for _, o in rows],
+                   step=TIMEFRAME_MINUTES[timeframe] * 60)
+
+def load_archive(path):
+    """Исходы из бинарного архива (archive.py) без разбора JSON.
+
+    В архиве итоговые outcomePrices (0/1), цены входа неизвестны (NaN).
+    """
+    from archive import read_archive, STATUS_RESOLVED
+    records = read_archive(path)
+    if len(records) == 0:
+        raise ValueError(f"Архив {path} пуст")
+    outcomes = np.where(records["status"] == STATUS_RESOLVED, records["outcome"], 0).astype(np.int8)
+    return to_grid(records["timestamp"], outcomes)
+
+def load_data(path, coin="BTC", timeframe="15m"):
+    """Массивы (outcomes, up_prices, down_prices) из CSV, архива .bin или SQLite истории"""
+    if path.endswith(".csv"):
+        _, outcomes, up_prices, down_prices = load_csv(path)
+    elif path.endswith(".bin"):
+        _, outcomes, up_prices, down_prices = load_archive(path)
+    else:
+        _, outcomes, up_prices, down_prices = load_history_db(path, coin, timeframe)
+    return outcomes, up_prices, down_prices
+
+def missing_entry_prices(outcomes, up_prices, down_prices):
+    """Сколько интервалов с известным исходом не имеют цен входа.
+
+    Для них run_backtest берет DEFAULT_ENTRY_PRICE, поэтому порог цены и
+    буфер на таких данных не проверяются.
+    """
+    known = outcomes != 0
+    return int((np.isnan(up_prices[known]) | np.isnan(down_prices[known])).sum())
+
+# ========== СТРАТЕГИЯ НА МАССИВАХ ==========
+
+def reversal_signals(outcomes, lookback=LOOKBACK_INTERVALS):
+    """Направление ставки на каждый интервал: против lookback одинаковых исходов подряд.
+
+    Возвращает массив +1 (Up) / -1 (Down) / 0 (нет ставки).
+    """
+    n = len(outcomes)
+    signal = np.zeros(n, dtype=np.int8)
+    if n <= lookback:
+        return signal
+    prev = outcomes[lookback - 1:n - 1]        # исход интервала i-1 для i >= lookback
+    same = prev != 0
+    for k in range(2, lookback + 1):
+        same &= outcomes[lookback - k:n - k] == prev
+    signal[lookback:] = np.where(same, -prev, 0)
+    return signal
+
+def martingale_sizes(wins, base_bet=BASE_BET, max_bet=MAX_BET):
+    """Размер каждой ставки: удвоение после проигрыша до max_bet, сброс после выигрыша.
+
+    wins - результаты ставок по порядку. Размер k-й ставки зависит только от
+    числа проигрышей подряд перед ней, которое считается без цикла.
+    """
+    n = len(wins)
+    if n == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    idx = np.arange(n)
+    # Начало серии: первая ставка и каждая ставка после выигрыша
+    starts = np.zeros(n, dtype=bool)
+    starts[0] = True
+    starts[1:] = wins[:-1]
+    series_start = np.maximum.accumulate(np.where(starts, idx, 0))
+    losses_before = idx - series_start
+    sizes = np.minimum(base_bet * np.exp2(np.minimum(losses_before, 60)), max_bet)
+    return sizes, series_start
+
+def max_run(mask):
+    """Самая длинная серия True подряд"""
+    if not mask.any():
+        return 0
+    padded = np.concatenate(([0], mask.astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    return int((edges[1::2] - edges[::2]).max())
+
+def run_backtest(outcomes, up_prices, down_prices, base_bet=BASE_BET, max_bet=MAX_BET,
+                 min_multiplier=MIN_MULTIPLIER, price_buffer=PRICE_BUFFER,
+                 lookback=LOOKBACK_INTERVALS):
+    """Прогон стратегии разворота + мартингейл по массивам интервалов.
+
+    Размеры ставок - в акциях, как у бота: стоимость = акции × цена входа,
+    выигрыш приносит акции - стоимость, проигрыш - минус стоимость.
+    Возвращает словарь с итогами и кривыми по сетке интервалов:
+    equity (P&L), drawdown и capital_at_risk (стоимость ставок текущей серии).
+    """
+    n = len(outcomes)
+    signal = reversal_signals(outcomes, lookback)
+    up_prices = np.nan_to_num(up_prices, nan=DEFAULT_ENTRY_PRICE)
+    down_prices = np.nan_to_num(down_prices, nan=DEFAULT_ENTRY_PRICE)
+    price = np.where(signal == UP, up_prices, down_prices)
+    max_price = 1.0 / min_multiplier
+
+    # Ставка: есть сигнал, известен исход; порог цены - только для Down, как в боте
+    too_expensive = (signal == DOWN) & (price > max_price)
+    placed = (signal != 0) & (outcomes != 0) & ~too_expensive
+    bet_idx = np.flatnonzero(placed)
+    wins = outcomes[bet_idx] == signal[bet_idx]
+    fill = np.minimum(0.99, price[bet_idx] + price_buffer)
+
+    sizes, series_start = martingale_sizes(wins, base_bet, max_bet)
+    costs = sizes * fill
+    pnl = np.where(wins, sizes - costs, -costs)
+
+    equity = np.zeros(n)
+    equity[bet_idx] = pnl
+    equity = np.cumsum(equity)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity
+
+    risk = np.zeros(n)
+    if len(sizes):
+        stake_cum = np.cumsum(costs)
+        before_series = np.where(series_start > 0, stake_cum[series_start - 1], 0.0)
+        risk[bet_idx] = stake_cum - before_series
+
+    bets = len(bet_idx)
+    win_count = int(wins.sum())
+    return {
+        "bets": bets,
+        "wins": win_count,
+        "losses": bets - win_count,
+        "win_rate": (win_count / bets * 100) if bets else 0.0,
+        "profit": float(equity[-1]) if n else 0.0,
+        "max_drawdown": float(drawdown.max()) if n else 0.0,
+        "max_loss_streak": max_run(~wins),
+        "max_capital_at_risk": float(risk.max()) if n else 0.0,
+        "skipped_by_price": int((too_expensive & (outcomes != 0)).sum()),
+        "equity": equity,
+        "drawdown": drawdown,
+        "capital_at_risk": risk
+    }
+
+def print_result(result):
+    print(f"Ставок: {result['bets']} | ✅ {result['wins']} | ❌ {result['losses']} | "
+          f"Винрейт: {result['win_rate']:.1f}%")
+    print(f"📈 Прибыль: ${result['profit']:.2f}")
+    print(f"📉 Макс. просадка: ${result['max_drawdown']:.2f}")
+    print(f"🔥 Макс. серия проигрышей: {result['max_loss_streak']}")
+    print(f"💰 Макс. капитал под риском: ${result['max_capital_at_risk']:.2f}")
+    print(f"⏸️ Пропущено из-за цены: {result['skipped_by_price']}")
+
+# ========== ЗАПУСК ИЗ КОМАНДНОЙ СТРОКИ ==========
+
+def main():
+    """python backtest.py data.csv | archive/btc-updown-15m.bin | history.db BTC [5m|15m|1h]"""
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return
+    outcomes, up_prices, down_prices = load_data(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "BTC",
+                                                 sys.argv[3] if len(sys.argv) > 3 else "15m")
+
+    started = time.perf_counter()
+    result = run_backtest(outcomes, up_prices, down_prices)
+    elapsed = time.perf_counter() - started
+
+    print(f"Интервалов: {len(outcomes)}, расчет {elapsed * 1000:.1f} мс")
+    missing = missing_entry_prices(outcomes, up_prices, down_prices)
+    if missing:
+        print(f"⚠️ Нет цен входа у {missing} интервалов: взята цена {DEFAULT_ENTRY_PRICE}, "
+              f"порог цены и буфер не проверены")
+    print_result(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+import requests
+
+# ================== НАСТРОЙКИ ==================
+
+POLYGON_RPC = os.environ.get("POLYGON_RPC", "https://polygon-rpc.com")
+
+USDC_ADDRESS = "0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174"        # USDC.e на Polygon
+EXCHANGE_ADDRESS = "0x4bFb41d5B3570DeFd03C39a9A4D8dE6Bd8B8982E"    # CTF Exchange Polymarket
+USDC_DECIMALS = 6
+
+BALANCE_TTL = 20          # сколько секунд доверять прочитанному балансу
+RPC_TIMEOUT = (3.05, 8)
+
+# Селекторы ERC-20
+BALANCE_OF = "0x70a08231"   # balanceOf(address)
+ALLOWANCE = "0xdd62ed3e"    # allowance(address,address)
+
+# ========== БАЛАНС USDC ЧЕРЕЗ JSON-RPC ==========
+
+def _address_arg(address):
+    return address.lower().replace("0x", "").rjust(64, "0")
+
+def _to_usdc(result):
+    return int(result, 16) / 10 ** USDC_DECIMALS
+
+class BalanceProvider:
+    """Баланс USDC кошелька и allowance биржи одним пакетным JSON-RPC запросом.
+
+    Результат кешируется на ttl секунд, поэтому проверка баланса перед
+    ставкой обычно не ходит в сеть. После отправки ордера баланс
+    перечитывается через refresh().
+    """
+
+    def __init__(self, wallet, rpc_url=POLYGON_RPC, token=USDC_ADDRESS,
+                 spender=EXCHANGE_ADDRESS, ttl=BALANCE_TTL):
+        self.wallet = wallet
+        self.rpc_url = rpc_url
+        self.token = token
+        self.spender = spender
+        self.ttl = ttl
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.cached = None       # (balance, allowance)
+        self.fetched_at = 0.0
+        self.hits = 0
+        self.fetches = 0
+
+    def _eth_call(self, request_id, data):
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": "eth_call",
+            "params": [{"to": self.token, "data": data}, "latest"]
+        }
+
+    def fetch(self):
+        """(баланс, allowance) в USDC из сети, оба eth_call в одном запросе"""
+        batch = [
+            self._eth_call(1, BALANCE_OF + _address_arg(self.wallet)),
+            self._eth_call(2, ALLOWANCE + _address_arg(self.wallet) + _address_arg(self.spender))
+        ]
+        resp = self.session.post(self.rpc_url, json=batch, timeout=RPC_TIMEOUT)
+        resp.raise_for_status()
+        results = {}
+        for item in resp.json():
+            if "error" in item:
+                raise RuntimeError(f"RPC ошибка: {item['error']}")
+            results[item["id"]] = item["result"]
+        self.fetches += 1
+        return _to_usdc(results[1]), _to_usdc(results[2])
+
+    def get(self, max_age=None):
+        """(баланс, allowance) из кеша, если он моложе max_age (по умолчанию ttl)"""
+        if max_age is None:
+            max_age = self.ttl
+        with self.lock:
+            if self.cached is not None and time.time() - self.fetched_at < max_age:
+                self.hits += 1
+                return self.cached
+            self.cached = self.fetch()
+            self.fetched_at = time.time()
+            return self.cached
+
+    def available(self, max_age=None):
+        """Сколько USDC можно потратить на ордера: min(баланс, allowance)"""
+        balance, allowance = self.get(max_age)
+        if allowance < balance:
+            print(f"⚠️ Allowance биржи (${allowance:.2f}) меньше баланса (${balance:.2f}) - доступно только allowance")
+        return min(balance, allowance)
+
+    def invalidate(self):
+        with self.lock:
+            self.cached = None
+
+    def refresh(self):
+        """Сбрасывает кеш и сразу перечитывает баланс (после отправки ордера).
+
+        Ошибка RPC не прерывает ставку: кеш остается пустым, и следующий
+        get() снова пойдет в сеть.
+        """
+        self.invalidate()
+        try:
+            return self.get()
+        except Exception as e:
+            print(f"[Баланс] Не удалось перечитать баланс: {e}")
+            return None
+
+    def summary(self):
+        return f"Баланс RPC: запросов {self.fetches}, из кеша {self.hits}"
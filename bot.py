@@ -1,11 +1,28 @@
 import os
-import json
-import requests
+import sys
+import time
+
+STARTED_AT = time.perf_counter()   # для замера времени запуска (импорты модулей)
+
+import html
+import queue
 from datetime import datetime, timezone, timedelta
 
-from py_clob_client.client import ClobClient
-from py_clob_client.clob_types import OrderArgs, OrderType
-from py_clob_client.order_builder.constants import BUY
+from clob_session import ClobSession
+from gamma_client import GammaClient
+from market_cache import MarketCache
+from balance_provider import BalanceProvider
+from order_book import BookFeed
+from push_settlement import UserFeed, AdaptivePoller, apply_user_event, resolution_winner, EVENT_QUEUE_SIZE
+import order_tracker
+from state_journal import StateJournal
+import stats_buckets
+from history_store import HistoryStore
+from run_metrics import RunMetrics
+from telegram_notifier import TelegramNotifier
+import interval_calendar
+from interval_calendar import IntervalPrefetcher
+from market_series import SeriesShard, SHARD_KEYS, market_series, parse_series, stored_series
 
 # ================== НАСТРОЙКИ ==================
 
@@ -26,7 +43,8 @@ print("PRIVATE_KEY загружен:", PRIVATE_KEY[:10] + "..." + PRIVATE_KEY[-6
 print(f"🔧 РЕЖИМ: {'РЕАЛЬНЫЙ (ставки на реальные деньги)' if REAL_MODE else 'ТЕСТОВЫЙ'}")
 
 CHAIN_ID = 137
-HOST = "https://clob.polymarket.com"
+HOST = os.environ.get('CLOB_HOST', "https://clob.polymarket.com")
+TELEGRAM_API = os.environ.get('TELEGRAM_API', "https://api.telegram.org")
 
 BASE_BET = 2.0
 MAX_BET = 64.0
@@ -34,7 +52,46 @@ MIN_MULTIPLIER = 1.7
 MAX_PRICE_FOR_OPPOSITE = 1.0 / MIN_MULTIPLIER  # ≈ 0.588
 PRICE_BUFFER = 0.01
 
+# 👇 СЕРИИ РЫНКОВ: "актив:таймфрейм" через запятую (5m, 15m, 1h), например "BTC:15m,ETH:5m"
+SERIES = parse_series(os.environ.get('BOT_SERIES', "BTC:15m"))
+
 STATE_FILE = "bot_state.json"
+# 👇 ПОЛНАЯ ИСТОРИЯ В SQLITE (необязательно): путь к файлу БД
+HISTORY_DB = os.environ.get('HISTORY_DB')
+JOURNAL_FILE = "bot_state.journal"
+SHARD_DIR = "bot_state"   # состояние серий: {серия}.json + {серия}.journal
+MARKET_CACHE_FILE = "market_cache.json"
+METRICS_FILE = "bot_metrics.json"   # гистограммы этапов за все прогоны
+METRICS_PROM_FILE = os.environ.get('METRICS_PROM_FILE', "bot_metrics.prom")
+CREDS_CACHE_FILE = "clob_creds.enc"   # API creds CLOB (AES-GCM, ключ из PRIVATE_KEY), не коммитится
+
+# 👇 РЕЖИМ ДЕМОНА (python bot.py --daemon или BOT_DAEMON=1)
+DAEMON_MODE = os.environ.get('BOT_DAEMON') == '1'
+DAEMON_WAKE_DELAY = 0.2  # секунд после границы интервала
+PRESIGN_LEAD = 60        # за сколько секунд до границы готовить подписанные ордера
+
+# Общий клиент Gamma API (keep-alive пул + повторы)
+gamma = GammaClient()
+# Кеш рынков: memo на прогон + разрешенные рынки на диске
+market_cache = MarketCache(MARKET_CACHE_FILE)
+# Состояние: снимок STATE_FILE + журнал событий JOURNAL_FILE
+journal = StateJournal(STATE_FILE, JOURNAL_FILE)
+# Полная история ставок и исходов интервалов (если задан HISTORY_DB)
+history_store = HistoryStore(HISTORY_DB, source="bot") if HISTORY_DB else None
+# Время этапов прогона (span) с выгрузкой в JSON и Prometheus
+metrics = RunMetrics(METRICS_FILE, METRICS_PROM_FILE)
+# Сообщения Telegram: очередь и фоновый поток, склейка в пачки до 4096 символов
+notifier = TelegramNotifier(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_API, metrics=metrics)
+# Баланс USDC и allowance биржи из Polygon RPC (кеш BALANCE_TTL сек)
+balances = BalanceProvider(REAL_WALLET_ADDRESS)
+# События для расчета ставок: разрешение рынков (market-канал), ордера и сделки (user-канал)
+push_events = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+# Живые стаканы токенов из websocket market-канала (запускается в режиме демона)
+book_feed = BookFeed(events=push_events)
+# User-канал создается в демоне после получения API creds
+user_feed = None
+# Запасной REST-опрос разрешения, пока push молчит
+settle_poller = AdaptivePoller()
 
 # ========== ФУНКЦИЯ ОТПРАВКИ В ТЕЛЕГРАМ ==========
 
@@ -46,76 +103,115 @@ def send_telegram(msg):
     if not REAL_MODE:
         msg = "🧪 [ТЕСТ]\n" + msg
     
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": msg,
-        "parse_mode": "HTML"
-    }
-    try:
-        r = requests.post(url, json=payload, timeout=8)
-        if r.status_code != 200:
-            print(f"[Telegram] Ошибка отправки: {r.text}")
-    except Exception as e:
-        print(f"[Telegram] Ошибка: {e}")
+    # Отправка в фоне: ордер и сохранение состояния не ждут Telegram
+    notifier.send(msg)
 
 # ========== ФУНКЦИИ ДЛЯ РАБОТЫ С СОСТОЯНИЕМ ==========
+#
+# Корневое состояние (STATE_FILE) - общая статистика счета и курсор сделок.
+# Ставки, мартингейл и последние исходы каждой серии лежат в ее шарде
+# SHARD_DIR/{серия}.json + .journal (market_series.SeriesShard).
 
-def load_state():
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "r") as f:
-            data = json.load(f)
-            if "pending_bets" not in data:
-                data["pending_bets"] = {}
-            if "statistics" not in data:
-                data["statistics"] = {
-                    "total_profit": 0.0,
-                    "total_bets": 0,
-                    "wins": 0,
-                    "losses": 0,
-                    "history": [],
-                    "max_loss_streak": 0,
-                    "current_loss_streak": 0,
-                    "last_6h_report": None,
-                    "last_24h_report": None
-                }
-            if "last_results" not in data:
-                data["last_results"] = {}
-            if "martingale" not in data:
-                data["martingale"] = {}
-            return data
+def default_state():
     return {
-        "pending_bets": {},
         "statistics": {
             "total_profit": 0.0,
             "total_bets": 0,
             "wins": 0,
             "losses": 0,
             "history": [],
+            "buckets": {},
             "max_loss_streak": 0,
             "current_loss_streak": 0,
             "last_6h_report": None,
             "last_24h_report": None
         },
-        "last_results": {},
-        "martingale": {}
+        "trade_cursor": None
     }
 
-def save_state(state):
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f, indent=2)
+def load_state():
+    data = journal.load(default_state)
+    if "statistics" not in data:
+        data["statistics"] = default_state()["statistics"]
+    if "buckets" not in data["statistics"]:
+        # Миграция: почасовые агрегаты из существующей истории
+        data["statistics"]["buckets"] = stats_buckets.build_buckets(data["statistics"]["history"])
+        save_state(data)
+    if history_store:
+        history_store.migrate_state(data, STATE_FILE)
+    return data
+
+def legacy_series(coin):
+    """Серия ставок старого общего состояния: настроенная серия монеты, иначе 15m"""
+    for series in SERIES:
+        if series.asset == coin:
+            return series
+    return market_series(coin, "15m")
+
+def load_shards(state):
+    """Состояния серий из SERIES и всех серий, уже сохраненных на диске
+    (их ставки рассчитываются, даже если серию убрали из настроек).
+
+    Миграция: ставки, мартингейл и исходы из старого общего состояния
+    переходят в шарды серий своих монет.
+    """
+    legacy = {key: state[key] for key in SHARD_KEYS if key in state}
+    series_list = list(SERIES) + stored_series(SHARD_DIR)
+    for bet_key in legacy.get("pending_bets", {}):
+        series_list.append(legacy_series(bet_key.split('_')[0]))
+    for section in ("martingale", "last_results"):
+        series_list += [legacy_series(coin) for coin in legacy.get(section, {})]
+    
+    shards = {}
+    for series in series_list:
+        if series.key not in shards:
+            shards[series.key] = SeriesShard(series, SHARD_DIR)
+            shards[series.key].load()
+    
+    if legacy:
+        for bet_key, info in legacy.get("pending_bets", {}).items():
+            shards[legacy_series(bet_key.split('_')[0]).key].state["pending_bets"].setdefault(bet_key, info)
+        for section in ("martingale", "last_results"):
+            for coin, value in legacy.get(section, {}).items():
+                shards[legacy_series(coin).key].state[section].setdefault(coin, value)
+        # Сначала шарды, потом корень: падение между ними повторит перенос
+        for shard in shards.values():
+            save_shard(shard)
+        for key in legacy:
+            del state[key]
+        save_state(state)
+        print(f"📦 Состояние перенесено в шарды серий: {', '.join(shards)}")
+    return shards
 
-def update_statistics(state, coin, result, profit, bet_amount, direction):
+def save_state(state, event=None, ops=None):
+    """Без ops - полный снимок состояния, с ops - одно событие в журнал"""
+    with metrics.span("state_save"):
+        if ops is None:
+            journal.compact(state)
+        else:
+            journal.append(state, event, ops)
+
+def save_shard(shard, event=None, ops=None):
+    """То же для состояния серии"""
+    with metrics.span("state_save"):
+        shard.save(event, ops)
+
+def update_statistics(state, series, result, profit, bet_amount, direction, slug=None, outcome=None):
     stats = state["statistics"]
     
-    stats["history"].append({
+    entry = {
         "timestamp": datetime.now().isoformat(),
-        "coin": coin,
+        "coin": series.asset,
+        "timeframe": series.timeframe,
         "result": result,
         "profit": profit,
         "bet_amount": bet_amount,
         "direction": direction
-    })
+    }
+    stats["history"].append(entry)
+    if history_store:
+        history_store.add_bet(series.asset, result, profit, bet_amount, direction, slug, outcome,
+                              timeframe=series.timeframe)
     
     stats["total_bets"] += 1
     stats["total_profit"] += profit
@@ -123,79 +219,72 @@ def update_statistics(state, coin, result, profit, bet_amount, direction):
     if profit > 0:
         stats["wins"] += 1
         stats["current_loss_streak"] = 0
-        if coin in state["martingale"]:
-            del state["martingale"][coin]
     else:
         stats["losses"] += 1
         stats["current_loss_streak"] += 1
         if stats["current_loss_streak"] > stats["max_loss_streak"]:
             stats["max_loss_streak"] = stats["current_loss_streak"]
-        
+    
+    if len(stats["history"]) > 1000:
+        stats["history"] = stats["history"][-1000:]
+    
+    # Почасовые агрегаты для отчетов
+    bucket_key = stats_buckets.record_bet(stats["buckets"], profit)
+    pruned = stats_buckets.prune_buckets(stats["buckets"])
+    
+    save_state(state, "bet_settled", [
+        ["push", ["statistics", "history"], entry, 1000],
+        ["set", ["statistics", "buckets", bucket_key], stats["buckets"][bucket_key]],
+        ["set", ["statistics", "total_bets"], stats["total_bets"]],
+        ["set", ["statistics", "total_profit"], stats["total_profit"]],
+        ["set", ["statistics", "wins"], stats["wins"]],
+        ["set", ["statistics", "losses"], stats["losses"]],
+        ["set", ["statistics", "current_loss_streak"], stats["current_loss_streak"]],
+        ["set", ["statistics", "max_loss_streak"], stats["max_loss_streak"]]
+    ] + [["del", ["statistics", "buckets", key]] for key in pruned])
+
+def update_martingale(shard, coin, profit, bet_amount, direction):
+    """Мартингейл серии после завершения ставки"""
+    martingale = shard.state["martingale"]
+    if profit > 0:
+        if coin in martingale:
+            del martingale[coin]
+    else:
         next_bet = min(bet_amount * 2, MAX_BET)
-        if coin not in state["martingale"]:
-            state["martingale"][coin] = {
+        if coin not in martingale:
+            martingale[coin] = {
                 "direction": direction,
                 "next_bet": next_bet,
                 "losses_count": 1
             }
         else:
-            state["martingale"][coin]["next_bet"] = next_bet
-            state["martingale"][coin]["losses_count"] += 1
+            martingale[coin]["next_bet"] = next_bet
+            martingale[coin]["losses_count"] += 1
     
-    if len(stats["history"]) > 1000:
-        stats["history"] = stats["history"][-1000:]
-    
-    save_state(state)
+    if coin in martingale:
+        save_shard(shard, "martingale_step", [["set", ["martingale", coin], martingale[coin]]])
+    else:
+        save_shard(shard, "martingale_step", [["del", ["martingale", coin]]])
 
-def update_last_result(state, coin, result):
-    if coin not in state["last_results"]:
-        state["last_results"][coin] = []
+def update_last_result(shard, coin, result):
+    last_results = shard.state["last_results"]
+    if coin not in last_results:
+        last_results[coin] = []
     
-    state["last_results"][coin].append({
+    entry = {
         "timestamp": datetime.now().isoformat(),
         "result": result
-    })
+    }
+    last_results[coin].append(entry)
     
-    if len(state["last_results"][coin]) > 2:
-        state["last_results"][coin] = state["last_results"][coin][-2:]
+    if len(last_results[coin]) > 2:
+        last_results[coin] = last_results[coin][-2:]
     
-    save_state(state)
+    save_shard(shard, "last_result", [["push", ["last_results", coin], entry, 2]])
 
 def get_statistics_period(state, hours):
-    stats = state["statistics"]
-    now = datetime.now()
-    period_ago = now - timedelta(hours=hours)
-    
-    period_profit = 0
-    period_bets = 0
-    period_wins = 0
-    period_loss_streak = 0
-    max_period_loss_streak = 0
-    
-    for entry in stats["history"]:
-        entry_time = datetime.fromisoformat(entry["timestamp"])
-        if entry_time > period_ago:
-            period_profit += entry["profit"]
-            period_bets += 1
-            if entry["profit"] > 0:
-                period_wins += 1
-                period_loss_streak = 0
-            else:
-                period_loss_streak += 1
-                if period_loss_streak > max_period_loss_streak:
-                    max_period_loss_streak = period_loss_streak
-    
-    period_losses = period_bets - period_wins
-    win_rate = (period_wins / period_bets * 100) if period_bets > 0 else 0
-    
-    return {
-        "profit": period_profit,
-        "bets": period_bets,
-        "wins": period_wins,
-        "losses": period_losses,
-        "win_rate": win_rate,
-        "max_loss_streak": max_period_loss_streak
-    }
+    # Считается по почасовым корзинам, а не перебором всей истории
+    return stats_buckets.query_period(state["statistics"]["buckets"], hours)
 
 def check_reports(state):
     now = datetime.now()
@@ -222,12 +311,11 @@ def check_reports(state):
 # ========== ФУНКЦИЯ ПРОВЕРКИ БАЛАНСА ==========
 
 def check_balance():
-    """Проверка баланса USDC по реальному адресу кошелька"""
+    """Доступный USDC по реальному адресу кошелька: min(баланс, allowance биржи)"""
     try:
-        address = REAL_WALLET_ADDRESS
-        print(f"Проверка баланса для реального адреса: {address}")
-        print("💰 Используем сохраненный баланс: $106.83")
-        return 106.83
+        available = balances.available()
+        print(f"Баланс {REAL_WALLET_ADDRESS}: доступно ${available:.2f}")
+        return available
     except Exception as e:
         print(f"Ошибка проверки баланса: {e}")
         return None
@@ -235,12 +323,8 @@ def check_balance():
 # ========== ФУНКЦИИ ДЛЯ РАБОТЫ С ВРЕМЕНЕМ ==========
 
 def get_current_et_time():
-    """Получает текущее время в ET (Eastern Time) правильно"""
-    # Текущее время в UTC
-    now_utc = datetime.now(timezone.utc)
-    # ET = UTC-5
-    et_now = now_utc - timedelta(hours=5)
-    return et_now
+    """Получает текущее время в ET (Eastern Time) с учетом летнего времени"""
+    return interval_calendar.now_et()
 
 def get_current_utc_time():
     """Получает текущее время в UTC"""
@@ -248,154 +332,83 @@ def get_current_utc_time():
 
 # ========== ФУНКЦИИ ДЛЯ РАБОТЫ С POLYMARKET ==========
 
-def is_new_interval(minutes=15):
-    """Проверяет, наступило ли начало интервала"""
-    now_et = get_current_et_time()
-    return now_et.minute % minutes == 0
-
 def get_market(slug: str):
-    url = f"https://gamma-api.polymarket.com/markets?slug={slug}"
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        return data[0] if data else None
+        with metrics.span("market_fetch"):
+            return market_cache.get(slug, gamma.get_market)
     except Exception as e:
         print(f"Ошибка gamma API {slug}: {e}")
         return None
 
-def get_market_by_timestamp(timestamp):
-    """Получает рынок BTC по timestamp"""
+def get_market_by_timestamp(series, timestamp):
+    """Получает рынок серии по timestamp"""
     try:
-        slug = f"btc-updown-15m-{timestamp}"
-        
-        url = f"https://gamma-api.polymarket.com/markets?slug={slug}"
-        resp = requests.get(url, timeout=10)
-        
-        if resp.status_code == 200:
-            markets = resp.json()
-            if markets:
-                return markets[0]
-        return None
+        slug = series.slug(timestamp)
+        with metrics.span("market_fetch"):
+            return market_cache.get(slug, gamma.get_market)
     except Exception as e:
         print(f"Ошибка получения рынка по timestamp: {e}")
         return None
 
-def parse_prices(prices_field):
-    try:
-        if isinstance(prices_field, str):
-            try:
-                prices_str = prices_field.replace('\\"', '"')
-                prices_list = json.loads(prices_str)
-                return [float(p) for p in prices_list]
-            except:
-                import re
-                numbers = re.findall(r"[\d.]+", prices_field)
-                return [float(n) for n in numbers[:2]]
-        elif isinstance(prices_field, list):
-            prices = []
-            for p in prices_field[:2]:
-                if isinstance(p, str):
-                    try:
-                        prices.append(float(p))
-                    except:
-                        prices.append(0.5)
-                elif isinstance(p, (int, float)):
-                    prices.append(float(p))
-                else:
-                    prices.append(0.5)
-            return prices
-        return [0.5, 0.5]
-    except Exception as e:
-        print(f"Ошибка парсинга цен: {e}")
-        return [0.5, 0.5]
+def get_interval_start(series, minutes_ago=0):
+    """Начало интервала серии minutes_ago минут назад: (время ET, timestamp)"""
+    timestamp = interval_calendar.interval_start(minutes_ago, minutes=series.minutes)
+    return interval_calendar.to_et(timestamp), timestamp
 
-def is_market_resolved(market):
-    if not market:
-        return False
-    
-    prices = parse_prices(market.get("outcomePrices", ["0.5", "0.5"]))
-    
-    if prices[0] >= 0.85 or prices[1] >= 0.85:
-        return True
-    
-    uma_status = market.get("umaResolutionStatus")
-    if uma_status in ["resolved", "confirmed"]:
-        return True
-    
-    return False
+def get_interval_slug(series, minutes_ago=0):
+    _, timestamp = get_interval_start(series, minutes_ago)
+    return series.slug(timestamp)
 
-def get_winner(market):
-    if not market:
-        return None
-    
-    prices = parse_prices(market.get("outcomePrices", ["0.5", "0.5"]))
-    
-    if prices[0] >= 0.85:
-        return "Up"
-    if prices[1] >= 0.85:
-        return "Down"
-    
-    uma_status = market.get("umaResolutionStatus")
-    if uma_status in ["resolved", "confirmed"]:
-        return "Up" if prices[0] > prices[1] else "Down"
-    
-    return None
+def prefetch_run_markets(shards):
+    """Загружает все рынки прогона одним пакетным запросом.
 
-def get_token_id_and_price(market, direction: str):
-    clob_ids = market.get("clobTokenIds", [])
-    
-    if isinstance(clob_ids, str):
-        try:
-            clob_ids = json.loads(clob_ids)
-        except:
-            clob_ids = []
-    
-    prices = parse_prices(market.get("outcomePrices", ["0.5", "0.5"]))
-    
-    index = 0 if direction == "Up" else 1
-    
-    if index >= len(clob_ids):
-        return None, prices[index] if index < len(prices) else 0.5
-    
-    return clob_ids[index], prices[index]
+    Два предыдущих интервала и текущий интервал каждой серии и все slug-и
+    активных ставок попадают в кеш, дальнейшие get_market/get_market_by_timestamp
+    берут их оттуда без обращения к API.
+    """
+    slugs = []
+    for series in SERIES:
+        slugs += [get_interval_slug(series, series.minutes), get_interval_slug(series, 2 * series.minutes), get_interval_slug(series, 0)]
+    slugs += [info["slug"] for info in pending_view(shards).values()]
+    try:
+        with metrics.span("market_prefetch"):
+            markets = market_cache.get_many(slugs, gamma.get_markets_by_slugs)
+    except Exception as e:
+        print(f"Ошибка пакетной загрузки рынков: {e}")
+        return {}
+    missing = [slug for slug, market in markets.items() if market is None]
+    print(f"📦 Загружено рынков: {len(markets) - len(missing)} из {len(markets)}")
+    if missing:
+        print(f"   Не найдены: {', '.join(missing)}")
+    return markets
 
-def get_interval_result(minutes_ago):
-    """Получает результат для интервала BTC, который был minutes_ago минут назад"""
+def get_interval_result(series, minutes_ago):
+    """Получает результат для интервала серии, который был minutes_ago минут назад"""
     try:
-        et_now = get_current_et_time()
+        target_time_et, timestamp = get_interval_start(series, minutes_ago)
+        target_time_utc = interval_calendar.to_utc(timestamp)
         
-        # Вычисляем время для нужного интервала в ET
-        target_time_et = et_now - timedelta(minutes=minutes_ago)
-        
-        # Округляем до начала 15-минутного интервала
-        target_minute = target_time_et.minute
-        interval_start = (target_minute // 15) * 15
-        target_time_et = target_time_et.replace(minute=interval_start, second=0, microsecond=0)
-        
-        print(f"\n=== Получение результата для BTC, {minutes_ago} мин назад ===")
+        print(f"\n=== Получение результата для {series.key}, {minutes_ago} мин назад ===")
         print(f"Время ET: {target_time_et.hour}:{target_time_et.minute:02d}")
-        
-        # Конвертируем ET в UTC для timestamp
-        target_time_utc = target_time_et + timedelta(hours=5)
-        timestamp = int(target_time_utc.timestamp())
         print(f"Timestamp: {timestamp}")
         print(f"UTC время: {target_time_utc}")
         
         # Получаем рынок
-        market = get_market_by_timestamp(timestamp)
+        market = get_market_by_timestamp(series, timestamp)
         
         if not market:
             print(f"❌ Рынок не найден")
             return None
         
-        if not is_market_resolved(market):
+        if not market.resolved:
             print(f"⏳ Рынок еще не разрешен")
             return None
         
-        winner = get_winner(market)
+        winner = market.winner
         if winner:
             print(f"✅ Результат: {winner}")
+            if history_store:
+                history_store.add_interval(market.slug, series.asset, timestamp, winner, series.timeframe)
             return winner
         
         return None
@@ -404,34 +417,28 @@ def get_interval_result(minutes_ago):
         print(f"Ошибка получения результата: {e}")
         return None
 
-def find_current_interval_market():
-    """Находит рынок BTC для текущего интервала с правильным timestamp"""
+def find_current_interval_market(series):
+    """Находит рынок серии для текущего интервала с правильным timestamp"""
     try:
-        et_now = get_current_et_time()
-        print(f"\n=== Поиск рынка для BTC ===")
-        print(f"Текущее ET время: {et_now}")
+        print(f"\n=== Поиск рынка для {series.key} ===")
+        print(f"Текущее ET время: {get_current_et_time()}")
         
-        # Округляем до начала текущего интервала в ET
-        current_minute = et_now.minute
-        interval_start = (current_minute // 15) * 15
-        et_interval = et_now.replace(minute=interval_start, second=0, microsecond=0)
+        # Начало текущего интервала в ET и его timestamp
+        et_interval, timestamp = get_interval_start(series, 0)
+        interval_utc = interval_calendar.to_utc(timestamp)
         
         print(f"Интервал ET для ставки: {et_interval}")
         
-        # Конвертируем ET в UTC для timestamp (ET = UTC-5, значит UTC = ET+5)
-        interval_utc = et_interval + timedelta(hours=5)
-        timestamp = int(interval_utc.timestamp())
-        
         print(f"UTC время начала интервала: {interval_utc}")
         print(f"Timestamp: {timestamp}")
         
         # Получаем рынок
-        market = get_market_by_timestamp(timestamp)
+        market = get_market_by_timestamp(series, timestamp)
         
         if market:
-            prices = parse_prices(market.get('outcomePrices', ['0.5', '0.5']))
-            resolved = is_market_resolved(market)
-            print(f"✅ Найден рынок: {market.get('question')}")
+            prices = market.prices
+            resolved = market.resolved
+            print(f"✅ Найден рынок: {market.question}")
             print(f"   Цены: {prices}")
             print(f"   Разрешен: {resolved}")
             return market
@@ -443,42 +450,187 @@ def find_current_interval_market():
         print(f"Ошибка поиска рынка: {e}")
         return None
 
-def place_bet(client, market, direction, bet_amount):
+def parse_order_response(resp):
+    """(успех, id ордера) по ответу post_order"""
+    if isinstance(resp, dict):
+        if resp.get("orderID"):
+            return True, resp["orderID"]
+        elif "id" in resp:
+            return True, resp["id"]
+        elif resp.get("status") in ("success", "placed"):
+            return True, resp.get("order", {}).get("id")
+    return False, None
+
+# ========== ПРЕДПОДПИСАННЫЕ ОРДЕРА ==========
+#
+# За PRESIGN_LEAD секунд до границы интервала демон находит рынок следующего
+# интервала, считает возможные направления и размеры ставки и подписывает
+# ордера (create_order, EIP-712). На границе place_bet берет готовый ордер,
+# сверяет цену и сразу делает post_order.
+
+# (slug, direction, amount) -> {"signed", "token_id", "limit_price", "prepared_at"}
+prepared_orders = {}
+
+def candidate_directions(series):
+    """Возможные направления ставки серии на следующий интервал.
+
+    Ставка будет, если текущий интервал закончится так же, как предыдущий,
+    поэтому направление - противоположное исходу предыдущего интервала.
+    Если он еще неизвестен, готовим оба направления.
+    """
+    prev_result = get_interval_result(series, series.minutes)
+    if prev_result:
+        return ["Down" if prev_result == "Up" else "Up"]
+    return ["Up", "Down"]
+
+def candidate_bet_sizes(shard):
+    """Возможные размеры ставки с учетом еще не рассчитанной текущей ставки серии"""
+    coin = shard.series.asset
+    pending = shard.state["pending_bets"].get(f"{coin}_last")
+    if coin in shard.state["martingale"]:
+        current = shard.state["martingale"][coin]["next_bet"]
+    else:
+        current = BASE_BET
+    if pending is None or pending.get("order_status") == order_tracker.UNFILLED:
+        return [current]
+    # Выигрыш сбрасывает серию, проигрыш удваивает исполненный объем (как в update_statistics)
+    return sorted({BASE_BET, min(order_tracker.bet_stake(pending) * 2, MAX_BET)})
+
+def prepare_next_interval(client, shards, series_list):
+    """Подписывает ордера серий series_list на следующий интервал заранее"""
+    prepared_orders.clear()
+    if not REAL_MODE:
+        return 0
+    
+    with metrics.span("balance_check"):
+        balance = check_balance()
+    if balance is None:
+        return 0
+    
+    for series in series_list:
+        prepare_series_orders(client, series, shards[series.key], balance)
+    
+    print(f"Подготовлено ордеров: {len(prepared_orders)}")
+    return len(prepared_orders)
+
+def prepare_series_orders(client, series, shard, balance):
+    from py_clob_client.clob_types import OrderArgs
+    from py_clob_client.order_builder.constants import BUY
+    
+    next_ts = series.next_start()
+    slug = series.slug(next_ts)
+    print(f"\n=== Подготовка ордеров для {slug} ===")
+    
+    # Токены обычно уже загружены фоновым IntervalPrefetcher
+    market = market_cache.upcoming_market(slug) or get_market(slug)
+    if not market or market.resolved:
+        print("❌ Рынок следующего интервала недоступен, подготовка пропущена")
+        return
+    # К границе интервала стаканы обоих токенов уже будут в памяти
+    book_feed.subscribe([market.up_token, market.down_token])
+    
+    for direction in candidate_directions(series):
+        token_id, price = market.token_and_price(direction)
+        if token_id is None:
+            continue
+        if direction == "Down" and price > MAX_PRICE_FOR_OPPOSITE:
+            print(f"   {direction}: цена {price:.4f} выше порога, не готовим")
+            continue
+        limit_price = min(0.99, price + PRICE_BUFFER)
+        for amount in candidate_bet_sizes(shard):
+            if balance < amount:
+                print(f"   {direction} ${amount}: недостаточно средств")
+                continue
+            try:
+                with metrics.span("sign_order"):
+                    signed = client.create_order(OrderArgs(
+                        token_id=token_id,
+                        side=BUY,
+                        price=limit_price,
+                        size=amount
+                    ))
+            except Exception as e:
+                print(f"   {direction} ${amount}: ошибка подписи {e}")
+                continue
+            prepared_orders[(slug, direction, amount)] = {
+                "signed": signed,
+                "token_id": token_id,
+                "limit_price": limit_price,
+                "prepared_at": time.time()
+            }
+            print(f"   ✍️ {direction} ${amount} по цене до {limit_price:.4f}")
+
+def take_prepared_order(slug, direction, amount, limit_price):
+    """Готовый ордер, если он есть и его лимит покрывает нужный лимит"""
+    prepared = prepared_orders.pop((slug, direction, amount), None)
+    if prepared is None:
+        return None
+    if limit_price > prepared["limit_price"]:
+        print(f"Цена ушла выше подписанной ({limit_price:.4f} > {prepared['limit_price']:.4f}), подписываем заново")
+        return None
+    return prepared
+
+def place_bet(client, series, market, direction, bet_amount):
+    """Ставка на рынок серии. Возвращает (успех, поля ордера для pending_bets)"""
     try:
-        print(f"\n=== Размещаем ставку BTC {direction} ===")
+        print(f"\n=== Размещаем ставку {series.key} {direction} ===")
         
         if not market:
-            print(f"BTC → рынок не передан")
+            print(f"{series.asset} → рынок не передан")
             return False, None
         
-        if is_market_resolved(market):
-            print(f"BTC → рынок уже разрешен, нельзя ставить")
+        if market.resolved:
+            print(f"{series.asset} → рынок уже разрешен, нельзя ставить")
             return False, None
         
-        clob_ids = market.get("clobTokenIds", [])
-        if isinstance(clob_ids, str):
-            try:
-                clob_ids = json.loads(clob_ids)
-            except:
-                clob_ids = []
-        
-        if len(clob_ids) < 2:
-            print(f"BTC → нет токенов для торговли")
+        if not market.tradable:
+            print(f"{series.asset} → нет токенов для торговли")
             return False, None
         
-        token_id, price = get_token_id_and_price(market, direction)
+        token_id, price = market.token_and_price(direction)
         
         if token_id is None:
-            print(f"BTC → не удалось получить token ID для {direction}")
+            print(f"{series.asset} → не удалось получить token ID для {direction}")
             return False, None
         
         print(f"{direction} цена: {price:.4f}")
         
+        # Котировка Gamma запаздывает - если есть живой стакан в памяти,
+        # цена считается по его глубине на весь размер ставки (VWAP)
+        quote = book_feed.quote(token_id, bet_amount, PRICE_BUFFER)
+        if quote:
+            print(f"Стакан {direction}: VWAP {quote.avg_price:.4f} на {quote.shares:g} акций ({quote.levels} ур.), лимит {quote.limit_price:.4f}")
+            if not quote.full:
+                print(f"⚠️ В стакане только {quote.shares:g} из {bet_amount:g} акций, остаток будет ждать в стакане")
+            price = quote.avg_price
+            limit_price = quote.limit_price
+        else:
+            limit_price = min(0.99, price + PRICE_BUFFER)
+        
+        # Порог - по средней цене исполнения, а не по лучшей котировке
         if direction == "Down" and price > MAX_PRICE_FOR_OPPOSITE:
             print(f"Цена слишком высокая ({price:.4f} > {MAX_PRICE_FOR_OPPOSITE:.4f})")
             return False, None
         
-        available_balance = check_balance()
+        prepared = take_prepared_order(market.slug, direction, bet_amount, limit_price) if REAL_MODE else None
+        if REAL_MODE:
+            # Стек подписи нужен только для реального ордера
+            from py_clob_client.clob_types import OrderArgs, OrderType
+            from py_clob_client.order_builder.constants import BUY
+        if prepared:
+            # Баланс проверен и ордер подписан заранее - остается только отправка
+            print(f"⚡ Отправляем заранее подписанный ордер: {series.key} {direction}, цена {prepared['limit_price']:.4f}, размер ${bet_amount}")
+            with metrics.span("post_order"):
+                resp = client.post_order(prepared["signed"], OrderType.GTC)
+            balances.refresh()
+            print(f"Ответ от биржи: {resp}")
+            success, order_id = parse_order_response(resp)
+            if not success:
+                return False, None
+            return True, order_tracker.order_record(order_id, token_id, prepared["limit_price"], bet_amount, resp)
+        
+        with metrics.span("balance_check"):
+            available_balance = check_balance()
         if available_balance is None:
             print("❌ Не удалось проверить баланс, ставка отменена")
             return False, None
@@ -492,10 +644,10 @@ def place_bet(client, market, direction, bet_amount):
         if not REAL_MODE:
             print("🧪 ТЕСТОВЫЙ РЕЖИМ: ставка не отправляется на биржу")
             mock_order_id = f"test_order_{int(time.time())}"
-            return True, mock_order_id
+            return True, order_tracker.order_record(mock_order_id, token_id, price, bet_amount)
         else:
-            bet_price = min(0.99, price + PRICE_BUFFER)
-            print(f"📤 Размещаем реальный ордер: BTC {direction}, цена {bet_price:.4f}, размер ${bet_amount}")
+            bet_price = limit_price
+            print(f"📤 Размещаем реальный ордер: {series.key} {direction}, цена {bet_price:.4f}, размер ${bet_amount}")
             
             order_args = OrderArgs(
                 token_id=token_id,
@@ -504,18 +656,17 @@ def place_bet(client, market, direction, bet_amount):
                 size=bet_amount
             )
             
-            signed = client.create_order(order_args)
-            resp = client.post_order(signed, OrderType.GTC)
+            with metrics.span("sign_order"):
+                signed = client.create_order(order_args)
+            with metrics.span("post_order"):
+                resp = client.post_order(signed, OrderType.GTC)
+            balances.refresh()
             
             print(f"Ответ от биржи: {resp}")
-            
-            if isinstance(resp, dict):
-                if "id" in resp:
-                    return True, resp["id"]
-                elif resp.get("status") in ("success", "placed"):
-                    return True, resp.get("order", {}).get("id")
-            
-            return False, None
+            success, order_id = parse_order_response(resp)
+            if not success:
+                return False, None
+            return True, order_tracker.order_record(order_id, token_id, bet_price, bet_amount, resp)
         
     except Exception as e:
         print(f"Ошибка при размещении ставки: {e}")
@@ -525,58 +676,144 @@ def place_bet(client, market, direction, bet_amount):
 
 # ========== ГЛАВНАЯ ФУНКЦИЯ ==========
 
-def main():
-    print("Запуск бота Polymarket...")
-    
-    # Используем правильное получение времени
-    et_now = get_current_et_time()
-    utc_now = get_current_utc_time()
-    utc5_now = utc_now + timedelta(hours=5)  # UTC+5 для сервера
-    
-    print(f"Время UTC: {utc_now.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Время ET: {et_now.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Время сервера (UTC+5): {utc5_now.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Интервал: 15 минут")
-    
-    client = ClobClient(
-        host=HOST,
-        key=PRIVATE_KEY,
-        chain_id=CHAIN_ID,
-        signature_type=1,
-        funder=None
-    )
-
-    generated_address = client.get_address()
-    print(f"Адрес из приватного ключа: {generated_address}")
-    print(f"Реальный адрес кошелька: {REAL_WALLET_ADDRESS}")
-    
-    print("\n=== ПРОВЕРКА БАЛАНСА ===")
-    real_balance = check_balance()
-    
-    if real_balance is None:
-        print("❌ КРИТИЧЕСКАЯ ОШИБКА: Не удалось получить баланс")
-        send_telegram("❌ Ошибка: не удалось получить баланс аккаунта")
-        return
-    
-    print(f"💰 Баланс: ${real_balance:.2f}")
-    
-    if real_balance < BASE_BET:
-        print(f"⚠️ Баланс меньше минимальной ставки ${BASE_BET}")
-        send_telegram(f"⚠️ Баланс ${real_balance:.2f} меньше минимальной ставки ${BASE_BET}")
-        return
+def create_client():
+    """Клиент CLOB для реального кошелька. py_clob_client импортируется,
+    а API creds загружаются (CREDS_CACHE_FILE) при первом запросе к бирже"""
+    return ClobSession(HOST, PRIVATE_KEY, CHAIN_ID, CREDS_CACHE_FILE,
+                       signature_type=1, funder=None, metrics=metrics)
 
+def init_api_creds(client):
+    """Сразу создает клиент и устанавливает API creds (режим демона)"""
     try:
-        api_creds = client.create_or_derive_api_creds()
-        client.set_api_creds(api_creds)
+        client.start()
+        print(f"Адрес из приватного ключа: {client.get_address()}")
+        print(f"Реальный адрес кошелька: {REAL_WALLET_ADDRESS}")
         print("✅ API creds получены")
+        return True
     except Exception as e:
         print("❌ Ошибка API creds:", str(e))
-        send_telegram(f"❌ Ошибка API creds: {str(e)}")
+        send_telegram(f"❌ Ошибка API creds: {html.escape(str(e))}")
+        return False
+
+def pending_view(shards):
+    """Активные ставки всех серий одним словарем: "{серия}/{ключ ставки}" -> запись.
+
+    Записи те же, что в шардах, поэтому ордера и сделки всех серий
+    проверяются одним запросом, а изменения сохраняет save_pending.
+    """
+    return {f"{key}/{bet_key}": info
+            for key, shard in shards.items()
+            for bet_key, info in shard.state["pending_bets"].items()}
+
+def pending_tokens(shards):
+    """Токены активных ставок всех серий - их стаканы и разрешение нужны до расчета"""
+    return [info["token_id"] for info in pending_view(shards).values() if info.get("token_id")]
+
+def save_pending(shards, view_key, event):
+    key, bet_key = view_key.split("/", 1)
+    shard = shards[key]
+    save_shard(shard, event, [["set", ["pending_bets", bet_key], shard.state["pending_bets"][bet_key]]])
+
+def track_pending_orders(client, shards, before_lock=False):
+    """Исполнение ордеров ставок всех серий (один запрос).
+
+    before_lock - прогон демона перед закрытием интервала: неисполненный
+    остаток снимается. На границе интервала (cron, цикл демона) рынок прошлой
+    ставки уже закрыт, снимать нечего - только опрос.
+    """
+    pending = pending_view(shards)
+    try:
+        if before_lock:
+            changed = order_tracker.track_orders(client, pending)
+        else:
+            changed = order_tracker.poll_orders(client, pending)
+    except Exception as e:
+        print(f"Ошибка проверки ордеров: {e}")
         return
+    for key in changed:
+        info = pending[key]
+        print(f"📋 Ордер {key}: {info['order_status']}, исполнено {info['filled']} из {info['size']}")
+        save_pending(shards, key, "order_update")
 
-    state = load_state()
+def reconcile_fills(client, state, shards):
+    """Цена и объем ставок по фактическим сделкам, только новые сделки после курсора"""
+    pending = pending_view(shards)
+    try:
+        changed, cursor = order_tracker.reconcile_trades(client, pending, state.get("trade_cursor"))
+    except Exception as e:
+        print(f"Ошибка сверки сделок: {e}")
+        return
+    for key in changed:
+        info = pending[key]
+        print(f"🧾 Сделки {key}: исполнено {info['filled']} по средней цене {info['price']}")
+        save_pending(shards, key, "trade_fills")
+    if cursor != state.get("trade_cursor"):
+        state["trade_cursor"] = cursor
+        save_state(state, "trade_cursor", [["set", ["trade_cursor"], cursor]])
+
+def settle_pending_bets(state, shards):
+    """Проверяет разрешение рынков активных ставок всех серий и записывает результаты"""
+    for shard in shards.values():
+        pending = shard.state["pending_bets"]
+        for bet_key in list(pending.keys()):
+            info = pending[bet_key]
+            slug = info["slug"]
+            direction = info["direction"]
+            label = f"{shard.series.asset} {shard.series.timeframe}"
+            
+            print(f"Проверка ставки: {shard.series.key}/{bet_key}")
+            
+            status = info.get("order_status")
+            if status in order_tracker.OPEN_STATUSES:
+                print(f"   Ордер еще в стакане ({status}), ждем")
+                continue
+            if order_tracker.never_filled(info):
+                msg = f"⚪ Ордер {label} → {direction} не исполнен и снят, ставки не было"
+                print(msg)
+                send_telegram(msg)
+                del pending[bet_key]
+                save_shard(shard, "pending_removed", [["del", ["pending_bets", bet_key]]])
+                book_feed.unsubscribe([info.get("token_id")])
+                continue
+            
+            m = get_market(slug)
+            if m and m.resolved and m.winner:
+                settle_bet(state, shard, bet_key, m.winner)
+
+def settle_bet(state, shard, bet_key, w):
+    """Записывает результат ставки серии по победившему исходу w и убирает ее из активных"""
+    series = shard.series
+    info = shard.state["pending_bets"][bet_key]
+    slug = info["slug"]
+    direction = info["direction"]
+    coin = series.asset
+    label = f"{coin} {series.timeframe}"
+    
+    # Реальная позиция: исполненный объем по цене исполнения
+    cost, payout = order_tracker.bet_exposure(info)
+    stake = order_tracker.bet_stake(info)
+    
+    if w == direction:
+        profit = payout - cost
+        msg = f"✅ Выиграна ставка {label} → {direction} | +${profit:.2f}"
+        print(msg)
+        send_telegram(msg)
+        update_statistics(state, series, "win", profit, stake, direction, slug, w)
+    else:
+        profit = -cost
+        msg = f"❌ Проиграна ставка {label} → {direction} | -${cost:.2f}"
+        print(msg)
+        send_telegram(msg)
+        update_statistics(state, series, "loss", profit, stake, direction, slug, w)
+    update_martingale(shard, coin, profit, stake, direction)
+    update_last_result(shard, coin, w)
     
-    # Проверка отчетов
+    del shard.state["pending_bets"][bet_key]
+    save_shard(shard, "pending_removed", [["del", ["pending_bets", bet_key]]])
+    book_feed.unsubscribe([info.get("token_id")])
+
+def send_reports(state, real_balance):
+    """Отчеты за 6 и 24 часа, если подошло время"""
     need_6h, need_24h = check_reports(state)
     
     if need_6h:
@@ -597,7 +834,7 @@ def main():
         
         send_telegram(msg)
         state["statistics"]["last_6h_report"] = datetime.now().isoformat()
-        save_state(state)
+        save_state(state, "report_sent", [["set", ["statistics", "last_6h_report"], state["statistics"]["last_6h_report"]]])
     
     if need_24h:
         period = get_statistics_period(state, 24)
@@ -617,137 +854,375 @@ def main():
         
         send_telegram(msg)
         state["statistics"]["last_24h_report"] = datetime.now().isoformat()
-        save_state(state)
+        save_state(state, "report_sent", [["set", ["statistics", "last_24h_report"], state["statistics"]["last_24h_report"]]])
+
+def bet_on_interval(client, shard, real_balance, utc5_now):
+    """Ставка серии на начавшийся интервал. Возвращает сумму ставки (0 - ставки нет)"""
+    series = shard.series
+    coin = series.asset
     
-    # Получаем результаты двух предыдущих интервалов для BTC
-    print("\n" + "="*50)
-    print("РЕЗУЛЬТАТЫ ПРЕДЫДУЩИХ ИНТЕРВАЛОВ BTC")
-    print("="*50)
+    # Получаем результаты двух предыдущих интервалов серии
+    with metrics.span("resolution_check"):
+        prev_result_1 = get_interval_result(series, series.minutes)       # предыдущий интервал
+        prev_result_2 = get_interval_result(series, 2 * series.minutes)   # позапрошлый
+    
+    print(f"\n📊 Анализ для {series.key}:")
+    print(f"   Интервал -1: {prev_result_1 if prev_result_1 else 'Нет данных'}")
+    print(f"   Интервал -2: {prev_result_2 if prev_result_2 else 'Нет данных'}")
+    
+    # Если два предыдущих исхода одинаковые
+    if not (prev_result_1 and prev_result_2 and prev_result_1 == prev_result_2):
+        print(f"⏸️ Нет двух одинаковых исходов подряд, пропускаем")
+        return 0
+    
+    # Ставим на противоположный исход
+    next_dir = "Down" if prev_result_1 == "Up" else "Up"
+    print(f"🎯 Два одинаковых исхода: {prev_result_1}, ставим на {next_dir}")
+    
+    # Проверяем, есть ли активная ставка
+    bet_key = f"{coin}_last"
+    if bet_key in shard.state["pending_bets"]:
+        print(f"{series.key} → уже есть активная ставка")
+        return 0
+    
+    # Определяем размер ставки (мартингейл серии)
+    martingale = shard.state["martingale"]
+    if coin in martingale:
+        bet_amount = martingale[coin]["next_bet"]
+        print(f"📉 Продолжаем серию, ставка ${bet_amount}")
+    else:
+        bet_amount = BASE_BET
+        print(f"🆕 Новая серия, ставка ${bet_amount}")
+    
+    if real_balance < bet_amount:
+        print(f"❌ Недостаточно средств: баланс ${real_balance}, нужно ${bet_amount}")
+        return 0
+    
+    # Находим рынок для текущего интервала
+    current_market = find_current_interval_market(series)
+    
+    if not current_market:
+        print(f"{series.key} → рынок для текущего интервала не найден")
+        return 0
+    if current_market.resolved:
+        print(f"{series.key} → рынок уже разрешен, пропускаем")
+        return 0
+    
+    with metrics.span("place_bet"):
+        success, order = place_bet(client, series, current_market, next_dir, bet_amount)
+    if not success:
+        return 0
+    
+    now_str = utc5_now.strftime('%Y-%m-%d %H:%M:%S')
+    series_info = f"(серия {martingale[coin]['losses_count'] + 1})" if coin in martingale else "(новая серия)"
+    msg = f"💰 Ставка: {coin} {series.timeframe} → {next_dir} | ${bet_amount:.1f} {series_info}"
+    print(msg)
+    send_telegram(msg)
+    
+    shard.state["pending_bets"][bet_key] = {
+        "slug": current_market.slug,
+        "ends_at": series.interval_start() + series.seconds,
+        "direction": next_dir,
+        "amount": bet_amount,
+        "placed_at": now_str,
+        **order
+    }
+    save_shard(shard, "bet_placed", [["set", ["pending_bets", bet_key], shard.state["pending_bets"][bet_key]]])
+    return bet_amount
+
+def run_cycle(client, state, shards, due=None):
+    """Один проход бота: отчеты, проверка ставок и ставки на новые интервалы.
+
+    due - серии, у которых сейчас начинается интервал: None - определить
+    по текущему времени (is_boundary своего таймфрейма), демон передает
+    серии своей границы.
+    """
+    # Используем правильное получение времени
+    et_now = get_current_et_time()
+    utc_now = get_current_utc_time()
+    utc5_now = utc_now + timedelta(hours=5)  # UTC+5 для сервера
+    
+    print(f"Время UTC: {utc_now.strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Время ET: {et_now.strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Время сервера (UTC+5): {utc5_now.strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Серии: {', '.join(series.key for series in SERIES)}")
+    
+    if due is None:
+        due = [series for series in SERIES if series.is_boundary()]
+    if due and REAL_MODE:
+        # Импорт py_clob_client и creds - параллельно с проверкой рынков
+        client.warm_up()
+    
+    print("\n=== ПРОВЕРКА БАЛАНСА ===")
+    with metrics.span("balance_check"):
+        real_balance = check_balance()
+    
+    if real_balance is None:
+        print("❌ КРИТИЧЕСКАЯ ОШИБКА: Не удалось получить баланс")
+        send_telegram("❌ Ошибка: не удалось получить баланс аккаунта")
+        return
+    
+    print(f"💰 Баланс: ${real_balance:.2f}")
+    
+    if real_balance < BASE_BET:
+        print(f"⚠️ Баланс меньше минимальной ставки ${BASE_BET}")
+        send_telegram(f"⚠️ Баланс ${real_balance:.2f} меньше минимальной ставки ${BASE_BET}")
+        return
     
-    btc_prev_15 = get_interval_result(15)  # 15 мин назад
-    btc_prev_30 = get_interval_result(30)  # 30 мин назад
+    # Все рынки прогона одним запросом
+    prefetch_run_markets(shards)
     
-    print(f"\n📊 Результаты BTC:")
-    print(f"   -15 мин: {btc_prev_15 if btc_prev_15 else 'Нет данных'}")
-    print(f"   -30 мин: {btc_prev_30 if btc_prev_30 else 'Нет данных'}")
+    # Получаем результаты двух предыдущих интервалов каждой серии
+    for series in SERIES:
+        print("\n" + "="*50)
+        print(f"РЕЗУЛЬТАТЫ ПРЕДЫДУЩИХ ИНТЕРВАЛОВ {series.key}")
+        print("="*50)
+        
+        with metrics.span("resolution_check"):
+            prev_1 = get_interval_result(series, series.minutes)       # предыдущий интервал
+            prev_2 = get_interval_result(series, 2 * series.minutes)   # позапрошлый
+        
+        print(f"\n📊 Результаты {series.key}:")
+        print(f"   -{series.minutes} мин: {prev_1 if prev_1 else 'Нет данных'}")
+        print(f"   -{2 * series.minutes} мин: {prev_2 if prev_2 else 'Нет данных'}")
     
     # Проверка результатов текущих ставок
     print("\n" + "="*50)
     print("ПРОВЕРКА ТЕКУЩИХ СТАВОК")
     print("="*50)
     
-    for coin_key in list(state.get("pending_bets", {}).keys()):
-        info = state["pending_bets"][coin_key]
-        slug = info["slug"]
-        direction = info["direction"]
-        amount = info["amount"]
-        price = info.get("price", 0.5)
-        coin = "BTC"
-        
-        print(f"Проверка ставки: {coin_key}")
-        
-        m = get_market(slug)
-        if m and is_market_resolved(m):
-            w = get_winner(m)
-            if w:
-                if w == direction:
-                    profit = amount * (1 / price - 1) if price > 0 else 0
-                    msg = f"✅ Выиграна ставка {coin_key} → {direction} | +${profit:.2f}"
-                    print(msg)
-                    send_telegram(msg)
-                    update_statistics(state, coin, "win", profit, amount, direction)
-                    update_last_result(state, coin, w)
-                else:
-                    profit = -amount
-                    msg = f"❌ Проиграна ставка {coin_key} → {direction} | -${amount:.2f}"
-                    print(msg)
-                    send_telegram(msg)
-                    update_statistics(state, coin, "loss", -amount, amount, direction)
-                    update_last_result(state, coin, w)
-                
-                del state["pending_bets"][coin_key]
-                save_state(state)
-
-    # Проверка нового интервала
-    print("\n" + "="*50)
-    print("ПРОВЕРКА НОВОГО 15-МИНУТНОГО ИНТЕРВАЛА BTC")
-    print("="*50)
-    
-    if is_new_interval(15):
-        print("✅ НАЧАЛО ИНТЕРВАЛА - проверяем возможность ставки...")
-        
-        # Получаем результаты двух предыдущих интервалов для BTC
-        prev_result_1 = get_interval_result(15)   # 15 мин назад
-        prev_result_2 = get_interval_result(30)   # 30 мин назад
-        
-        print(f"\n📊 Анализ для BTC:")
-        print(f"   Интервал -1 (15 мин назад): {prev_result_1 if prev_result_1 else 'Нет данных'}")
-        print(f"   Интервал -2 (30 мин назад): {prev_result_2 if prev_result_2 else 'Нет данных'}")
+    with metrics.span("order_tracking"):
+        track_pending_orders(client, shards)
+    with metrics.span("trade_reconcile"):
+        reconcile_fills(client, state, shards)
+    with metrics.span("settlement"):
+        settle_pending_bets(state, shards)
+
+    # Проверка нового интервала каждой серии
+    for series in SERIES:
+        print("\n" + "="*50)
+        print(f"ПРОВЕРКА НОВОГО ИНТЕРВАЛА {series.key}")
+        print("="*50)
         
-        # Если два предыдущих исхода одинаковые
-        if prev_result_1 and prev_result_2 and prev_result_1 == prev_result_2:
-            # Ставим на противоположный исход
-            next_dir = "Down" if prev_result_1 == "Up" else "Up"
-            print(f"🎯 Два одинаковых исхода: {prev_result_1}, ставим на {next_dir}")
-            
-            # Проверяем, есть ли активная ставка
-            bet_key = f"BTC_last"
-            if bet_key in state.get("pending_bets", {}):
-                print(f"BTC → уже есть активная ставка")
-            else:
-                # Определяем размер ставки (мартингейл)
-                if "BTC" in state["martingale"]:
-                    bet_amount = state["martingale"]["BTC"]["next_bet"]
-                    print(f"📉 Продолжаем серию, ставка ${bet_amount}")
-                else:
-                    bet_amount = BASE_BET
-                    print(f"🆕 Новая серия, ставка ${bet_amount}")
-                
-                if real_balance < bet_amount:
-                    print(f"❌ Недостаточно средств: баланс ${real_balance}, нужно ${bet_amount}")
-                else:
-                    # Находим рынок для текущего интервала
-                    current_market = find_current_interval_market()
-                    
-                    if not current_market:
-                        print(f"BTC → рынок для текущего интервала не найден")
-                    elif is_market_resolved(current_market):
-                        print(f"BTC → рынок уже разрешен, пропускаем")
-                    else:
-                        success, order_id = place_bet(client, current_market, next_dir, bet_amount)
-                        
-                        if success:
-                            now_str = utc5_now.strftime('%Y-%m-%d %H:%M:%S')
-                            series_info = f"(серия {state['martingale']['BTC']['losses_count'] + 1})" if "BTC" in state["martingale"] else "(новая серия)"
-                            msg = f"💰 Ставка: BTC 15m → {next_dir} | ${bet_amount:.1f} {series_info}"
-                            print(msg)
-                            send_telegram(msg)
-                            
-                            if "pending_bets" not in state:
-                                state["pending_bets"] = {}
-                            
-                            state["pending_bets"][bet_key] = {
-                                "slug": current_market["slug"],
-                                "direction": next_dir,
-                                "amount": bet_amount,
-                                "price": 0.5,
-                                "placed_at": now_str
-                            }
-                            save_state(state)
+        if series in due:
+            print("✅ НАЧАЛО ИНТЕРВАЛА - проверяем возможность ставки...")
+            # Ставки серий одного прогона делят один баланс
+            real_balance -= bet_on_interval(client, shards[series.key], real_balance, utc5_now)
         else:
-            print(f"⏸️ Нет двух одинаковых исходов подряд, пропускаем")
-    else:
-        current_minute = datetime.now(timezone(timedelta(hours=5))).minute
-        et_hour = get_current_et_time().hour
-        et_minute = get_current_et_time().minute
-        next_interval = ((et_minute // 15) + 1) * 15
-        if next_interval >= 60:
-            next_interval = 0
-        print(f"⏳ Следующий интервал в {et_hour}:{next_interval:02d}")
+            next_interval = interval_calendar.to_et(series.next_start())
+            print(f"⏳ Следующий интервал в {next_interval.hour}:{next_interval.minute:02d} ET")
+    
+    # Отчеты после ставки, чтобы не задерживать ордер на границе интервала
+    send_reports(state, real_balance)
+
+def main():
+    print("Запуск бота Polymarket...")
+    metrics.record("startup", time.perf_counter() - STARTED_AT)
+    
+    # Без границы интервала и открытых ордеров клиент CLOB не понадобится
+    client = create_client()
     
+    with metrics.span("state_load"):
+        state = load_state()
+        shards = load_shards(state)
+    with metrics.span("run_cycle"):
+        run_cycle(client, state, shards)
+    market_cache.save()
+    # Очередь Telegram дописывается до выгрузки метрик, чтобы в них попали
+    # время отправки (span telegram) и число отправленных пачек
+    notifier.close()
+    
+    print(f"\n{gamma.latency_summary()}")
+    print(market_cache.summary())
+    print(balances.summary())
+    print(client.summary())
+    print(notifier.summary())
+    metrics.record("total", time.perf_counter() - STARTED_AT)
+    metrics.print_summary(metrics.export())
     print("\n" + "="*50)
     print("Бот завершил работу")
     print("="*50)
 
+# ========== РЕЖИМ ДЕМОНА ==========
+
+def seconds_until_next_interval(minutes=15, now=None):
+    """Секунды до начала следующего интервала.
+
+    Интервалы Polymarket выровнены по Unix-времени (timestamp в slug кратен
+    minutes * 60), поэтому граница считается без перевода в ET.
+    """
+    if now is None:
+        now = time.time()
+    period = minutes * 60
+    return period - (now % period)
+
+def next_boundary(series_list, now=None):
+    """Ближайшая граница интервала среди серий: (секунд до нее, серии с этой границей)"""
+    if now is None:
+        now = time.time()
+    waits = {series: seconds_until_next_interval(series.minutes, now) for series in series_list}
+    delay = min(waits.values())
+    return delay, [series for series, wait in waits.items() if wait - delay < 1]
+
+def sleep_until_next_interval(series_list, offset=DAEMON_WAKE_DELAY, state=None, shards=None):
+    """Спит до ближайшей границы интервала серий + offset секунд (offset < 0 - раньше границы).
+
+    С state и shards во время ожидания разбираются push-события и запасной REST-опрос.
+    """
+    delay = next_boundary(series_list)[0] + offset
+    wake_at = time.time() + delay
+    print(f"\n💤 Ждем {delay:.1f} сек до {'начала следующего интервала' if offset >= 0 else 'подготовки ордеров'}")
+    # Спим короткими отрезками, чтобы не накапливать дрейф time.sleep
+    while True:
+        remaining = wake_at - time.time()
+        if remaining <= 0:
+            break
+        if state is None:
+            time.sleep(min(remaining, 30))
+        else:
+            wait_for_settlement(state, shards, min(remaining, 30))
+
+# ========== PUSH-РАСЧЕТ СТАВОК ==========
+
+def push_alive():
+    return book_feed.connected and user_feed is not None and user_feed.connected
+
+def bets_awaiting_resolution(shards, now):
+    """Ставки, интервал которых закрылся, а исход еще не записан"""
+    return [key for key, info in pending_view(shards).items()
+            if info.get("order_status") not in order_tracker.OPEN_STATUSES
+            and now >= (order_tracker.interval_end(info) or now)]
+
+def handle_push_event(state, shards, event):
+    """Событие user/market-канала: исполнение ордера или разрешение рынка"""
+    if event.get("event_type") == "market_resolved":
+        for shard in shards.values():
+            pending = shard.state["pending_bets"]
+            for bet_key in list(pending.keys()):
+                info = pending[bet_key]
+                status = info.get("order_status")
+                if status in order_tracker.OPEN_STATUSES or order_tracker.never_filled(info):
+                    continue
+                w = resolution_winner(event, info)
+                if w:
+                    print(f"📡 Рынок {info['slug']} разрешен: {w}")
+                    with metrics.span("settlement"):
+                        settle_bet(state, shard, bet_key, w)
+        return
+    pending = pending_view(shards)
+    for key in apply_user_event(pending, event):
+        info = pending[key]
+        if event["event_type"] == "trade":
+            print(f"📡 Сделка {key}: исполнено {info['filled']} по средней цене {info['price']}")
+        else:
+            print(f"📡 Ордер {key}: {info['order_status']}, исполнено {info['filled']} из {info['size']}")
+        save_pending(shards, key, "order_update")
+
+def wait_for_settlement(state, shards, timeout):
+    """Ждет push-событие не дольше timeout; если push молчит - REST-опрос по расписанию"""
+    now = time.time()
+    awaiting = bets_awaiting_resolution(shards, now)
+    settle_poller.watch(awaiting, now)
+    if awaiting:
+        timeout = min(timeout, settle_poller.wait_time(now))
+    try:
+        event = push_events.get(timeout=timeout)
+    except queue.Empty:
+        event = None
+    if event is not None:
+        handle_push_event(state, shards, event)
+        return
+    now = time.time()
+    if settle_poller.due(now):
+        before = len(pending_view(shards))
+        # Свежий запрос Gamma, а не снимок рынка из memo прошлого опроса
+        market_cache.begin_run()
+        with metrics.span("settlement"):
+            settle_pending_bets(state, shards)
+        settle_poller.polled(len(pending_view(shards)) != before, push_alive(), time.time())
+
+def run_daemon():
+    """Постоянный процесс: клиент, creds и состояние живут в памяти,
+    каждый цикл запускается ровно на ближайшей границе интервала серий."""
+    global user_feed
+    print("Запуск бота Polymarket в режиме демона...")
+    
+    client = create_client()
+    if not init_api_creds(client):
+        return
+    
+    state = load_state()
+    shards = load_shards(state)
+    print(f"Серии: {', '.join(series.key for series in SERIES)}")
+    # Рынки следующих интервалов загружаются в фоне заранее
+    prefetcher = IntervalPrefetcher(SERIES, market_cache, gamma.get_markets_by_slugs)
+    prefetcher.start()
+    # Токены активных ставок - чтобы разрешение их рынков пришло push-событием
+    book_feed.subscribe(pending_tokens(shards))
+    book_feed.start()
+    user_feed = UserFeed(client, push_events)
+    # Отозванные creds обновляются по 401 REST-запроса - канал переподключается с новыми
+    client.on_refresh.append(user_feed.resubscribe.set)
+    user_feed.start()
+    
+    try:
+        while True:
+            # Серии, интервал которых начнется на ближайшей границе (5m - каждую, 1h - раз в час)
+            delay, due = next_boundary(SERIES)
+            if delay > PRESIGN_LEAD:
+                sleep_until_next_interval(SERIES, -PRESIGN_LEAD, state, shards)
+                # Перед закрытием интервала - снять неисполненный остаток ордера
+                with metrics.span("order_tracking"):
+                    track_pending_orders(client, shards, before_lock=True)
+                # Исход прошлого интервала для candidate_directions - свежим запросом,
+                # а не неразрешенным снимком из memo прошлого цикла
+                market_cache.begin_run()
+                try:
+                    with metrics.span("prepare_orders"):
+                        prepare_next_interval(client, shards, due)
+                except Exception as e:
+                    print(f"❌ Ошибка подготовки ордеров: {e}")
+            sleep_until_next_interval(SERIES, state=state, shards=shards)
+            started = time.time()
+            print("\n" + "="*50)
+            print(f"ЦИКЛ ДЕМОНА {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {', '.join(series.key for series in due)}")
+            print("="*50)
+            market_cache.begin_run()
+            try:
+                with metrics.span("run_cycle"):
+                    run_cycle(client, state, shards, due=due)
+            except Exception as e:
+                print(f"❌ Ошибка в цикле демона: {e}")
+                import traceback
+                traceback.print_exc()
+            print(f"⏱️ Цикл занял {time.time() - started:.2f} сек")
+            # Токены начавшегося интервала нужны дальше только под ставками
+            book_feed.retain(pending_tokens(shards))
+            market_cache.save()
+            print(gamma.latency_summary())
+            print(market_cache.summary())
+            print(balances.summary())
+            print(book_feed.summary())
+            print(user_feed.summary())
+            print(settle_poller.summary())
+            metrics.print_summary(metrics.export())
+    except KeyboardInterrupt:
+        print("\nОстановка демона")
+    finally:
+        prefetcher.stop()
+        book_feed.stop()
+        user_feed.stop()
+        for shard in shards.values():
+            save_shard(shard)
+        save_state(state)
+
 if __name__ == "__main__":
-    main()
+    try:
+        if "--daemon" in sys.argv or DAEMON_MODE:
+            run_daemon()
+        else:
+            main()
+    finally:
+        # Демон и прерванный прогон: очередь Telegram дописывается с
+        # ограничением по времени (после close() в main() ничего не делает)
+        notifier.close()
@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import base64
+import threading
+import importlib.util
+from dataclasses import dataclass
+
+# ================== НАСТРОЙКИ ==================
+
+CACHE_VERSION = 2
+NONCE_SIZE = 12           # nonce AES-GCM
+UNAUTHORIZED = 401
+
+# ========== ШИФРОВАНИЕ КЕША CREDS ==========
+#
+# API creds CLOB лежат на диске зашифрованными AES-256-GCM (пакет
+# cryptography), ключ - HKDF-SHA256 от PRIVATE_KEY. Файл не коммитится:
+# в GitHub Actions его между прогонами хранит actions/cache, при холодном
+# старте creds просто получаются заново. Без cryptography кеш отключен.
+
+def crypto_available():
+    return importlib.util.find_spec("cryptography") is not None
+
+def _aead(secret):
+    """AESGCM с ключом из secret (cryptography импортируется только здесь)"""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"clob-creds").derive(secret.encode())
+    return AESGCM(key)
+
+def _associated_data():
+    return f"clob-creds:v{CACHE_VERSION}".encode()
+
+def seal(plaintext, secret):
+    """Шифрует bytes, возвращает словарь для JSON"""
+    aead = _aead(secret)
+    nonce = os.urandom(NONCE_SIZE)
+    return {
+        "v": CACHE_VERSION,
+        "nonce": base64.b64encode(nonce).decode(),
+        "data": base64.b64encode(aead.encrypt(nonce, plaintext, _associated_data())).decode()
+    }
+
+def unseal(blob, secret):
+    """Расшифровывает результат seal(); None - другой ключ, старый формат или файл поврежден"""
+    if blob.get("v") != CACHE_VERSION:
+        return None
+    aead = _aead(secret)
+    from cryptography.exceptions import InvalidTag
+    try:
+        nonce = base64.b64decode(blob["nonce"])
+        return aead.decrypt(nonce, base64.b64decode(blob["data"]), _associated_data())
+    except (KeyError, ValueError, InvalidTag):
+        return None
+
+# ========== КЕШ CREDS ==========
+
+@dataclass(frozen=True, slots=True)
+class CachedCreds:
+    """Те же поля, что у ApiCreds py_clob_client, без импорта библиотеки"""
+
+    api_key: str
+    api_secret: str
+    api_passphrase: str
+
+class CredsCache:
+    """Зашифрованный файл с API creds одного кошелька и одного CLOB-хоста"""
+
+    def __init__(self, path, secret, host):
+        self.path = path
+        self.secret = secret
+        self.host = host
+
+    def _usable(self):
+        """Кеш задан и есть cryptography (без нее кеш отключается с одним сообщением)"""
+        if self.path and not crypto_available():
+            print("[Creds] cryptography не установлен, кеш creds отключен")
+            self.path = None
+        return bool(self.path)
+
+    def load(self):
+        if not self._usable() or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r") as f:
+                plaintext = unseal(json.load(f), self.secret)
+            if plaintext is None:
+                print("[Creds] Кеш не расшифровывается этим ключом, получаем заново")
+                return None
+            data = json.loads(plaintext)
+        except (OSError, ValueError) as e:
+            print(f"[Creds] Ошибка чтения кеша: {e}")
+            return None
+        if data.get("host") != self.host:
+            return None
+        return CachedCreds(data["api_key"], data["api_secret"], data["api_passphrase"])
+
+    def save(self, creds):
+        if not self._usable():
+            return
+        plaintext = json.dumps({
+            "host": self.host,
+            "api_key": creds.api_key,
+            "api_secret": creds.api_secret,
+            "api_passphrase": creds.api_passphrase,
+            "saved_at": int(time.time())
+        }).encode()
+        tmp_path = self.path + ".tmp"
+        # Только владелец может читать файл
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(seal(plaintext, self.secret), f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+# ========== ЛЕНИВЫЙ КЛИЕНТ CLOB ==========
+#
+# py_clob_client со стеком подписи (web3, eth-account) импортируется почти
+# секунду, а create_or_derive_api_creds - подписанный сетевой запрос. Прогон
+# не на границе интервала и без открытых ордеров не трогает CLOB вообще,
+# поэтому клиент создается при первом обращении, а creds берутся из кеша.
+# Ответ 401 значит, что creds отозваны: они получаются заново и запрос
+# повторяется один раз.
+
+def is_unauthorized(error):
+    return getattr(error, "status_code", None) == UNAUTHORIZED
+
+class ClobSession:
+    """ClobClient, который создается при первом запросе, с кешем API creds"""
+
+    def __init__(self, host, private_key, chain_id, cache_path, signature_type=1, funder=None, metrics=None):
+        self.host = host
+        self.private_key = private_key
+        self.chain_id = chain_id
+        self.signature_type = signature_type
+        self.funder = funder
+        self.metrics = metrics
+        self.cache = CredsCache(cache_path, private_key, host)
+        self.lock = threading.RLock()
+        self._client = None
+        self._creds = None
+        self.on_refresh = []   # вызываются после получения новых creds (переподключение WS)
+        self.cache_hits = 0
+        self.derived = 0
+        self.refreshed = 0
+
+    def _span(self, name, fn):
+        if self.metrics is None:
+            return fn()
+        with self.metrics.span(name):
+            return fn()
+
+    @property
+    def started(self):
+        """Создан ли уже клиент (импортирована ли библиотека)"""
+        return self._client is not None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self.start()
+        return self._client
+
+    @property
+    def creds(self):
+        """API creds: из памяти, из кеша или полученные у CLOB"""
+        with self.lock:
+            if self._creds is None:
+                cached = self.cache.load()
+                if cached is not None:
+                    self.cache_hits += 1
+                    self._creds = cached
+                else:
+                    self.start()
+            return self._creds
+
+    def start(self):
+        """Импорт библиотеки, создание клиента и установка creds (один раз)"""
+        with self.lock:
+            if self._client is None:
+                self._start()
+
+    def warm_up(self):
+        """start() в фоновом потоке - пока идут остальные запросы прогона"""
+        def run():
+            try:
+                self.start()
+            except Exception as e:
+                print(f"[Creds] Ошибка подготовки клиента CLOB: {e}")
+        threading.Thread(target=run, name="clob-warm-up", daemon=True).start()
+
+    def _start(self):
+        def build():
+            from py_clob_client.client import ClobClient
+            return ClobClient(host=self.host, key=self.private_key, chain_id=self.chain_id,
+                              signature_type=self.signature_type, funder=self.funder)
+        client = self._span("client_init", build)
+        if self._creds is None:
+            self._creds = self.cache.load()
+            if self._creds is not None:
+                self.cache_hits += 1
+        if self._creds is not None:
+            self._set_creds(client, self._creds)
+        else:
+            self._derive(client)
+        # Другие потоки видят клиент только с установленными creds
+        self._client = client
+
+    def _set_creds(self, client, creds):
+        from py_clob_client.clob_types import ApiCreds
+        api_creds = ApiCreds(api_key=creds.api_key, api_secret=creds.api_secret,
+                             api_passphrase=creds.api_passphrase)
+        client.set_api_creds(api_creds)
+        self._creds = api_creds
+
+    def _derive(self, client):
+        creds = self._span("api_creds", client.create_or_derive_api_creds)
+        self.derived += 1
+        self._set_creds(client, creds)
+        try:
+            self.cache.save(creds)
+        except OSError as e:
+            print(f"[Creds] Не удалось сохранить кеш: {e}")
+
+    def refresh(self):
+        """Отозванные creds: удаляет кеш и получает новые"""
+        print("[Creds] CLOB ответил 401, получаем API creds заново")
+        with self.lock:
+            self.refreshed += 1
+            self.cache.clear()
+            self._creds = None
+            if self._client is None:
+                self._start()
+            else:
+                self._derive(self._client)
+        for callback in self.on_refresh:
+            callback()
+
+    def call(self, method, *args, **kwargs):
+        """Вызов метода ClobClient с одним повтором после обновления creds на 401"""
+        try:
+            return getattr(self.client, method)(*args, **kwargs)
+        except Exception as e:
+            if not is_unauthorized(e):
+                raise
+            self.refresh()
+            return getattr(self.client, method)(*args, **kwargs)
+
+    def get_address(self):
+        return self.client.get_address()
+
+    def get_orders(self, *args, **kwargs):
+        return self.call("get_orders", *args, **kwargs)
+
+    def get_order(self, *args, **kwargs):
+        return self.call("get_order", *args, **kwargs)
+
+    def get_trades(self, *args, **kwargs):
+        return self.call("get_trades", *args, **kwargs)
+
+    def cancel_orders(self, *args, **kwargs):
+        return self.call("cancel_orders", *args, **kwargs)
+
+    def create_order(self, *args, **kwargs):
+        return self.client.create_order(*args, **kwargs)
+
+    def post_order(self, *args, **kwargs):
+        return self.call("post_order", *args, **kwargs)
+
+    def summary(self):
+        if not self.started:
+            return "CLOB: клиент не понадобился"
+        return (f"CLOB: creds из кеша {self.cache_hits}, получено {self.derived}, "
+                f"обновлено после 401 {self.refreshed}")
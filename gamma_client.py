@@ -0,0 +1,138 @@
+import os
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# ================== НАСТРОЙКИ ==================
+
+GAMMA_HOST = os.environ.get("GAMMA_HOST", "https://gamma-api.polymarket.com")
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3       # базовая пауза между попытками, сек
+RETRY_BACKOFF_MAX = 4.0
+POOL_SIZE = 10
+BATCH_SIZE = 50           # slug-ов в одном запросе /markets
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# ========== КЛИЕНТ GAMMA API ==========
+
+class GammaClient:
+    """Клиент Gamma API с keep-alive пулом соединений и повторами.
+
+    Одна сессия переиспользует TCP+TLS соединение между запросами,
+    ответы 5xx/429 и сетевые ошибки повторяются с экспоненциальной
+    паузой и джиттером. Время каждого вызова копится в self.stats
+    (под self.lock - клиент вызывается из нескольких потоков).
+    """
+
+    def __init__(self, host=GAMMA_HOST, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff=RETRY_BACKOFF, pool_size=POOL_SIZE):
+        self.host = host.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.stats = {
+            "calls": 0,
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "total_time": 0.0,
+            "max_time": 0.0
+        }
+        self.lock = threading.Lock()
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _sleep_before_retry(self, attempt, resp=None):
+        delay = min(RETRY_BACKOFF_MAX, self.backoff * (2 ** attempt))
+        if resp is not None and resp.headers.get("Retry-After"):
+            try:
+                delay = max(delay, float(resp.headers["Retry-After"]))
+            except ValueError:
+                pass
+        # Полный джиттер, чтобы параллельные запросы не били в API одновременно
+        time.sleep(random.uniform(0, delay))
+
+    def get_json(self, path, params=None):
+        """GET {host}{path} с повторами. Бросает исключение после последней попытки"""
+        url = f"{self.host}{path}"
+        started = time.perf_counter()
+        self._count("calls")
+        try:
+            for attempt in range(self.max_retries + 1):
+                self._count("requests")
+                try:
+                    resp = self.session.get(url, params=params, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt >= self.max_retries:
+                        raise
+                    self._count("retries")
+                    self._sleep_before_retry(attempt)
+                    continue
+
+                if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    self._count("retries")
+                    self._sleep_before_retry(attempt, resp)
+                    continue
+
+                resp.raise_for_status()
+                return resp.json()
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.stats["total_time"] += elapsed
+                self.stats["max_time"] = max(self.stats["max_time"], elapsed)
+
+    def get_market(self, slug):
+        """Рынок по slug или None, если такого рынка нет"""
+        markets = self.get_json("/markets", params={"slug": slug})
+        return markets[0] if markets else None
+
+    def get_markets_by_slugs(self, slugs, batch_size=BATCH_SIZE):
+        """Несколько рынков за один запрос (/markets?slug=a&slug=b...).
+
+        Возвращает словарь slug -> рынок; slug-и, которых нет в ответе,
+        отображаются в None.
+        """
+        slugs = list(dict.fromkeys(slugs))
+        result = {slug: None for slug in slugs}
+        for i in range(0, len(slugs), batch_size):
+            chunk = slugs[i:i + batch_size]
+            params = [("slug", slug) for slug in chunk] + [("limit", len(chunk))]
+            for market in self.get_json("/markets", params=params) or []:
+                if market.get("slug") in result:
+                    result[market["slug"]] = market
+        return result
+
+    def list_markets(self, limit=100):
+        """Список последних рынков (для поиска по названию)"""
+        return self.get_json("/markets", params={"limit": limit})
+
+    def latency_summary(self):
+        """Строка со статистикой запросов для лога"""
+        with self.lock:
+            s = dict(self.stats)
+        avg = s["total_time"] / s["calls"] if s["calls"] else 0.0
+        return (f"Gamma API: вызовов {s['calls']}, запросов {s['requests']}, "
+                f"повторов {s['retries']}, ошибок {s['errors']}, "
+                f"среднее {avg * 1000:.0f} мс, макс {s['max_time'] * 1000:.0f} мс")
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,206 @@
+import sys
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+# ========== ИСТОРИЯ СТАВОК В SQLITE ==========
+#
+# Необязательное хранилище полной истории: все завершенные ставки и исходы
+# интервалов без ограничения в 1000 записей, с индексами по времени,
+# монете, таймфрейму и направлению. Включается переменной окружения HISTORY_DB.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bets (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    coin TEXT NOT NULL,
+    timeframe TEXT NOT NULL DEFAULT '15m',
+    direction TEXT,
+    result TEXT NOT NULL,
+    profit REAL NOT NULL,
+    bet_amount REAL NOT NULL,
+    slug TEXT,
+    outcome TEXT,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bets_ts ON bets(ts);
+CREATE INDEX IF NOT EXISTS idx_bets_coin_ts ON bets(coin, ts);
+CREATE INDEX IF NOT EXISTS idx_bets_direction_ts ON bets(direction, ts);
+
+CREATE TABLE IF NOT EXISTS intervals (
+    slug TEXT PRIMARY KEY,
+    coin TEXT NOT NULL,
+    timeframe TEXT NOT NULL DEFAULT '15m',
+    ts INTEGER NOT NULL,
+    outcome TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_intervals_coin_ts ON intervals(coin, ts);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Таймфрейм появился вместе с сериями 5m/1h: в старых БД колонка
+# добавляется миграцией, прежние записи - это 15m
+TIMEFRAME_TABLES = ("bets", "intervals")
+TIMEFRAME_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_bets_coin_timeframe_ts ON bets(coin, timeframe, ts);
+CREATE INDEX IF NOT EXISTS idx_intervals_coin_timeframe_ts ON intervals(coin, timeframe, ts);
+"""
+
+GROUP_COLUMNS = {
+    "coin": "coin",
+    "timeframe": "timeframe",
+    "direction": "direction",
+    "result": "result",
+    "day": "date(ts, 'unixepoch', 'localtime')",
+    "hour": "strftime('%Y-%m-%dT%H', ts, 'unixepoch', 'localtime')"
+}
+
+class HistoryStore:
+    """Полная история ставок и исходов интервалов в SQLite"""
+
+    def __init__(self, path, source=None):
+        self.path = path
+        self.source = source
+        # Соединение общее для потоков test_bot.py, запись - под lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.row_factory = sqlite3.Row
+        # WAL + synchronous=NORMAL: добавление записи - одна дешевая транзакция
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate_timeframe()
+        self.conn.executescript(TIMEFRAME_INDEXES)
+        self.conn.commit()
+
+    def _migrate_timeframe(self):
+        for table in TIMEFRAME_TABLES:
+            columns = [row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+            if "timeframe" not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN timeframe TEXT NOT NULL DEFAULT '15m'")
+                print(f"[История] Таблица {table}: добавлена колонка timeframe (старые записи - 15m)")
+
+    def close(self):
+        self.conn.close()
+
+    def add_bet(self, coin, result, profit, bet_amount, direction=None, slug=None, outcome=None, ts=None,
+                timeframe="15m"):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO bets (ts, coin, timeframe, direction, result, profit, bet_amount, slug, outcome, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (ts if ts is not None else time.time(), coin, timeframe, direction, result, profit,
+                 bet_amount, slug, outcome, self.source)
+            )
+
+    def add_interval(self, slug, coin, timestamp, outcome, timeframe="15m"):
+        """Исход интервала (повторная запись того же slug игнорируется)"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO intervals (slug, coin, timeframe, ts, outcome) VALUES (?, ?, ?, ?, ?)",
+                (slug, coin, timeframe, int(timestamp), outcome)
+            )
+
+    def migrate_state(self, state, name):
+        """Переносит statistics.history из файла состояния (один раз на name)"""
+        key = f"migrated:{name}"
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return 0
+        rows = []
+        for entry in state.get("statistics", {}).get("history", []):
+            ts = datetime.fromisoformat(entry["timestamp"]).timestamp()
+            rows.append((ts, entry["coin"], entry.get("timeframe", "15m"), entry.get("direction"),
+                         entry["result"], entry["profit"], entry["bet_amount"], "migration"))
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO bets (ts, coin, timeframe, direction, result, profit, bet_amount, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, datetime.now().isoformat()))
+        print(f"[История] Перенесено {len(rows)} записей из {name}")
+        return len(rows)
+
+    def _where(self, since=None, until=None, coin=None, direction=None):
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if coin is not None:
+            clauses.append("coin = ?")
+            params.append(coin)
+        if direction is not None:
+            clauses.append("direction = ?")
+            params.append(direction)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def period_stats(self, since=None, until=None, coin=None, direction=None):
+        """Сводка за период [since, until) по unix-времени"""
+        where, params = self._where(since, until, coin, direction)
+        row = self.conn.execute(
+            "SELECT COUNT(*) AS bets, COALESCE(SUM(profit), 0) AS profit, "
+            "COALESCE(SUM(profit > 0), 0) AS wins, COALESCE(SUM(bet_amount), 0) AS volume "
+            "FROM bets" + where, params
+        ).fetchone()
+        bets = row["bets"]
+        return {
+            "profit": row["profit"],
+            "bets": bets,
+            "wins": row["wins"],
+            "losses": bets - row["wins"],
+            "volume": row["volume"],
+            "win_rate": (row["wins"] / bets * 100) if bets else 0
+        }
+
+    def group_stats(self, by, since=None, until=None, coin=None, direction=None):
+        """Сводка с группировкой по coin / timeframe / direction / result / day / hour"""
+        column = GROUP_COLUMNS[by]
+        where, params = self._where(since, until, coin, direction)
+        rows = self.conn.execute(
+            f"SELECT {column} AS key, COUNT(*) AS bets, SUM(profit) AS profit, "
+            f"SUM(profit > 0) AS wins FROM bets{where} GROUP BY key ORDER BY key",
+            params
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def interval_outcomes(self, coin, timeframe="15m", since=None, until=None):
+        """Исходы интервалов серии (монета + таймфрейм) по времени: [(ts, outcome), ...]"""
+        query = "SELECT ts, outcome FROM intervals WHERE coin = ? AND timeframe = ?"
+        params = [coin, timeframe]
+        if since is not None:
+            query += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND ts < ?"
+            params.append(until)
+        return [tuple(row) for row in self.conn.execute(query + " ORDER BY ts", params)]
+
+# ========== ЗАПУСК ИЗ КОМАНДНОЙ СТРОКИ ==========
+
+def main():
+    """python history_store.py history.db [дней] [coin|timeframe|direction|result|day|hour]"""
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return
+    store = HistoryStore(sys.argv[1])
+    days = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    by = sys.argv[3] if len(sys.argv) > 3 else "coin"
+    since = time.time() - days * 86400 if days else None
+
+    total = store.period_stats(since=since)
+    print(f"Ставок: {total['bets']} | ✅ {total['wins']} | ❌ {total['losses']} | "
+          f"Прибыль: ${total['profit']:.2f} | Винрейт: {total['win_rate']:.1f}%")
+    for row in store.group_stats(by, since=since):
+        print(f"  {row['key']}: ставок {row['bets']}, прибыль ${row['profit']:.2f}, выигрышей {row['wins']}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
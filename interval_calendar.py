@@ -0,0 +1,87 @@
+import time
+import threading
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+# ================== НАСТРОЙКИ ==================
+
+ET = ZoneInfo("America/New_York")   # время рынков Polymarket (EST/EDT)
+INTERVAL_MINUTES = 15
+PREFETCH_AHEAD = 4       # сколько следующих интервалов держать загруженными
+PREFETCH_PERIOD = 60     # как часто фоновый поток проверяет новые интервалы, сек
+
+# ========== КАЛЕНДАРЬ ИНТЕРВАЛОВ ==========
+#
+# Timestamp в slug рынка - Unix-время начала интервала, кратное 900 сек.
+# Поэтому границы и slug-и считаются от Unix-времени напрямую, а ET нужен
+# только для отображения и для поиска по названию рынка ("October 18,
+# 1:15 AM"). Перевод в ET идет через zoneinfo с учетом летнего времени.
+
+def now_et():
+    return datetime.now(ET)
+
+def to_et(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=ET)
+
+def to_utc(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+def interval_start(minutes_ago=0, now=None, minutes=INTERVAL_MINUTES):
+    """Timestamp начала интервала, который был minutes_ago минут назад"""
+    if now is None:
+        now = time.time()
+    target = int(now) - minutes_ago * 60
+    return target - target % (minutes * 60)
+
+def next_interval_start(now=None, minutes=INTERVAL_MINUTES):
+    return interval_start(0, now, minutes) + minutes * 60
+
+def upcoming_intervals(count=PREFETCH_AHEAD, now=None, minutes=INTERVAL_MINUTES):
+    """Timestamp-ы начала следующих count интервалов"""
+    first = next_interval_start(now, minutes)
+    return [first + i * minutes * 60 for i in range(count)]
+
+def market_slug(coin, timestamp, timeframe="15m"):
+    return f"{coin.lower()}-updown-{timeframe}-{timestamp}"
+
+def question_time(timestamp):
+    """Время начала интервала так, как оно написано в названии рынка (ET)"""
+    dt = to_et(timestamp)
+    hour_12 = dt.hour % 12 or 12
+    ampm = "AM" if dt.hour < 12 else "PM"
+    return f"{dt.strftime('%B')} {dt.day}, {hour_12}:{dt.minute:02d} {ampm}"
+
+# ========== ФОНОВАЯ ЗАГРУЗКА СЛЕДУЮЩИХ РЫНКОВ ==========
+
+class IntervalPrefetcher(threading.Thread):
+    """Заранее загружает рынки следующих интервалов в MarketCache.prefetch.
+
+    Токены и название рынка не меняются, поэтому к началу интервала они уже
+    известны; цены по-прежнему берутся свежим запросом прогона. series -
+    серии рынков (market_series.MarketSeries), у каждой свой шаг интервала.
+    """
+
+    def __init__(self, series, cache, fetch_many, ahead=PREFETCH_AHEAD, period=PREFETCH_PERIOD):
+        super().__init__(name="interval-prefetch", daemon=True)
+        self.series = series
+        self.cache = cache
+        self.fetch_many = fetch_many
+        self.ahead = ahead
+        self.period = period
+        self.stop_event = threading.Event()
+
+    def prefetch_once(self):
+        slugs = [s.slug(ts) for s in self.series for ts in s.upcoming(self.ahead)]
+        try:
+            return self.cache.prefetch(slugs, self.fetch_many)
+        except Exception as e:
+            print(f"[Календарь] Ошибка загрузки следующих рынков: {e}")
+            return 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.prefetch_once()
+            self.stop_event.wait(self.period)
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+
+from market_snapshot import MarketSnapshot
+
+# ================== НАСТРОЙКИ ==================
+
+CACHE_FILE = "market_cache.json"
+MAX_ENTRIES = 2000              # максимум разрешенных рынков на диске
+MAX_AGE = 14 * 24 * 3600        # сколько хранить запись без обращений, сек
+PREFETCH_MAX_AGE = 2 * 3600     # сколько держать заранее загруженные рынки, сек
+
+# ========== КЕШ РЫНКОВ ==========
+
+class MarketCache:
+    """Кеш рынков по slug.
+
+    memo - снимки MarketSnapshot на время одного прогона (в т.ч. для еще не
+    разрешенных рынков), resolved - LRU разрешенных рынков (поля снимка и
+    last_used), сохраняется на диск, upcoming - снимки рынков будущих интервалов,
+    загруженные заранее (только токены и метаданные - цены в них устаревают).
+    Наружу отдаются только снимки, каждый рынок разбирается один раз.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES, max_age=MAX_AGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.memo = {}
+        self.missing = set()
+        self.resolved = OrderedDict()
+        self.upcoming = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        # Кеш используется из нескольких потоков (параллельные монеты)
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[Кеш] Не удалось прочитать {self.path}: {e}")
+            return
+        entries = []
+        for slug, entry in data.get("markets", {}).items():
+            try:
+                if "market" in entry:
+                    # Старый формат - полный словарь Gamma, переводим в снимок
+                    snapshot = MarketSnapshot.from_market(entry["market"])
+                    self.dirty = True
+                else:
+                    snapshot = MarketSnapshot(**entry["snapshot"])
+            except (KeyError, TypeError) as e:
+                print(f"[Кеш] Пропущена запись {slug}: {e}")
+                self.dirty = True
+                continue
+            entries.append((slug, {"snapshot": snapshot, "last_used": entry.get("last_used", 0)}))
+        entries.sort(key=lambda kv: kv[1]["last_used"])
+        self.resolved = OrderedDict(entries)
+        self.evict()
+
+    def save(self):
+        """Атомарно записывает разрешенные рынки на диск (только если были изменения)"""
+        if not self.path or not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with self.lock:
+                markets = {slug: {"snapshot": asdict(e["snapshot"]), "last_used": e["last_used"]}
+                           for slug, e in self.resolved.items()}
+            with open(tmp_path, "w") as f:
+                json.dump({"markets": markets}, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except Exception as e:
+            print(f"[Кеш] Не удалось сохранить {self.path}: {e}")
+
+    def begin_run(self):
+        """Сбрасывает memo нового прогона (разрешенные рынки остаются)"""
+        with self.lock:
+            self.memo.clear()
+            self.missing.clear()
+
+    def evict(self):
+        """Удаляет записи старше max_age, затем самые давно использованные сверх max_entries"""
+        cutoff = time.time() - self.max_age
+        for slug in [s for s, e in self.resolved.items() if e["last_used"] < cutoff]:
+            del self.resolved[slug]
+            self.dirty = True
+        while len(self.resolved) > self.max_entries:
+            self.resolved.popitem(last=False)
+            self.dirty = True
+
+    def lookup(self, slug):
+        """Рынок из кеша или None (без обращения к API)"""
+        with self.lock:
+            if slug in self.memo:
+                self.hits += 1
+                return self.memo[slug]
+            entry = self.resolved.get(slug)
+            if entry is not None:
+                # last_used попадет на диск со следующим новым рынком: ради
+                # одного чтения файл не перезаписывается
+                self.hits += 1
+                entry["last_used"] = time.time()
+                self.resolved.move_to_end(slug)
+                self.memo[slug] = entry["snapshot"]
+                return entry["snapshot"]
+            return None
+
+    def put(self, slug, market):
+        """Разбирает словарь Gamma в снимок, окончательные рынки - в resolved"""
+        snapshot = MarketSnapshot.from_market(market)
+        with self.lock:
+            self.memo[slug] = snapshot
+            if snapshot.final:
+                self.resolved[slug] = {"snapshot": snapshot, "last_used": time.time()}
+                self.resolved.move_to_end(slug)
+                self.dirty = True
+                self.evict()
+        return snapshot
+
+    def get(self, slug, fetch):
+        """Снимок рынка по slug: memo → диск → fetch(slug).
+
+        Промахи (None) между прогонами не кешируются, но slug-и, не найденные
+        пакетным get_many, в этом прогоне повторно не запрашиваются.
+        """
+        market = self.lookup(slug)
+        with self.lock:
+            if market is not None or slug in self.missing:
+                return market
+            self.misses += 1
+        market = fetch(slug)
+        if market is None:
+            return None
+        return self.put(slug, market)
+
+    def get_many(self, slugs, fetch_many):
+        """Рынки для списка slug-ов: из кеша, остальные одним fetch_many(slugs).
+
+        Возвращает словарь slug -> MarketSnapshot или None (рынок не найден).
+        """
+        result = {}
+        to_fetch = []
+        for slug in dict.fromkeys(slugs):
+            market = self.lookup(slug)
+            if market is not None:
+                result[slug] = market
+            else:
+                to_fetch.append(slug)
+        if to_fetch:
+            with self.lock:
+                self.misses += len(to_fetch)
+            fetched = fetch_many(to_fetch)
+            for slug in to_fetch:
+                market = fetched.get(slug)
+                if market is not None:
+                    result[slug] = self.put(slug, market)
+                else:
+                    with self.lock:
+                        self.missing.add(slug)
+                    result[slug] = None
+        return result
+
+    def prefetch(self, slugs, fetch_many):
+        """Загружает еще не известные рынки будущих интервалов одним запросом.
+
+        Возвращает число новых рынков. memo не трогается, поэтому begin_run
+        их не сбрасывает, а get() все равно берет свежие цены.
+        """
+        now = time.time()
+        with self.lock:
+            for slug in [s for s, e in self.upcoming.items() if e["fetched_at"] < now - PREFETCH_MAX_AGE]:
+                del self.upcoming[slug]
+            to_fetch = [slug for slug in dict.fromkeys(slugs) if slug not in self.upcoming]
+        if not to_fetch:
+            return 0
+        fetched = fetch_many(to_fetch)
+        added = 0
+        with self.lock:
+            for slug in to_fetch:
+                if fetched.get(slug) is not None:
+                    self.upcoming[slug] = {"market": MarketSnapshot.from_market(fetched[slug]), "fetched_at": now}
+                    added += 1
+        return added
+
+    def upcoming_market(self, slug):
+        """Заранее загруженный снимок рынка (метаданные) или None"""
+        with self.lock:
+            entry = self.upcoming.get(slug)
+            return entry["market"] if entry else None
+
+    def summary(self):
+        return (f"Кеш рынков: попаданий {self.hits}, промахов {self.misses}, на диске {len(self.resolved)}, "
+                f"заранее загружено {len(self.upcoming)}")
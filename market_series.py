@@ -0,0 +1,155 @@
+import os
+import re
+from dataclasses import dataclass
+
+import interval_calendar
+from state_journal import StateJournal
+
+# ================== НАСТРОЙКИ ==================
+
+TIMEFRAME_MINUTES = {"5m": 5, "15m": 15, "1h": 60}
+
+UPDOWN_TEMPLATE = "{asset}-updown-{timeframe}-{ts}"
+# Часовые рынки называются по времени начала в ET, а не по timestamp
+HOURLY_TEMPLATE = "{asset_name}-up-or-down-{month}-{day}-{hour12}{ampm}-et"
+DEFAULT_TEMPLATES = {"5m": UPDOWN_TEMPLATE, "15m": UPDOWN_TEMPLATE, "1h": HOURLY_TEMPLATE}
+
+ASSET_NAMES = {"BTC": "bitcoin", "ETH": "ethereum", "SOL": "solana", "XRP": "xrp"}
+
+BOUNDARY_WINDOW = 60     # сколько секунд после начала интервала считается его началом
+
+UPDOWN_SLUG = re.compile(r"-updown-(\d+)([mh])-(\d+)$")
+
+# ========== СЕРИИ РЫНКОВ ==========
+#
+# Серия - один повторяющийся рынок Up/Down: актив, таймфрейм и шаблон slug.
+# Вся арифметика интервалов (начало, следующий, граница) и slug-и идут
+# через серию, поэтому BTC 15m, ETH 5m и SOL 1h обрабатываются одним кодом.
+
+@dataclass(frozen=True, slots=True)
+class MarketSeries:
+    asset: str         # "BTC"
+    timeframe: str     # "5m" / "15m" / "1h"
+    template: str      # шаблон slug, см. slug()
+
+    @property
+    def key(self):
+        """Имя серии в состоянии и логах: BTC_15m"""
+        return f"{self.asset}_{self.timeframe}"
+
+    @property
+    def minutes(self):
+        return TIMEFRAME_MINUTES[self.timeframe]
+
+    @property
+    def seconds(self):
+        return self.minutes * 60
+
+    def interval_start(self, intervals_ago=0, now=None):
+        """Timestamp начала интервала intervals_ago интервалов назад"""
+        return interval_calendar.interval_start(intervals_ago * self.minutes, now, self.minutes)
+
+    def next_start(self, now=None):
+        return interval_calendar.next_interval_start(now, self.minutes)
+
+    def upcoming(self, count, now=None):
+        return interval_calendar.upcoming_intervals(count, now, self.minutes)
+
+    def is_boundary(self, now=None, window=BOUNDARY_WINDOW):
+        """Идет ли первая window секунд интервала"""
+        if now is None:
+            now = interval_calendar.time.time()
+        return now - self.interval_start(0, now) < window
+
+    def slug(self, timestamp):
+        """Slug рынка интервала: поля шаблона asset, asset_name, timeframe, ts
+        и время начала в ET - month, day, hour12, ampm"""
+        dt = interval_calendar.to_et(timestamp)
+        return self.template.format(
+            asset=self.asset.lower(),
+            asset_name=ASSET_NAMES.get(self.asset, self.asset.lower()),
+            timeframe=self.timeframe,
+            ts=timestamp,
+            month=dt.strftime("%B").lower(),
+            day=dt.day,
+            hour12=dt.hour % 12 or 12,
+            ampm="am" if dt.hour < 12 else "pm"
+        )
+
+    def question_matches(self, question, timestamp):
+        """Подходит ли название рынка к интервалу (запасной поиск без slug)"""
+        if self.asset not in question or interval_calendar.question_time(timestamp) not in question:
+            return False
+        return self.minutes >= 60 or f"{self.minutes} min" in question.lower()
+
+def market_series(asset, timeframe="15m", template=None):
+    asset = asset.upper()
+    if timeframe not in TIMEFRAME_MINUTES:
+        raise ValueError(f"Неизвестный таймфрейм {timeframe}, доступны: {', '.join(TIMEFRAME_MINUTES)}")
+    return MarketSeries(asset, timeframe, template or DEFAULT_TEMPLATES[timeframe])
+
+def parse_series(spec):
+    """'BTC:15m,ETH:5m,SOL' -> список серий (таймфрейм по умолчанию 15m)"""
+    result = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        asset, _, timeframe = item.partition(":")
+        result.append(market_series(asset, timeframe or "15m"))
+    return result
+
+def slug_interval_end(slug):
+    """Конец интервала по slug вида {asset}-updown-{tf}-{ts} (None - другой шаблон)"""
+    match = UPDOWN_SLUG.search(slug)
+    if not match:
+        return None
+    value, unit, start = match.groups()
+    return int(start) + int(value) * (60 if unit == "m" else 3600)
+
+# ========== СОСТОЯНИЕ СЕРИИ ==========
+#
+# У каждой серии свой снимок и журнал ({directory}/{key}.json и .journal):
+# активные ставки, мартингейл и последние исходы. Общими остаются только
+# статистика и курсор сделок в корневом состоянии бота, поэтому новые
+# серии не увеличивают ни файл, ни журнал соседних.
+
+SHARD_KEYS = ("pending_bets", "last_results", "martingale")
+
+class SeriesShard:
+    """Снимок + журнал состояния одной серии"""
+
+    def __init__(self, series, directory):
+        self.series = series
+        path = os.path.join(directory, series.key)
+        self.journal = StateJournal(path + ".json", path + ".journal")
+        self.state = None
+
+    def default_state(self):
+        return {"series": self.series.key, "pending_bets": {}, "last_results": {}, "martingale": {}}
+
+    def load(self):
+        os.makedirs(os.path.dirname(self.journal.snapshot_path) or ".", exist_ok=True)
+        self.state = self.journal.load(self.default_state)
+        for key in SHARD_KEYS:
+            self.state.setdefault(key, {})
+        return self.state
+
+    def save(self, event=None, ops=None):
+        """Без ops - полный снимок, с ops - одно событие в журнал"""
+        if ops is None:
+            self.journal.compact(self.state)
+        else:
+            self.journal.append(self.state, event, ops)
+
+def stored_series(directory):
+    """Серии, для которых на диске уже есть состояние"""
+    if not os.path.isdir(directory):
+        return []
+    result = []
+    for name in sorted(os.listdir(directory)):
+        key, ext = os.path.splitext(name)
+        asset, _, timeframe = key.rpartition("_")
+        if ext == ".json" and asset and timeframe in TIMEFRAME_MINUTES:
+            result.append(market_series(asset, timeframe))
+    return result
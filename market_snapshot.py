@@ -0,0 +1,118 @@
+import re
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+# ================== НАСТРОЙКИ ==================
+
+RESOLVED_PRICE = 0.85    # цена исхода, после которой бот считает рынок разрешенным
+DEFAULT_PRICE = 0.5
+
+# ========== РАЗБОР ПОЛЕЙ GAMMA ==========
+
+def parse_prices(prices_field):
+    """outcomePrices (JSON-строка или список) -> [up, down]"""
+    try:
+        if isinstance(prices_field, str):
+            try:
+                prices_str = prices_field.replace('\\"', '"')
+                prices_list = json.loads(prices_str)
+                return [float(p) for p in prices_list]
+            except:
+                numbers = re.findall(r"[\d.]+", prices_field)
+                return [float(n) for n in numbers[:2]]
+        elif isinstance(prices_field, list):
+            prices = []
+            for p in prices_field[:2]:
+                if isinstance(p, str):
+                    try:
+                        prices.append(float(p))
+                    except:
+                        prices.append(DEFAULT_PRICE)
+                elif isinstance(p, (int, float)):
+                    prices.append(float(p))
+                else:
+                    prices.append(DEFAULT_PRICE)
+            return prices
+        return [DEFAULT_PRICE, DEFAULT_PRICE]
+    except Exception as e:
+        print(f"Ошибка парсинга цен: {e}")
+        return [DEFAULT_PRICE, DEFAULT_PRICE]
+
+def parse_token_ids(clob_ids):
+    """clobTokenIds (JSON-строка или список) -> список token ID"""
+    if isinstance(clob_ids, str):
+        try:
+            clob_ids = json.loads(clob_ids)
+        except:
+            clob_ids = []
+    return [str(t) for t in clob_ids or []]
+
+# ========== СНИМОК РЫНКА ==========
+
+@dataclass(frozen=True, slots=True)
+class MarketSnapshot:
+    """Рынок Gamma, разобранный один раз: цены, токены, разрешение, победитель"""
+
+    slug: str
+    question: str
+    up_price: float
+    down_price: float
+    up_token: Optional[str]
+    down_token: Optional[str]
+    resolved: bool          # правило бота: цена >= RESOLVED_PRICE или решение UMA
+    final: bool             # закрыт и исход окончательный (можно кешировать на диске)
+    winner: Optional[str]   # "Up" / "Down" / None
+
+    @classmethod
+    def from_market(cls, market):
+        """Снимок из словаря Gamma (None -> None)"""
+        if market is None:
+            return None
+        prices = parse_prices(market.get("outcomePrices", ["0.5", "0.5"]))
+        while len(prices) < 2:
+            prices.append(DEFAULT_PRICE)
+        up_price, down_price = prices[0], prices[1]
+        tokens = parse_token_ids(market.get("clobTokenIds", []))
+
+        uma_resolved = market.get("umaResolutionStatus") in ("resolved", "confirmed")
+        if up_price >= RESOLVED_PRICE:
+            winner = "Up"
+        elif down_price >= RESOLVED_PRICE:
+            winner = "Down"
+        elif uma_resolved:
+            winner = "Up" if up_price > down_price else "Down"
+        else:
+            winner = None
+
+        # Цена >= RESOLVED_PRICE для кеша не годится: рынок еще торгуется
+        # и цена может развернуться. Окончательный - только закрытый рынок.
+        final = bool(market.get("closed")) and (
+            uma_resolved or sorted((up_price, down_price)) == [0.0, 1.0]
+        )
+
+        return cls(
+            slug=market.get("slug", ""),
+            question=market.get("question", ""),
+            up_price=up_price,
+            down_price=down_price,
+            up_token=tokens[0] if len(tokens) > 0 else None,
+            down_token=tokens[1] if len(tokens) > 1 else None,
+            resolved=winner is not None,
+            final=final,
+            winner=winner
+        )
+
+    @property
+    def prices(self):
+        return [self.up_price, self.down_price]
+
+    @property
+    def tradable(self):
+        return self.up_token is not None and self.down_token is not None
+
+    def token_and_price(self, direction):
+        """(token ID, цена) для направления "Up" / "Down" """
+        if direction == "Up":
+            return self.up_token, self.up_price
+        return self.down_token, self.down_price
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import queue
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+
+from ws_channel import ChannelFeed, WS_HOST
+
+# ================== НАСТРОЙКИ ==================
+
+CLOB_WS = os.environ.get("CLOB_WS", WS_HOST + "/market")
+
+BUY = "BUY"
+SELL = "SELL"
+
+# ========== СТАКАН ТОКЕНА ==========
+
+class OrderBook:
+    """Стакан одного токена: цены уровней в отсортированных списках (bisect),
+    объемы - в словарях по цене. Лучший bid - последний, лучший ask - первый.
+    """
+
+    def __init__(self, token_id):
+        self.token_id = token_id
+        self.bid_prices = []
+        self.ask_prices = []
+        self.bid_sizes = {}
+        self.ask_sizes = {}
+        self.updated_at = 0.0
+        self.hash = None
+
+    def _side(self, side):
+        if side == BUY:
+            return self.bid_prices, self.bid_sizes
+        return self.ask_prices, self.ask_sizes
+
+    def set_level(self, side, price, size):
+        """Новый объем уровня; size <= 0 убирает уровень"""
+        prices, sizes = self._side(side)
+        if size <= 0:
+            if sizes.pop(price, None) is not None:
+                del prices[bisect_left(prices, price)]
+        else:
+            if price not in sizes:
+                insort(prices, price)
+            sizes[price] = size
+
+    def load(self, bids, asks):
+        """Полный снимок стакана: списки {"price": "0.48", "size": "30"}"""
+        self.bid_sizes = {float(level["price"]): float(level["size"]) for level in bids}
+        self.ask_sizes = {float(level["price"]): float(level["size"]) for level in asks}
+        for sizes in (self.bid_sizes, self.ask_sizes):
+            for price in [p for p, s in sizes.items() if s <= 0]:
+                del sizes[price]
+        self.bid_prices = sorted(self.bid_sizes)
+        self.ask_prices = sorted(self.ask_sizes)
+
+    def best_bid(self):
+        return self.bid_prices[-1] if self.bid_prices else None
+
+    def best_ask(self):
+        return self.ask_prices[0] if self.ask_prices else None
+
+    def asks(self):
+        """Уровни продажи от лучшей цены: (цена, объем в акциях)"""
+        for price in self.ask_prices:
+            yield price, self.ask_sizes[price]
+
+    def bids(self):
+        for price in reversed(self.bid_prices):
+            yield price, self.bid_sizes[price]
+
+    def ask_depth(self, max_price):
+        """Сколько акций продается по цене не выше max_price"""
+        end = bisect_right(self.ask_prices, max_price)
+        return sum(self.ask_sizes[p] for p in self.ask_prices[:end])
+
+    def summary(self, levels=3):
+        asks = ", ".join(f"{p:.2f}x{s:g}" for p, s in list(self.asks())[:levels])
+        bids = ", ".join(f"{p:.2f}x{s:g}" for p, s in list(self.bids())[:levels])
+        return f"ask [{asks}] | bid [{bids}]"
+
+# ========== ЦЕНА ВХОДА ПО ГЛУБИНЕ ==========
+
+@dataclass(frozen=True, slots=True)
+class EntryQuote:
+    """Лимитная цена, при которой ордер исполняется на нужный объем по стакану"""
+
+    limit_price: float   # цена последнего нужного уровня + буфер
+    avg_price: float     # средняя цена исполнения (VWAP) по уровням
+    shares: float        # сколько акций есть в стакане до limit_price (не больше нужного)
+    levels: int          # сколько уровней съедает ордер
+    full: bool           # глубины хватает на весь объем
+
+def entry_quote(book, shares, buffer=0.0, max_price=0.99):
+    """Проходит по ask-уровням до нужного объема в акциях.
+
+    Лимит - цена последнего затронутого уровня (+ buffer на движение цены),
+    средняя цена - взвешенная по объему. None - в стакане нет продавцов.
+    """
+    remaining = shares
+    cost = 0.0
+    levels = 0
+    last_price = None
+    for price, size in book.asks():
+        if price > max_price:
+            break
+        take = size if size < remaining else remaining
+        cost += take * price
+        remaining -= take
+        levels += 1
+        last_price = price
+        if remaining <= 0:
+            break
+    if last_price is None:
+        return None
+    filled = shares - remaining
+    return EntryQuote(
+        limit_price=round(min(max_price, last_price + buffer), 4),
+        avg_price=cost / filled,
+        shares=filled,
+        levels=levels,
+        full=remaining <= 0
+    )
+
+# ========== ПОТОК MARKET-КАНАЛА ==========
+#
+# Канал market отдает снимок стакана ("book") при подписке и изменения
+# уровней ("price_change") после каждой сделки или ордера. Стаканы живут
+# в памяти, поэтому place_bet читает лучший ask и глубину без REST-запроса.
+# Пока соединения нет, стаканов нет - бот берет цену из Gamma, как раньше.
+# С custom_feature_enabled канал присылает и "market_resolved" - такие
+# события передаются в очередь events для расчета ставок. Подписка без
+# лимита: токены следующих интервалов всех серий и активных ставок, лишние
+# снимает retain() после цикла и unsubscribe() после расчета ставки.
+
+class BookFeed(ChannelFeed):
+    """Подписчик market-канала CLOB с локальными стаканами по token ID"""
+
+    label = "Стакан WS"
+
+    def __init__(self, url=CLOB_WS, events=None):
+        super().__init__(url, "book-feed")
+        self.events = events
+        self.books = {}
+        self.tokens = []
+
+    def _update_tokens(self, update):
+        """Новый список токенов update(текущий); стаканы убранных токенов удаляются"""
+        with self.lock:
+            tokens = update(self.tokens)
+            if tokens == self.tokens:
+                return
+            self.tokens = tokens
+            for token_id in [t for t in self.books if t not in tokens]:
+                del self.books[token_id]
+        self.resubscribe.set()
+
+    def subscribe(self, token_ids):
+        """Добавляет токены в подписку"""
+        new = [t for t in dict.fromkeys(token_ids) if t]
+        self._update_tokens(lambda tokens: tokens + [t for t in new if t not in tokens])
+
+    def unsubscribe(self, token_ids):
+        """Убирает токены из подписки (ставка рассчитана)"""
+        self._update_tokens(lambda tokens: [t for t in tokens if t not in token_ids])
+
+    def retain(self, token_ids):
+        """Оставляет в подписке только token_ids (спрос после цикла)"""
+        self._update_tokens(lambda tokens: [t for t in tokens if t in token_ids])
+
+    def subscription(self):
+        with self.lock:
+            if not self.tokens:
+                return None
+            return {"assets_ids": list(self.tokens), "type": "market", "custom_feature_enabled": True}
+
+    def book(self, token_id):
+        """Стакан токена из памяти или None, если его нет или соединение потеряно"""
+        with self.lock:
+            if not self.connected:
+                return None
+            return self.books.get(token_id)
+
+    def quote(self, token_id, shares, buffer=0.0):
+        """entry_quote по стакану токена под блокировкой потока (None - стакана нет)"""
+        with self.lock:
+            book = self.books.get(token_id) if self.connected else None
+            return entry_quote(book, shares, buffer) if book is not None else None
+
+    def wait_for(self, token_id, timeout):
+        """Ждет снимок стакана токена не дольше timeout секунд"""
+        deadline = time.time() + timeout
+        with self.updated:
+            while not (self.connected and token_id in self.books):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.updated.wait(remaining)
+            return self.books[token_id]
+
+    def handle_message(self, raw):
+        """Применяет сообщение канала (одно событие или список событий)"""
+        try:
+            events = json.loads(raw)
+        except ValueError:
+            print(f"[Стакан] Не JSON: {raw[:80]}")
+            return
+        if isinstance(events, dict):
+            events = [events]
+        with self.updated:
+            for event in events:
+                self._apply(event)
+            self.messages += 1
+            self.updated.notify_all()
+
+    def _book_for(self, token_id):
+        book = self.books.get(token_id)
+        if book is None:
+            book = self.books[token_id] = OrderBook(token_id)
+        return book
+
+    def _apply(self, event):
+        kind = event.get("event_type")
+        now = time.time()
+        if kind == "book":
+            book = self._book_for(event["asset_id"])
+            book.load(event.get("bids") or event.get("buys") or [],
+                      event.get("asks") or event.get("sells") or [])
+            book.hash = event.get("hash")
+            book.updated_at = now
+        elif kind == "price_change":
+            # Новый формат - price_changes с asset_id в каждой записи,
+            # старый - asset_id события и список changes
+            changes = event.get("price_changes")
+            if changes is None:
+                changes = [dict(change, asset_id=event.get("asset_id")) for change in event.get("changes", [])]
+            for change in changes:
+                book = self.books.get(change.get("asset_id"))
+                if book is None:
+                    continue   # изменения без снимка не применяем
+                book.set_level(change["side"], float(change["price"]), float(change["size"]))
+                book.hash = change.get("hash", book.hash)
+                book.updated_at = now
+        elif kind == "market_resolved" and self.events is not None:
+            try:
+                self.events.put_nowait(event)
+            except queue.Full:
+                print("[Стакан] Очередь событий переполнена, разрешение рынка подхватит REST-опрос")
+
+    def on_disconnect(self):
+        self.books.clear()
+
+    def summary(self):
+        return f"{super().summary()}, токенов {len(self.tokens)}"
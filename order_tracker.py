@@ -0,0 +1,271 @@
+import time
+
+import market_series
+
+# ================== НАСТРОЙКИ ==================
+
+LOCK_LEAD = 60           # за сколько секунд до конца интервала снимать неисполненный остаток
+TRADES_LOOKBACK = 24 * 3600   # откуда начинать сверку сделок без сохраненного курсора
+
+# Статусы ордера ставки в pending_bets
+LIVE = "live"            # ордер в стакане, исполнений нет
+PARTIAL = "partial"      # частично исполнен, остаток в стакане
+FILLED = "filled"        # исполнен полностью
+CANCELED = "canceled"    # остаток снят, исполнена часть (filled > 0)
+UNFILLED = "unfilled"    # снят без исполнений - ставки не было
+
+OPEN_STATUSES = (LIVE, PARTIAL)
+
+# ========== ОТСЛЕЖИВАНИЕ ОРДЕРОВ СТАВОК ==========
+#
+# В pending_bets у ставки с реальным ордером есть order_id, token_id,
+# size (заявленный размер), filled (исполнено) и order_status. Все открытые
+# ордера проверяются одним запросом get_orders, остаток снимается одним
+# cancel_orders перед закрытием интервала. Снятие работает только в режиме
+# демона (bot.py --daemon), который просыпается за PRESIGN_LEAD до границы.
+# Разовый запуск по cron начинается уже после закрытия прошлого интервала -
+# там ордера только опрашиваются (poll_orders).
+
+def is_tracked(info):
+    return bool(info.get("order_id")) and "order_status" in info
+
+def interval_end(info):
+    """Конец интервала ставки: ends_at записи, у старых записей - по slug
+    {coin}-updown-{tf}-{timestamp} (None - определить нельзя)"""
+    if info.get("ends_at"):
+        return info["ends_at"]
+    return market_series.slug_interval_end(info["slug"])
+
+def initial_status(resp):
+    """Статус нового ордера по ответу post_order"""
+    if isinstance(resp, dict) and str(resp.get("status", "")).lower() == "matched":
+        return FILLED
+    return LIVE
+
+def order_record(order_id, token_id, price, size, resp=None):
+    """Поля ордера для записи ставки в pending_bets.
+
+    resp - ответ post_order реального ордера; без него (тестовый режим)
+    ставка не отслеживается.
+    """
+    record = {"order_id": order_id, "token_id": token_id, "price": price, "size": size,
+              "placed_ts": int(time.time())}
+    if resp is not None:
+        status = initial_status(resp)
+        record["order_status"] = status
+        record["filled"] = size if status == FILLED else 0.0
+    return record
+
+def bet_exposure(info):
+    """(стоимость ставки, выплата при выигрыше) в USDC.
+
+    Для отслеживаемого ордера - по исполненным акциям и цене исполнения,
+    для старых записей без ордера - как раньше: amount долларов по price.
+    """
+    price = info.get("price", 0.5)
+    if is_tracked(info):
+        shares = info.get("filled", 0.0)
+        return shares * price, shares
+    amount = info["amount"]
+    return amount, (amount / price if price > 0 else amount)
+
+def never_filled(info):
+    """Ордер закрыт без единого исполнения - ставки не было"""
+    return (is_tracked(info) and info["order_status"] not in OPEN_STATUSES
+            and info.get("filled", 0) <= 0)
+
+def bet_stake(info):
+    """Размер ставки для мартингейла: исполненный объем, а не заявленный"""
+    if is_tracked(info):
+        return info.get("filled", 0.0)
+    return info["amount"]
+
+def order_state(info, order):
+    """(исполнено, статус ставки) по ордеру биржи из get_order / get_orders"""
+    filled = float(order.get("size_matched") or 0)
+    status = str(order.get("status", "")).upper()
+    if "MATCHED" in status:
+        return (filled or info["size"]), FILLED
+    if "CANCEL" in status or "INVALID" in status:
+        return filled, (CANCELED if filled > 0 else UNFILLED)
+    return filled, (PARTIAL if filled > 0 else LIVE)
+
+def fetch_order_state(client, info):
+    """Статус ордера, которого нет среди открытых: отдельный get_order.
+
+    None - биржа ордер не вернула, запись остается как есть до следующего опроса.
+    """
+    try:
+        order = client.get_order(info["order_id"])
+    except Exception as e:
+        print(f"[Ордера] Ошибка get_order {info['order_id']}: {e}")
+        return None
+    if not order:
+        return None
+    return order_state(info, order)
+
+def poll_orders(client, pending_bets):
+    """Обновляет исполнение всех открытых ордеров одним запросом.
+
+    Возвращает ключи ставок, которые изменились. Для ордера, которого больше
+    нет среди открытых, статус и исполненный объем запрашиваются get_order:
+    исполненным он считается, только если биржа вернула MATCHED (точную цену
+    и объем уточняет сверка по сделкам).
+    """
+    tracked = {info["order_id"]: key for key, info in pending_bets.items()
+               if is_tracked(info) and info["order_status"] in OPEN_STATUSES}
+    if not tracked:
+        return []
+
+    open_orders = {order.get("id"): order for order in client.get_orders()}
+    changed = []
+    for order_id, key in tracked.items():
+        info = pending_bets[key]
+        order = open_orders.get(order_id)
+        if order is None:
+            result = fetch_order_state(client, info)
+            if result is None:
+                continue
+            filled, status = result
+        else:
+            filled = float(order.get("size_matched") or 0)
+            status = PARTIAL if filled > 0 else LIVE
+        if filled != info.get("filled") or status != info["order_status"]:
+            info["filled"] = filled
+            info["order_status"] = status
+            changed.append(key)
+    return changed
+
+def cancel_before_lock(client, pending_bets, now=None, lead=LOCK_LEAD):
+    """Снимает остаток ордеров, интервал которых закрывается через lead секунд.
+
+    Все ордера снимаются одним cancel_orders. Возвращает измененные ключи.
+    """
+    if now is None:
+        now = time.time()
+    expiring = {}
+    for key, info in pending_bets.items():
+        if not is_tracked(info) or info["order_status"] not in OPEN_STATUSES:
+            continue
+        end = interval_end(info)
+        if end is not None and now >= end - lead:
+            expiring[info["order_id"]] = key
+    if not expiring:
+        return []
+
+    resp = client.cancel_orders(list(expiring)) or {}
+    not_canceled = resp.get("not_canceled") or {}
+    changed = []
+    for order_id, key in expiring.items():
+        info = pending_bets[key]
+        if order_id in not_canceled:
+            # Снять не удалось - ордер уже исполнен или закрыт биржей, итог - по get_order
+            print(f"[Ордера] {key}: не снят ({not_canceled[order_id]}), запрашиваем статус")
+            result = fetch_order_state(client, info)
+            if result is None:
+                continue
+            info["filled"], info["order_status"] = result
+        else:
+            info["order_status"] = CANCELED if info.get("filled", 0) > 0 else UNFILLED
+        changed.append(key)
+    return changed
+
+def track_orders(client, pending_bets, now=None, lead=LOCK_LEAD):
+    """Опрос исполнения и снятие остатков перед закрытием интервала.
+
+    Возвращает ключи ставок, записи которых изменились.
+    """
+    changed = poll_orders(client, pending_bets)
+    for key in cancel_before_lock(client, pending_bets, now, lead):
+        if key not in changed:
+            changed.append(key)
+    return changed
+
+# ========== СВЕРКА ПО СДЕЛКАМ ==========
+#
+# Цена и объем ставки берутся из фактических сделок CLOB. Курсор
+# {"after": unix-время, "seen": [id сделок в эту секунду]} хранится в
+# состоянии, поэтому каждый прогон запрашивает только новые сделки.
+
+def trade_fills(trade, orders_by_id, orders_by_token):
+    """Наши исполнения в сделке: [(order_id, акции, цена)].
+
+    Тейкер - taker_order_id, мейкер - записи maker_orders. Если id ордера
+    не совпал, сделка тейкера относится к ставке по token_id.
+    """
+    fills = []
+    taker_id = trade.get("taker_order_id")
+    if taker_id in orders_by_id:
+        fills.append((taker_id, float(trade["size"]), float(trade["price"])))
+    for maker in trade.get("maker_orders") or []:
+        if maker.get("order_id") in orders_by_id:
+            fills.append((maker["order_id"], float(maker["matched_amount"]), float(maker["price"])))
+    if not fills and trade.get("trader_side") == "TAKER" and trade.get("asset_id") in orders_by_token:
+        fills.append((orders_by_token[trade["asset_id"]], float(trade["size"]), float(trade["price"])))
+    return fills
+
+def apply_fill(info, trade_id, shares, price):
+    """Добавляет исполнение к ставке. False - сделка уже учтена"""
+    trade_ids = info.setdefault("trade_ids", [])
+    if trade_id in trade_ids:
+        return False
+    # Первая сделка заменяет оценку по ордеру (лимитная цена, size_matched)
+    filled = info.get("fill_shares", 0.0)
+    cost = info.get("fill_cost", 0.0)
+    filled += shares
+    cost += shares * price
+    trade_ids.append(trade_id)
+    info["fill_shares"] = filled
+    info["fill_cost"] = cost
+    info["filled"] = round(filled, 6)
+    info["price"] = round(cost / filled, 6) if filled > 0 else info.get("price", 0.5)
+    if info.get("order_status") in OPEN_STATUSES and filled >= info["size"]:
+        info["order_status"] = FILLED
+    elif info.get("order_status") == UNFILLED and filled > 0:
+        # Снят как неисполненный, но сделка до снятия была - ставка есть
+        info["order_status"] = FILLED if filled >= info["size"] else CANCELED
+    return True
+
+def reconcile_trades(client, pending_bets, cursor, now=None):
+    """Переписывает цену и объем ставок по новым сделкам после курсора.
+
+    Без курсора сделки берутся с момента отправки самого раннего ордера.
+    Возвращает (измененные ключи, новый курсор).
+    """
+    if now is None:
+        now = time.time()
+    tracked = {info["order_id"]: key for key, info in pending_bets.items() if is_tracked(info)}
+    if not tracked:
+        # Сверять нечего - курсор сбрасывается, следующая сверка начнется
+        # с момента отправки новых ордеров
+        return [], None
+    # Клиент CLOB нужен только когда есть что сверять
+    from py_clob_client.clob_types import TradeParams
+
+    if cursor:
+        after, seen = cursor["after"], set(cursor.get("seen", []))
+    else:
+        after = min(pending_bets[key].get("placed_ts", int(now) - TRADES_LOOKBACK) for key in tracked.values())
+        seen = set()
+    by_token = {pending_bets[key]["token_id"]: order_id for order_id, key in tracked.items()
+                if pending_bets[key].get("token_id")}
+
+    # after - 1: сделки в ту же секунду, что и курсор, отсеиваются по seen
+    trades = client.get_trades(TradeParams(after=after - 1))
+    changed = []
+    latest, latest_ids = after, set(seen)
+    for trade in trades:
+        trade_id = trade.get("id")
+        match_time = int(trade.get("match_time") or 0)
+        if match_time < after or (match_time == after and trade_id in seen):
+            continue
+        if match_time > latest:
+            latest, latest_ids = match_time, set()
+        if match_time == latest:
+            latest_ids.add(trade_id)
+        for order_id, shares, price in trade_fills(trade, tracked, by_token):
+            key = tracked[order_id]
+            if apply_fill(pending_bets[key], trade_id, shares, price) and key not in changed:
+                changed.append(key)
+    return changed, {"after": latest, "seen": sorted(latest_ids)}
+
@@ -0,0 +1,158 @@
+import os
+import json
+import queue
+
+import order_tracker
+from ws_channel import ChannelFeed, WS_HOST
+
+# ================== НАСТРОЙКИ ==================
+
+CLOB_USER_WS = os.environ.get("CLOB_USER_WS", WS_HOST + "/user")
+EVENT_QUEUE_SIZE = 1000
+
+POLL_FAST = 10        # первый запасной REST-опрос после закрытия интервала, сек
+POLL_MAX = 120        # потолок удвоения, пока push недоступен
+POLL_WITH_PUSH = 300  # страховочный опрос при живом push
+
+# ========== USER-КАНАЛ CLOB ==========
+#
+# Канал user после авторизации API creds присылает события наших ордеров
+# ("order": размещение, исполнение, снятие) и сделок ("trade"). Разрешение
+# рынка приходит из market-канала (BookFeed, "market_resolved"). Все события
+# попадают в одну очередь, которую разбирает основной поток демона, поэтому
+# состояние меняет только он. Creds берутся из сессии CLOB при каждом
+# подключении: после их обновления (401) канал переподключается с новыми.
+
+class UserFeed(ChannelFeed):
+    """Подписчик user-канала: события ордеров и сделок в очередь events"""
+
+    label = "User WS"
+
+    def __init__(self, session, events, url=CLOB_USER_WS):
+        super().__init__(url, "user-feed")
+        self.session = session
+        self.events = events
+
+    def subscription(self):
+        try:
+            creds = self.session.creds
+        except Exception as e:
+            print(f"[User WS] Нет API creds: {e}")
+            return None
+        return {
+            "auth": {
+                "apiKey": creds.api_key,
+                "secret": creds.api_secret,
+                "passphrase": creds.api_passphrase
+            },
+            "markets": [],
+            "type": "user"
+        }
+
+    def handle_message(self, raw):
+        try:
+            events = json.loads(raw)
+        except ValueError:
+            print(f"[User WS] Не JSON: {raw[:80]}")
+            return
+        if isinstance(events, dict):
+            events = [events]
+        for event in events:
+            if event.get("event_type") not in ("order", "trade"):
+                continue
+            try:
+                self.events.put_nowait(event)
+            except queue.Full:
+                print("[User WS] Очередь событий переполнена, исполнение подхватит REST-опрос")
+        with self.lock:
+            self.messages += 1
+
+# ========== РАЗБОР СОБЫТИЙ ==========
+
+def apply_user_event(pending_bets, event):
+    """Применяет событие ордера или сделки к pending_bets. Возвращает измененные ключи"""
+    tracked = {info["order_id"]: key for key, info in pending_bets.items() if order_tracker.is_tracked(info)}
+    changed = []
+    if event.get("event_type") == "trade":
+        by_token = {pending_bets[key]["token_id"]: order_id for order_id, key in tracked.items()
+                    if pending_bets[key].get("token_id")}
+        for order_id, shares, price in order_tracker.trade_fills(event, tracked, by_token):
+            key = tracked[order_id]
+            if order_tracker.apply_fill(pending_bets[key], event.get("id"), shares, price) and key not in changed:
+                changed.append(key)
+    elif event.get("event_type") == "order" and event.get("id") in tracked:
+        key = tracked[event["id"]]
+        info = pending_bets[key]
+        if info["order_status"] not in order_tracker.OPEN_STATUSES:
+            return changed
+        filled = float(event.get("size_matched") or 0)
+        if event.get("type") == "CANCELLATION":
+            status = order_tracker.CANCELED if filled > 0 else order_tracker.UNFILLED
+        elif filled >= info["size"]:
+            status = order_tracker.FILLED
+        else:
+            status = order_tracker.PARTIAL if filled > 0 else order_tracker.LIVE
+        if filled != info.get("filled") or status != info["order_status"]:
+            info["filled"] = filled
+            info["order_status"] = status
+            changed.append(key)
+    return changed
+
+def resolution_winner(event, info):
+    """Победившее направление ставки info по событию market_resolved (None - не тот рынок)"""
+    winning = str(event.get("winning_asset_id") or "")
+    assets = [str(a) for a in event.get("assets_ids") or []]
+    token_id = str(info.get("token_id") or "")
+    if token_id and token_id == winning:
+        return info["direction"]
+    if token_id and token_id in assets:
+        return "Down" if info["direction"] == "Up" else "Up"
+    if event.get("slug") and event["slug"] == info.get("slug") and event.get("winning_outcome") in ("Up", "Down"):
+        return event["winning_outcome"]
+    return None
+
+# ========== ЗАПАСНОЙ REST-ОПРОС ==========
+
+class AdaptivePoller:
+    """Когда опрашивать Gamma о разрешении рынков ставок.
+
+    Как только появляется ставка, ждущая разрешения, - опрос сразу, дальше
+    интервал удваивается от POLL_FAST до POLL_MAX. Пока push-каналы живы,
+    опрос только страховочный - раз в POLL_WITH_PUSH.
+    """
+
+    def __init__(self, fast=POLL_FAST, slow=POLL_MAX, with_push=POLL_WITH_PUSH):
+        self.fast = fast
+        self.slow = slow
+        self.with_push = with_push
+        self.delay = fast
+        self.next_at = 0.0
+        self.watched = frozenset()
+        self.polls = 0
+
+    def watch(self, keys, now):
+        """Новая ставка ждет разрешения - опрос сразу и короткий интервал"""
+        keys = frozenset(keys)
+        if keys - self.watched:
+            self.delay = self.fast
+            self.next_at = now
+        self.watched = keys
+
+    def wait_time(self, now):
+        return max(self.next_at - now, 0.0)
+
+    def due(self, now):
+        return bool(self.watched) and now >= self.next_at
+
+    def polled(self, changed, push_alive, now):
+        self.polls += 1
+        if push_alive:
+            self.delay = self.with_push
+        elif changed:
+            self.delay = self.fast
+        else:
+            self.delay = min(self.delay * 2, self.slow)
+        self.next_at = now + self.delay
+
+    def summary(self):
+        return f"REST-опрос разрешения: {self.polls}, интервал {self.delay:.0f} сек"
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import math
+import threading
+from contextlib import contextmanager
+
+# ================== НАСТРОЙКИ ==================
+
+# Границы корзин гистограммы, сек
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+METRIC_NAME = "polymarket_bot_stage_seconds"
+
+# ========== ИЗМЕРЕНИЕ ЭТАПОВ ==========
+
+def _atomic_write(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _le(bound):
+    return "+Inf" if bound == math.inf else repr(bound)
+
+def percentile(buckets, count, q):
+    """Оценка перцентиля по корзинам гистограммы (линейно внутри корзины)"""
+    if count == 0:
+        return 0.0
+    rank = q * count
+    seen = 0
+    lower = 0.0
+    for bound, n in zip(BUCKETS, buckets):
+        if n and seen + n >= rank:
+            if bound == math.inf:
+                return lower
+            return lower + (bound - lower) * (rank - seen) / n
+        seen += n
+        lower = bound if bound != math.inf else lower
+    return lower
+
+class RunMetrics:
+    """Замеры этапов прогона: span() вокруг каждого этапа, export() в конце.
+
+    Гистограммы копятся между прогонами в JSON-файле; из них же пишется
+    текстовый файл для Prometheus (node_exporter textfile collector).
+    """
+
+    def __init__(self, json_path, prom_path, prefix=""):
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.samples = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.samples.append((self.prefix + name, seconds))
+
+    def _load(self):
+        if self.json_path and os.path.exists(self.json_path):
+            try:
+                with open(self.json_path) as f:
+                    return json.load(f)
+            except ValueError:
+                print(f"[Метрики] {self.json_path} поврежден, начинаем заново")
+        return {"runs": 0, "stages": {}}
+
+    def export(self):
+        """Добавляет замеры прогона в гистограммы и пишет JSON и .prom"""
+        with self.lock:
+            samples, self.samples = self.samples, []
+        run_total = time.perf_counter() - self.started
+        self.started = time.perf_counter()
+
+        summary = self._load()
+        summary["runs"] += 1
+        last_run = {}
+        for name, seconds in samples:
+            stage = summary["stages"].setdefault(name, {
+                "count": 0, "sum": 0.0, "min": seconds, "max": seconds, "buckets": [0] * len(BUCKETS)
+            })
+            stage["count"] += 1
+            stage["sum"] += seconds
+            stage["min"] = min(stage["min"], seconds)
+            stage["max"] = max(stage["max"], seconds)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stage["buckets"][i] += 1
+                    break
+            last_run[name] = last_run.get(name, 0.0) + seconds
+
+        for stage in summary["stages"].values():
+            for q in (50, 95, 99):
+                # Оценка по корзинам грубая, поэтому ограничиваем наблюдаемыми min/max
+                value = percentile(stage["buckets"], stage["count"], q / 100)
+                stage[f"p{q}"] = min(max(value, stage["min"]), stage["max"])
+        summary["last_run"] = {"finished_at": time.time(), "total": run_total, "stages": last_run}
+
+        try:
+            if self.json_path:
+                _atomic_write(self.json_path, json.dumps(summary, indent=2))
+            if self.prom_path:
+                _atomic_write(self.prom_path, self.prometheus_text(summary))
+        except OSError as e:
+            print(f"[Метрики] Не удалось сохранить: {e}")
+        return summary
+
+    def prometheus_text(self, summary):
+        lines = [
+            f"# HELP {METRIC_NAME} Длительность этапов прогона бота",
+            f"# TYPE {METRIC_NAME} histogram"
+        ]
+        for name, stage in sorted(summary["stages"].items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS, stage["buckets"]):
+                cumulative += n
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{name}",le="{_le(bound)}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{name}"}} {stage["sum"]}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{name}"}} {stage["count"]}')
+        lines.append("# HELP polymarket_bot_last_run_seconds Длительность последнего прогона")
+        lines.append("# TYPE polymarket_bot_last_run_seconds gauge")
+        lines.append(f'polymarket_bot_last_run_seconds {summary["last_run"]["total"]}')
+        lines.append("# TYPE polymarket_bot_runs_total counter")
+        lines.append(f'polymarket_bot_runs_total {summary["runs"]}')
+        return "\n".join(lines) + "\n"
+
+    def print_summary(self, summary):
+        print("\n⏱️ Время этапов (прогон | p50 / p95 / p99 по всем прогонам):")
+        for name, seconds in sorted(summary["last_run"]["stages"].items(), key=lambda kv: -kv[1]):
+            stage = summary["stages"][name]
+            print(f"   {name}: {seconds * 1000:.0f} мс | "
+                  f"{stage['p50'] * 1000:.0f} / {stage['p95'] * 1000:.0f} / {stage['p99'] * 1000:.0f} мс")
@@ -0,0 +1,729 @@
+import sys
+import json
+import time
+import base64
+import random
+import struct
+import hashlib
+import re
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from market_series import slug_interval_end
+
+# ========== ЛОКАЛЬНАЯ ЗАМЕНА GAMMA / CLOB / TELEGRAM ==========
+#
+# Один HTTP-сервер отвечает вместо gamma-api.polymarket.com,
+# clob.polymarket.com, api.telegram.org и Polygon JSON-RPC (POST /rpc),
+# чтобы боты работали без сети:
+#   GAMMA_HOST=http://127.0.0.1:8900 CLOB_HOST=http://127.0.0.1:8900 \
+#   TELEGRAM_API=http://127.0.0.1:8900 POLYGON_RPC=http://127.0.0.1:8900/rpc \
+#   CLOB_WS=ws://127.0.0.1:8900/ws/market TELEGRAM_TOKEN=x TELEGRAM_CHAT_ID=1 PRIVATE_KEY=0x... python bot.py
+# Рынки берутся из файла фикстур (список рынков Gamma) или генерируются
+# детерминированно по slug. Все запросы к /order и sendMessage
+# записываются и доступны через GET /_standin/orders и /_standin/telegram.
+# Исполненная часть ордера становится сделкой в GET /data/trades.
+# Websocket ws://.../ws/market (CLOB_WS) отдает стаканы токенов: записанные
+# события из --book-fixtures по порядку или синтетический стакан вокруг
+# котировки рынка и несколько изменений уровней; когда рынок закрывается
+# (по времени или через POST /_standin/resolve?slug=...&winner=Up), в канал
+# уходит "market_resolved". ws://.../ws/user (CLOB_USER_WS) присылает
+# события "order" и "trade" по ордерам, отправленным через /order.
+# Запросы ордеров и сделок проверяют заголовок POLY_API_KEY: после
+# POST /_standin/revoke-creds старый ключ получает 401, как отозванный.
+
+DEFAULT_PORT = 8900
+INTERVAL_SECONDS = 15 * 60
+USDC_UNIT = 10 ** 6
+
+def _digest(text):
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+
+def synthetic_market(slug, now=None):
+    """Детерминированный рынок {coin}-updown-{tf}-{ts}: исход зависит только от slug"""
+    try:
+        coin, _, timeframe, ts = slug.split("-")
+        start = int(ts)
+        end = slug_interval_end(slug)
+    except ValueError:
+        return None
+    if end is None:
+        return None
+    now = now or time.time()
+    if start > now + 24 * 3600:
+        return None
+
+    up_wins = _digest(slug) % 2 == 0
+    closed = end <= now
+    if closed:
+        prices = ["1", "0"] if up_wins else ["0", "1"]
+    else:
+        # Котировка открытого рынка около 0.5, стабильная для slug
+        up = 0.45 + (_digest(slug + ":price") % 11) / 100
+        prices = [f"{up:.2f}", f"{1 - up:.2f}"]
+    base = _digest(slug + ":token")
+    return {
+        "id": str(base % 10 ** 6),
+        "slug": slug,
+        "question": f"{coin.upper()} Up or Down - {timeframe} ({start})",
+        "outcomes": json.dumps(["Up", "Down"]),
+        "outcomePrices": json.dumps(prices),
+        "clobTokenIds": json.dumps([str(base * 2 + 1), str(base * 2 + 2)]),
+        "closed": closed,
+        "active": not closed,
+        "umaResolutionStatus": "resolved" if closed else None,
+        "startDate": start,
+        "endDate": end
+    }
+
+class StandinState:
+    """Данные и настройки сервера (общие для всех потоков обработчика)"""
+
+    def __init__(self, fixtures=None, synthetic=True, latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, seed=None, usdc_balance=1000.0, allowance=10 ** 9,
+                 fill_ratio=1.0, price_improvement=0.0, book_events=None, book_interval=0.05,
+                 telegram_429=0):
+        self.markets = {m["slug"]: m for m in (fixtures or [])}
+        self.synthetic = synthetic
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.telegram = []
+        self.orders = []
+        self.requests = 0
+        # Кошелек в единицах USDC (6 знаков), ордера на покупку его уменьшают
+        self.usdc_balance = int(usdc_balance * USDC_UNIT)
+        self.allowance = int(allowance * USDC_UNIT)
+        self.rpc_calls = 0
+        # Доля ордера, исполняемая сразу (1.0 - matched, меньше - остаток в стакане)
+        self.fill_ratio = fill_ratio
+        # Насколько цена сделки лучше лимитной цены ордера
+        self.price_improvement = price_improvement
+        self.trades = []
+        self.trade_requests = 0
+        # Записанные события market-канала и пауза между ними при воспроизведении
+        self.book_events = book_events or []
+        self.book_interval = book_interval
+        self.token_quotes = {}   # token ID -> котировка выданного рынка
+        self.token_markets = {}  # token ID -> slug
+        self.forced_winners = {}  # slug -> "Up"/"Down", рынок закрыт досрочно
+        self.user_peers = []
+        # Сколько первых sendMessage ответить 429 Too Many Requests
+        self.telegram_429 = telegram_429
+        self.ws_connections = 0
+        # Номер выданных API creds: revoke-creds выдает новые, старые - 401
+        self.creds_generation = 0
+        self.creds_requests = 0
+
+    def api_key(self):
+        if self.creds_generation == 0:
+            return STANDIN_CREDS["apiKey"]
+        return f"{STANDIN_CREDS['apiKey']}-{self.creds_generation}"
+
+    def market(self, slug):
+        if slug in self.markets:
+            market = self.markets[slug]
+        else:
+            market = synthetic_market(slug) if self.synthetic else None
+        if market and slug in self.forced_winners:
+            up_wins = self.forced_winners[slug] == "Up"
+            market = dict(market, closed=True, active=False, umaResolutionStatus="resolved",
+                          outcomePrices=json.dumps(["1", "0"] if up_wins else ["0", "1"]))
+        if market:
+            # Запоминаем котировки токенов для синтетического стакана
+            try:
+                tokens = json.loads(market["clobTokenIds"])
+                prices = json.loads(market["outcomePrices"])
+                with self.lock:
+                    for token, price in zip(tokens, prices):
+                        self.token_quotes[str(token)] = float(price)
+                        self.token_markets[str(token)] = slug
+            except (KeyError, TypeError, ValueError):
+                pass
+        return market
+
+    def inject(self):
+        """Задержка и случайная ошибка. True - ответить 503"""
+        with self.lock:
+            self.requests += 1
+            delay = self.latency_ms + self.random.uniform(0, self.jitter_ms)
+            fail = self.random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return fail
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server_version = "PolymarketStandin/1.0"
+    state = None  # StandinState, задается в make_server
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path.rstrip("/") or "/"
+
+        # Служебные ручки - без задержек и ошибок
+        if path == "/_standin/telegram":
+            return self._send(200, self.state.telegram)
+        if path == "/_standin/orders":
+            return self._send(200, self.state.orders)
+        if path == "/_standin/stats":
+            return self._send(200, {"requests": self.state.requests, "rpc_calls": self.state.rpc_calls,
+                                    "trade_requests": self.state.trade_requests,
+                                    "ws_connections": self.state.ws_connections,
+                                    "creds_requests": self.state.creds_requests,
+                                    "usdc_balance": self.state.usdc_balance / USDC_UNIT})
+
+        if path == "/_standin/resolve":
+            slug = query.get("slug", [""])[0]
+            self.state.forced_winners[slug] = query.get("winner", ["Up"])[0]
+            return self._send(200, {"ok": True, "slug": slug})
+        if path == "/_standin/revoke-creds":
+            with self.state.lock:
+                self.state.creds_generation += 1
+            return self._send(200, {"ok": True, "generation": self.state.creds_generation})
+        if path == "/ws/market" and self.headers.get("Upgrade", "").lower() == "websocket":
+            return _ws_market(self)
+        if path == "/ws/user" and self.headers.get("Upgrade", "").lower() == "websocket":
+            return _ws_user(self)
+
+        if self.state.inject():
+            return self._send(503, {"error": "injected failure"})
+
+        if method == "GET" and path.startswith("/data/order/"):
+            query["order_id"] = [path.rsplit("/", 1)[1]]
+            path = "/data/order"
+        handler = ROUTES.get((method, path))
+        if handler is None and method == "POST" and path.startswith("/bot") and path.endswith("/sendMessage"):
+            handler = _telegram_send
+        if handler is None:
+            return self._send(404, {"error": f"no route {method} {path}"})
+        if (method, path) in L2_ROUTES and self.headers.get("POLY_API_KEY") != self.state.api_key():
+            return self._send(401, {"error": "Unauthorized/Invalid api key"})
+        status, body = handler(self, query)
+        self._send(status, body)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+# ========== GAMMA ==========
+
+def _gamma_markets(handler, query):
+    state = handler.state
+    slugs = query.get("slug", [])
+    limit = int(query.get("limit", ["100"])[0])
+    if slugs:
+        markets = [m for m in (state.market(s) for s in slugs) if m]
+    else:
+        markets = list(state.markets.values())
+        if not markets and state.synthetic:
+            now = int(time.time())
+            start = now - now % INTERVAL_SECONDS
+            markets = [synthetic_market(f"{coin}-updown-15m-{start - i * INTERVAL_SECONDS}")
+                       for i in range(limit // 2) for coin in ("btc", "eth")]
+    return 200, markets[:limit]
+
+# ========== CLOB ==========
+
+STANDIN_CREDS = {"apiKey": "standin-key", "secret": "c3RhbmRpbi1zZWNyZXQ=", "passphrase": "standin"}
+
+def _clob_ok(handler, query):
+    return 200, "OK"
+
+def _clob_time(handler, query):
+    return 200, int(time.time())
+
+def _clob_creds(handler, query):
+    with handler.state.lock:
+        handler.state.creds_requests += 1
+    return 200, dict(STANDIN_CREDS, apiKey=handler.state.api_key())
+
+def _clob_tick_size(handler, query):
+    return 200, {"minimum_tick_size": 0.01}
+
+def _clob_neg_risk(handler, query):
+    return 200, {"neg_risk": False}
+
+def _clob_fee_rate(handler, query):
+    return 200, {"base_fee": 0}
+
+def _order_terms(order):
+    """(цена, размер в акциях) подписанного ордера на покупку"""
+    maker = int(order.get("makerAmount") or 0)
+    taker = int(order.get("takerAmount") or 0)
+    if not taker:
+        return 0.0, 0.0
+    return round(maker / taker, 4), taker / USDC_UNIT
+
+def _order_event(order, kind):
+    return {
+        "event_type": "order", "type": kind, "id": order["id"], "asset_id": order["asset_id"],
+        "side": order["side"], "price": str(order["price"]), "original_size": str(order["original_size"]),
+        "size_matched": str(order["size_matched"]), "timestamp": str(int(time.time() * 1000))
+    }
+
+def _clob_post_order(handler, query):
+    body = handler._body()
+    state = handler.state
+    order = body.get("order") or {}
+    price, size = _order_terms(order)
+    events = []
+    with state.lock:
+        order_id = "0x" + hashlib.sha256(f"{len(state.orders)}:{time.time()}".encode()).hexdigest()
+        matched = round(size * min(max(state.fill_ratio, 0.0), 1.0), 2)
+        status = "MATCHED" if matched >= size else "LIVE"
+        state.orders.append({
+            "id": order_id, "received_at": time.time(), "body": body,
+            "status": status, "asset_id": str(order.get("tokenId", "")), "side": order.get("side"),
+            "price": price, "original_size": size, "size_matched": matched
+        })
+        # Покупка: makerAmount - сколько USDC списывается
+        if order.get("side") in ("BUY", 0):
+            state.usdc_balance -= int(order.get("makerAmount") or 0)
+        if matched > 0:
+            fill_price = round(max(price - state.price_improvement, 0.01), 4)
+            state.trades.append({
+                "id": f"trade-{len(state.trades) + 1}", "taker_order_id": order_id,
+                "asset_id": str(order.get("tokenId", "")), "side": "BUY", "trader_side": "TAKER",
+                "size": str(matched), "price": str(fill_price), "status": "MATCHED",
+                "match_time": str(int(time.time())), "maker_orders": []
+            })
+        events.append(_order_event(state.orders[-1], "PLACEMENT"))
+        if matched > 0:
+            events.append(dict(state.trades[-1], event_type="trade", type="TRADE"))
+    _push_user(state, events)
+    return 200, {"success": True, "errorMsg": "", "orderID": order_id, "status": status.lower()}
+
+def _order_view(o):
+    return {
+        "id": o["id"], "status": o["status"], "asset_id": o["asset_id"], "side": o["side"],
+        "price": str(o["price"]), "original_size": str(o["original_size"]),
+        "size_matched": str(o["size_matched"]), "created_at": int(o["received_at"])
+    }
+
+def _clob_open_orders(handler, query):
+    """Открытые ордера (одна страница, курсор конца LTE=)"""
+    state = handler.state
+    with state.lock:
+        data = [_order_view(o) for o in state.orders if o.get("status") == "LIVE"]
+    return 200, {"data": data, "next_cursor": "LTE=", "limit": len(data), "count": len(data)}
+
+def _clob_order(handler, query):
+    """Один ордер по id в любом статусе (GET /data/order/{id})"""
+    state = handler.state
+    order_id = query.get("order_id", [""])[0]
+    with state.lock:
+        for o in state.orders:
+            if o["id"] == order_id:
+                return 200, _order_view(o)
+    return 404, {"error": "order not found"}
+
+def _clob_trades(handler, query):
+    """Сделки кошелька с match_time > after (одна страница, курсор конца LTE=)"""
+    state = handler.state
+    after = int(query.get("after", ["0"])[0])
+    with state.lock:
+        state.trade_requests += 1
+        data = [dict(t) for t in state.trades if int(t["match_time"]) > after]
+    return 200, {"data": data, "next_cursor": "LTE=", "limit": len(data), "count": len(data)}
+
+def _clob_cancel_orders(handler, query):
+    body = handler._body()
+    state = handler.state
+    ids = body if isinstance(body, list) else []
+    canceled, not_canceled = [], {}
+    events = []
+    with state.lock:
+        by_id = {o["id"]: o for o in state.orders}
+        for order_id in ids:
+            order = by_id.get(order_id)
+            if order is None:
+                not_canceled[order_id] = "order not found"
+            elif order.get("status") != "LIVE":
+                not_canceled[order_id] = "order can't be found - already canceled or matched"
+            else:
+                order["status"] = "CANCELED"
+                # Неисполненный остаток возвращается на баланс
+                state.usdc_balance += int((order["original_size"] - order["size_matched"]) * order["price"] * USDC_UNIT)
+                canceled.append(order_id)
+                events.append(_order_event(order, "CANCELLATION"))
+    _push_user(state, events)
+    return 200, {"canceled": canceled, "not_canceled": not_canceled}
+
+# ========== POLYGON JSON-RPC ==========
+
+BALANCE_OF = "0x70a08231"
+ALLOWANCE = "0xdd62ed3e"
+
+def _rpc_result(state, call):
+    if call.get("method") == "eth_chainId":
+        return hex(137)
+    if call.get("method") == "eth_blockNumber":
+        return hex(int(time.time()) // 2)
+    if call.get("method") == "eth_call":
+        data = (call.get("params") or [{}])[0].get("data", "")
+        if data.startswith(BALANCE_OF):
+            return "0x" + format(max(state.usdc_balance, 0), "064x")
+        if data.startswith(ALLOWANCE):
+            return "0x" + format(state.allowance, "064x")
+    return None
+
+def _rpc(handler, query):
+    """JSON-RPC: одиночный вызов или пакет (balanceOf / allowance USDC)"""
+    body = handler._body()
+    state = handler.state
+    calls = body if isinstance(body, list) else [body]
+    replies = []
+    with state.lock:
+        state.rpc_calls += 1
+        for call in calls:
+            result = _rpc_result(state, call)
+            reply = {"jsonrpc": "2.0", "id": call.get("id")}
+            if result is None:
+                reply["error"] = {"code": -32601, "message": f"unsupported {call.get('method')}"}
+            else:
+                reply["result"] = result
+            replies.append(reply)
+    return 200, replies if isinstance(body, list) else replies[0]
+
+# ========== TELEGRAM ==========
+
+HTML_TAGS = {"b", "strong", "i", "em", "u", "s", "code", "pre", "a"}
+HTML_TAG = re.compile(r"</?([a-zA-Z]+)[^<>]*>")
+
+def _html_ok(text):
+    """Разметка, которую разобрал бы Telegram: только известные теги и без лишних <"""
+    tags = HTML_TAG.findall(text)
+    return all(tag.lower() in HTML_TAGS for tag in tags) and text.count("<") == len(tags)
+
+def _telegram_send(handler, query):
+    body = handler._body()
+    state = handler.state
+    if body.get("parse_mode") == "HTML" and not _html_ok(str(body.get("text", ""))):
+        return 400, {"ok": False, "error_code": 400,
+                     "description": "Bad Request: can't parse entities: unsupported start tag"}
+    with state.lock:
+        if state.telegram_429 > 0:
+            state.telegram_429 -= 1
+            return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                         "parameters": {"retry_after": 1}}
+        state.telegram.append({"received_at": time.time(), "path": handler.path, "body": body})
+        message_id = len(state.telegram)
+    return 200, {"ok": True, "result": {"message_id": message_id, "text": body.get("text")}}
+
+ROUTES = {
+    ("GET", "/markets"): _gamma_markets,
+    ("GET", "/"): _clob_ok,
+    ("GET", "/time"): _clob_time,
+    ("POST", "/auth/api-key"): _clob_creds,
+    ("GET", "/auth/derive-api-key"): _clob_creds,
+    ("GET", "/tick-size"): _clob_tick_size,
+    ("GET", "/neg-risk"): _clob_neg_risk,
+    ("GET", "/fee-rate"): _clob_fee_rate,
+    ("POST", "/order"): _clob_post_order,
+    ("GET", "/data/orders"): _clob_open_orders,
+    ("GET", "/data/order"): _clob_order,
+    ("GET", "/data/trades"): _clob_trades,
+    ("DELETE", "/orders"): _clob_cancel_orders,
+    ("POST", "/rpc"): _rpc,
+}
+
+# Запросы с L2-авторизацией (API creds)
+L2_ROUTES = {("POST", "/order"), ("GET", "/data/orders"), ("GET", "/data/order"), ("GET", "/data/trades"),
+             ("DELETE", "/orders")}
+
+# ========== WEBSOCKET MARKET-КАНАЛ ==========
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+def _ws_read(rfile):
+    """(opcode, payload) одного кадра клиента; (None, None) - соединение закрыто"""
+    head = rfile.read(2)
+    if len(head) < 2:
+        return None, None
+    opcode = head[0] & 0x0F
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", rfile.read(8))[0]
+    mask = rfile.read(4) if head[1] & 0x80 else b""
+    data = rfile.read(length)
+    if mask:
+        data = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+    return opcode, data
+
+def _ws_write(wfile, payload, opcode=0x1):
+    data = payload.encode() if isinstance(payload, str) else payload
+    n = len(data)
+    if n < 126:
+        header = struct.pack(">BB", 0x80 | opcode, n)
+    elif n < 65536:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, n)
+    wfile.write(header + data)
+    wfile.flush()
+
+def _event_assets(event):
+    if "price_changes" in event:
+        return {change.get("asset_id") for change in event["price_changes"]}
+    return {event.get("asset_id")}
+
+def synthetic_book_events(token_id, quote):
+    """Снимок стакана вокруг котировки и три изменения уровней"""
+    quote = min(max(quote, 0.05), 0.9)
+    asks = [{"price": f"{quote + i * 0.01:.2f}", "size": str(50 * 2 ** i)} for i in range(5)]
+    bids = [{"price": f"{quote - (i + 1) * 0.01:.2f}", "size": str(40 * 2 ** i)} for i in range(5)]
+    change = lambda price, side, size: {
+        "event_type": "price_change", "market": "standin",
+        "price_changes": [{"asset_id": token_id, "price": f"{price:.2f}", "side": side, "size": str(size)}]
+    }
+    return [
+        {"event_type": "book", "asset_id": token_id, "market": "standin", "bids": bids, "asks": asks,
+         "timestamp": str(int(time.time() * 1000)), "hash": f"standin-{token_id}"},
+        change(quote, "SELL", 20),           # часть лучшего ask купили
+        change(quote - 0.01, "BUY", 60),     # добавился объем на лучшем bid
+        change(quote + 0.01, "SELL", 0),     # уровень ask снят
+    ]
+
+def _ws_send_books(handler, peer, token_ids):
+    state = handler.state
+    recorded = [e for e in state.book_events if _event_assets(e) & set(token_ids)]
+    events = recorded
+    if not recorded:
+        with state.lock:
+            quotes = {t: state.token_quotes.get(t, 0.5) for t in token_ids}
+        events = [e for t in token_ids for e in synthetic_book_events(t, quotes[t])]
+    # Снимки одним списком (как при подписке в CLOB), изменения - по одному
+    snapshots = [e for e in events if e.get("event_type") == "book"]
+    if snapshots:
+        peer.send(json.dumps(snapshots))
+    for event in events:
+        if event.get("event_type") == "book":
+            continue
+        time.sleep(state.book_interval)
+        peer.send(json.dumps(event))
+
+class _WsPeer:
+    """Сокет клиента: запись из любого потока под блокировкой"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.lock = threading.Lock()
+
+    def send(self, payload, opcode=0x1):
+        try:
+            with self.lock:
+                _ws_write(self.wfile, payload, opcode)
+            return True
+        except OSError:
+            return False
+
+def _ws_accept(handler):
+    """Рукопожатие RFC 6455"""
+    key = handler.headers.get("Sec-WebSocket-Key", "")
+    accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+    handler.send_response(101, "Switching Protocols")
+    handler.send_header("Upgrade", "websocket")
+    handler.send_header("Connection", "Upgrade")
+    handler.send_header("Sec-WebSocket-Accept", accept)
+    handler.end_headers()
+    handler.wfile.flush()
+    handler.close_connection = True
+    with handler.state.lock:
+        handler.state.ws_connections += 1
+    return _WsPeer(handler.wfile)
+
+def _ws_serve(handler, peer, on_message, on_tick=None):
+    """Читает кадры до закрытия: PING -> PONG, JSON -> on_message; on_tick - раз в секунду"""
+    closed = threading.Event()
+    if on_tick is not None:
+        def tick():
+            while not closed.wait(1.0):
+                on_tick()
+        threading.Thread(target=tick, daemon=True).start()
+    try:
+        while True:
+            opcode, data = _ws_read(handler.rfile)
+            if opcode is None or opcode == 0x8:
+                return
+            if opcode == 0x9:
+                peer.send(data, opcode=0xA)
+                continue
+            if opcode != 0x1:
+                continue
+            text = data.decode()
+            if text == "PING":
+                peer.send("PONG")
+                continue
+            try:
+                message = json.loads(text)
+            except ValueError:
+                continue
+            on_message(message)
+    except (ConnectionError, OSError):
+        return
+    finally:
+        closed.set()
+
+def _resolution_event(state, slug):
+    market = state.market(slug)
+    if not market or not market.get("closed"):
+        return None
+    tokens = json.loads(market["clobTokenIds"])
+    prices = json.loads(market["outcomePrices"])
+    winner = 0 if float(prices[0]) > float(prices[1]) else 1
+    return {
+        "event_type": "market_resolved", "market": market.get("id"), "slug": slug,
+        "assets_ids": [str(t) for t in tokens], "outcomes": ["Up", "Down"],
+        "winning_asset_id": str(tokens[winner]), "winning_outcome": ["Up", "Down"][winner],
+        "timestamp": str(int(time.time() * 1000))
+    }
+
+def _ws_market(handler):
+    """Market-канал: стаканы подписанных токенов и разрешение их рынков"""
+    state = handler.state
+    peer = _ws_accept(handler)
+    subscribed = set()
+    resolved = set()
+
+    def on_message(message):
+        token_ids = [str(t) for t in message.get("assets_ids") or []]
+        if token_ids:
+            subscribed.update(token_ids)
+            _ws_send_books(handler, peer, token_ids)
+
+    def on_tick():
+        with state.lock:
+            slugs = {state.token_markets.get(t) for t in subscribed} - {None} - resolved
+        for slug in slugs:
+            event = _resolution_event(state, slug)
+            if event:
+                resolved.add(slug)
+                peer.send(json.dumps(event))
+
+    _ws_serve(handler, peer, on_message, on_tick)
+
+def _ws_user(handler):
+    """User-канал: события ордеров и сделок после авторизации API-ключом"""
+    state = handler.state
+    peer = _ws_accept(handler)
+
+    def on_message(message):
+        auth = message.get("auth") or {}
+        if auth.get("apiKey") != state.api_key():
+            peer.send(json.dumps({"error": "invalid auth"}))
+            return
+        with state.lock:
+            if peer not in state.user_peers:
+                state.user_peers.append(peer)
+
+    try:
+        _ws_serve(handler, peer, on_message)
+    finally:
+        with state.lock:
+            if peer in state.user_peers:
+                state.user_peers.remove(peer)
+
+def _push_user(state, events):
+    """Рассылает события подписчикам user-канала"""
+    if not events:
+        return
+    with state.lock:
+        peers = list(state.user_peers)
+    for peer in peers:
+        for event in events:
+            peer.send(json.dumps(event))
+
+# ========== ЗАПУСК ==========
+
+def make_server(port=DEFAULT_PORT, host="127.0.0.1", **options):
+    """Создает сервер (port=0 - свободный порт). Возвращает (server, state)"""
+    state = StandinState(**options)
+    handler = type("BoundStandinHandler", (StandinHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, state
+
+def start_in_thread(port=0, **options):
+    """Запускает сервер в фоновом потоке (для бенчмарков). Возвращает (server, state, url)"""
+    server, state = make_server(port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, state, f"http://{host}:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Gamma/CLOB/Telegram API")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--fixtures", help="JSON со списком рынков Gamma (записанные ответы)")
+    parser.add_argument("--no-synthetic", action="store_true", help="не генерировать рынки, которых нет в фикстурах")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--usdc-balance", type=float, default=1000.0, help="баланс кошелька для /rpc")
+    parser.add_argument("--allowance", type=float, default=10 ** 9)
+    parser.add_argument("--fill-ratio", type=float, default=1.0, help="доля ордера, исполняемая сразу")
+    parser.add_argument("--price-improvement", type=float, default=0.0, help="цена сделки ниже лимитной на")
+    parser.add_argument("--book-fixtures", help="JSON со списком записанных событий market-канала")
+    parser.add_argument("--telegram-429", type=int, default=0, help="сколько первых sendMessage ответить 429")
+    parser.add_argument("--book-interval", type=float, default=0.05, help="пауза между событиями стакана, сек")
+    args = parser.parse_args()
+
+    fixtures = None
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+    book_events = None
+    if args.book_fixtures:
+        with open(args.book_fixtures) as f:
+            book_events = json.load(f)
+
+    server, _ = make_server(args.port, args.host, fixtures=fixtures, synthetic=not args.no_synthetic,
+                            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            error_rate=args.error_rate, seed=args.seed,
+                            usdc_balance=args.usdc_balance, allowance=args.allowance,
+                            fill_ratio=args.fill_ratio, price_improvement=args.price_improvement,
+                            book_events=book_events, book_interval=args.book_interval,
+                            telegram_429=args.telegram_429)
+    print(f"Stand-in сервер: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nОстановка")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import os
+import json
+from datetime import datetime
+
+# ================== НАСТРОЙКИ ==================
+
+COMPACT_EVERY = 500  # событий в журнале до сжатия в снимок
+
+# ========== ОПЕРАЦИИ НАД СОСТОЯНИЕМ ==========
+#
+# Событие журнала - это тип (bet_placed, bet_settled, report_sent, ...) и
+# список операций над путями в state:
+#   ["set",  ["statistics", "wins"], 5]
+#   ["del",  ["pending_bets", "BTC_last"]]
+#   ["push", ["statistics", "history"], {...}, 1000]   # append + обрезка
+# Размер записи зависит только от изменения, а не от размера истории.
+
+def _parent(state, path, create):
+    node = state
+    for key in path[:-1]:
+        if key not in node:
+            if not create:
+                return None
+            node[key] = {}
+        node = node[key]
+    return node
+
+def apply_ops(state, ops):
+    for op in ops:
+        kind, path = op[0], op[1]
+        if kind == "set":
+            _parent(state, path, True)[path[-1]] = op[2]
+        elif kind == "del":
+            node = _parent(state, path, False)
+            if node is not None:
+                node.pop(path[-1], None)
+        elif kind == "push":
+            node = _parent(state, path, True)
+            items = node.setdefault(path[-1], [])
+            items.append(op[2])
+            max_len = op[3] if len(op) > 3 else None
+            if max_len and len(items) > max_len:
+                del items[:-max_len]
+        else:
+            raise ValueError(f"Неизвестная операция журнала: {kind}")
+
+# ========== ЖУРНАЛ СОСТОЯНИЯ ==========
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class StateJournal:
+    """Состояние бота = снимок (STATE_FILE) + журнал событий (JSON lines).
+
+    append() дописывает одно событие и делает fsync, compact() атомарно
+    заменяет снимок (tmp + os.replace) и очищает журнал. Номер последнего
+    события хранится в снимке в поле journal_seq, поэтому падение между
+    заменой снимка и очисткой журнала не применит события дважды, а
+    недописанная последняя строка журнала просто отбрасывается.
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, compact_every=COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_every = compact_every
+        self.seq = 0
+        self.pending_events = 0
+
+    def load(self, default_factory):
+        """Снимок + события журнала. Без снимка начинает с default_factory()"""
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                state = json.load(f)
+        else:
+            state = default_factory()
+        self.seq = state.get("journal_seq", 0)
+        self.pending_events = 0
+
+        if not os.path.exists(self.journal_path):
+            return state
+
+        valid_bytes = 0
+        with open(self.journal_path, "rb") as f:
+            for raw in f:
+                try:
+                    event = json.loads(raw)
+                except ValueError:
+                    # Недописанная строка после падения - дальше читать нечего
+                    print(f"[Журнал] Отброшена поврежденная запись в {self.journal_path}")
+                    break
+                valid_bytes += len(raw)
+                if event["seq"] <= self.seq:
+                    continue
+                apply_ops(state, event["ops"])
+                self.seq = event["seq"]
+                self.pending_events += 1
+
+        if valid_bytes < os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(valid_bytes)
+                os.fsync(f.fileno())
+        state["journal_seq"] = self.seq
+        return state
+
+    def append(self, state, event, ops):
+        """Записывает событие (изменения уже применены к state в памяти)"""
+        self.seq += 1
+        state["journal_seq"] = self.seq
+        record = {
+            "seq": self.seq,
+            "ts": datetime.now().isoformat(),
+            "event": event,
+            "ops": ops
+        }
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending_events += 1
+        if self.pending_events >= self.compact_every:
+            self.compact(state)
+
+    def compact(self, state):
+        """Атомарно пишет полный снимок и очищает журнал"""
+        state["journal_seq"] = self.seq
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        _fsync_dir(self.snapshot_path)
+
+        with open(self.journal_path, "w") as f:
+            os.fsync(f.fileno())
+        self.pending_events = 0
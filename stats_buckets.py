@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+# ================== НАСТРОЙКИ ==================
+
+BUCKET_FORMAT = "%Y-%m-%dT%H"   # ключ корзины - час (локальное время, как в history)
+MAX_BUCKETS = 31 * 24           # храним ~30 дней почасовых агрегатов
+
+# ========== ПОЧАСОВЫЕ АГРЕГАТЫ СТАТИСТИКИ ==========
+#
+# Корзина за час: profit, bets, wins и границы серий проигрышей:
+#   head_losses - проигрыши подряд с начала часа (до первого выигрыша),
+#   tail_losses - проигрыши подряд в конце часа (после последнего выигрыша),
+#   max_streak  - самая длинная серия проигрышей внутри часа.
+# По этим полям серии склеиваются между соседними корзинами без истории.
+
+def bucket_key(dt):
+    return dt.strftime(BUCKET_FORMAT)
+
+def empty_bucket():
+    return {
+        "profit": 0.0,
+        "bets": 0,
+        "wins": 0,
+        "head_losses": 0,
+        "tail_losses": 0,
+        "max_streak": 0
+    }
+
+def add_to_bucket(bucket, profit):
+    """Добавляет одну завершенную ставку в корзину"""
+    bucket["profit"] += profit
+    bucket["bets"] += 1
+    if profit > 0:
+        bucket["wins"] += 1
+        bucket["tail_losses"] = 0
+    else:
+        if bucket["wins"] == 0:
+            bucket["head_losses"] += 1
+        bucket["tail_losses"] += 1
+        bucket["max_streak"] = max(bucket["max_streak"], bucket["tail_losses"])
+
+def record_bet(buckets, profit, when=None):
+    """Обновляет корзину часа when (по умолчанию - сейчас). Возвращает ключ корзины"""
+    key = bucket_key(when or datetime.now())
+    add_to_bucket(buckets.setdefault(key, empty_bucket()), profit)
+    return key
+
+def prune_buckets(buckets, max_buckets=MAX_BUCKETS):
+    """Удаляет самые старые корзины сверх max_buckets. Возвращает удаленные ключи"""
+    removed = []
+    if len(buckets) > max_buckets:
+        removed = sorted(buckets)[:len(buckets) - max_buckets]
+        for key in removed:
+            del buckets[key]
+    return removed
+
+def build_buckets(history):
+    """Корзины из списка history (миграция старого состояния)"""
+    buckets = {}
+    for entry in history:
+        record_bet(buckets, entry["profit"], datetime.fromisoformat(entry["timestamp"]))
+    prune_buckets(buckets)
+    return buckets
+
+def query_period(buckets, hours, now=None):
+    """Статистика за последние hours часов по корзинам.
+
+    Окно выровнено по часам: учитывается текущий час и hours-1 предыдущих.
+    """
+    now = now or datetime.now()
+    first_key = bucket_key(now - timedelta(hours=hours - 1))
+
+    profit = 0.0
+    bets = 0
+    wins = 0
+    run = 0          # текущая серия проигрышей на стыке корзин
+    max_streak = 0
+    for key in sorted(k for k in buckets if k >= first_key):
+        b = buckets[key]
+        profit += b["profit"]
+        bets += b["bets"]
+        wins += b["wins"]
+        if b["bets"] == 0:
+            continue
+        if b["wins"] == 0:
+            run += b["bets"]
+            max_streak = max(max_streak, run)
+        else:
+            max_streak = max(max_streak, run + b["head_losses"], b["max_streak"])
+            run = b["tail_losses"]
+
+    losses = bets - wins
+    win_rate = (wins / bets * 100) if bets > 0 else 0
+    return {
+        "profit": profit,
+        "bets": bets,
+        "wins": wins,
+        "losses": losses,
+        "win_rate": win_rate,
+        "max_loss_streak": max_streak
+    }
@@ -0,0 +1,140 @@
+import os
+import csv
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import backtest
+
+# ================== НАСТРОЙКИ ==================
+
+DEFAULT_GRID = {
+    "base_bet": [1.0, 2.0, 4.0],
+    "max_bet": [16.0, 32.0, 64.0, 128.0],
+    "min_multiplier": [1.5, 1.6, 1.7, 1.8],
+    "price_buffer": [0.0, 0.01, 0.02],
+    "lookback": [2, 3, 4]
+}
+
+SORT_KEYS = ("profit", "score", "max_drawdown", "win_rate")
+# Параметры, которые без записанных цен входа не на чем проверять
+PRICE_PARAMS = ("min_multiplier", "price_buffer")
+CHUNK_SIZE = 16   # комбинаций на одну задачу пула
+
+# ========== ДАННЫЕ ВОРКЕРА ==========
+
+# Массивы интервалов загружаются один раз на процесс в _init_worker
+_data = None
+
+def _init_worker(path, coin):
+    global _data
+    _data = backtest.load_data(path, coin)
+
+def _run_one(params):
+    outcomes, up_prices, down_prices = _data
+    result = backtest.run_backtest(outcomes, up_prices, down_prices, **params)
+    row = dict(params)
+    for key in ("bets", "wins", "win_rate", "profit", "max_drawdown", "max_loss_streak", "max_capital_at_risk"):
+        row[key] = result[key]
+    # Прибыль на единицу просадки - основная метрика для сравнения
+    row["score"] = result["profit"] / result["max_drawdown"] if result["max_drawdown"] > 0 else result["profit"]
+    return row
+
+# ========== ПЕРЕБОР ПАРАМЕТРОВ ==========
+
+def grid_params(grid):
+    keys = list(grid)
+    for values in itertools.product(*(grid[k] for k in keys)):
+        params = dict(zip(keys, values))
+        if params["base_bet"] <= params["max_bet"]:
+            yield params
+
+def random_params(grid, count, seed=None):
+    rng = random.Random(seed)
+    for _ in range(count):
+        params = {
+            "base_bet": rng.uniform(min(grid["base_bet"]), max(grid["base_bet"])),
+            "max_bet": rng.uniform(min(grid["max_bet"]), max(grid["max_bet"])),
+            "min_multiplier": rng.uniform(min(grid["min_multiplier"]), max(grid["min_multiplier"])),
+            "price_buffer": rng.uniform(min(grid["price_buffer"]), max(grid["price_buffer"])),
+            "lookback": rng.randint(min(grid["lookback"]), max(grid["lookback"]))
+        }
+        if params["base_bet"] <= params["max_bet"]:
+            yield params
+
+def run_sweep(path, coin, param_list, workers=None):
+    """Прогоняет все комбинации параметров на всех ядрах"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path, coin)) as pool:
+        return list(pool.map(_run_one, param_list, chunksize=CHUNK_SIZE))
+
+def print_table(rows, sort_key, top):
+    reverse = sort_key != "max_drawdown"
+    rows = sorted(rows, key=lambda r: r[sort_key], reverse=reverse)[:top]
+    print(f"{'#':>3} {'base':>6} {'max':>7} {'mult':>5} {'buf':>5} {'look':>4} "
+          f"{'ставок':>7} {'винрейт':>7} {'прибыль':>10} {'просадка':>9} {'серия':>5} {'score':>7}")
+    for i, r in enumerate(rows, 1):
+        print(f"{i:>3} {r['base_bet']:>6.2f} {r['max_bet']:>7.2f} {r['min_multiplier']:>5.2f} "
+              f"{r['price_buffer']:>5.3f} {r['lookback']:>4} {r['bets']:>7} {r['win_rate']:>6.1f}% "
+              f"{r['profit']:>10.2f} {r['max_drawdown']:>9.2f} {r['max_loss_streak']:>5} {r['score']:>7.2f}")
+
+def save_csv(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def parse_list(value, cast=float):
+    return [cast(v) for v in value.split(",")]
+
+# ========== ЗАПУСК ИЗ КОМАНДНОЙ СТРОКИ ==========
+
+def main():
+    parser = argparse.ArgumentParser(description="Перебор параметров стратегии на истории интервалов")
+    parser.add_argument("data", help="CSV (timestamp,outcome,...), архив .bin или SQLite история")
+    parser.add_argument("--coin", default="BTC")
+    parser.add_argument("--base-bet", type=parse_list)
+    parser.add_argument("--max-bet", type=parse_list)
+    parser.add_argument("--min-multiplier", type=parse_list)
+    parser.add_argument("--price-buffer", type=parse_list)
+    parser.add_argument("--lookback", type=lambda v: parse_list(v, int))
+    parser.add_argument("--random", type=int, help="случайный поиск: число комбинаций в пределах сетки")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--sort", choices=SORT_KEYS, default="score")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--csv", help="сохранить все результаты в CSV")
+    args = parser.parse_args()
+
+    grid = dict(DEFAULT_GRID)
+    for key in grid:
+        if getattr(args, key) is not None:
+            grid[key] = getattr(args, key)
+
+    outcomes, up_prices, down_prices = backtest.load_data(args.data, args.coin)
+    missing = backtest.missing_entry_prices(outcomes, up_prices, down_prices)
+    if missing:
+        tuned = [key for key in PRICE_PARAMS if args.random or len(set(grid[key])) > 1]
+        if tuned:
+            parser.error(f"в {args.data} нет цен входа у {missing} интервалов (архив и SQLite хранят "
+                         f"только исходы) - перебор {', '.join(tuned)} бессмыслен, "
+                         f"задайте одно значение или CSV с up_price,down_price")
+
+    if args.random:
+        param_list = list(random_params(grid, args.random, args.seed))
+    else:
+        param_list = list(grid_params(grid))
+
+    print(f"Комбинаций: {len(param_list)}, процессов: {args.workers}")
+    started = time.perf_counter()
+    rows = run_sweep(args.data, args.coin, param_list, args.workers)
+    print(f"Готово за {time.perf_counter() - started:.2f} сек\n")
+
+    print_table(rows, args.sort, args.top)
+    if args.csv and rows:
+        save_csv(rows, args.csv)
+        print(f"\nРезультаты сохранены в {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import time
+import queue
+import threading
+import requests
+
+# ================== НАСТРОЙКИ ==================
+
+MAX_MESSAGE_LENGTH = 4096   # лимит Telegram на текст sendMessage
+QUEUE_SIZE = 200
+SEPARATOR = "\n\n"
+LINGER = 1.0              # сколько ждать следующих сообщений перед отправкой пачки, сек
+MAX_HOLD = 5.0            # дольше первое сообщение пачки не задерживается
+SEND_TIMEOUT = 8
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 1.0         # пауза после ошибки сети, удваивается
+FLUSH_DEADLINE = 10.0     # сколько ждать отправки очереди при остановке
+BAD_REQUEST = 400         # Telegram не разобрал текст (обычно HTML-разметку)
+
+# ========== ФОНОВАЯ ОТПРАВКА В TELEGRAM ==========
+#
+# send() только кладет текст в очередь - ордер и save_state не ждут
+# Telegram. Поток склеивает сообщения прогона (ставки, расчеты, отчеты) в
+# пачки до MAX_MESSAGE_LENGTH символов, на 429 ждет retry_after из ответа,
+# при остановке close() дожидается отправки не дольше deadline. Если пачку
+# отклонили с 400, ее сообщения уходят по одному, а то, которое Telegram
+# не разобрал, - без parse_mode, чтобы одно сообщение не теряло всю пачку.
+
+def split_message(text, limit=MAX_MESSAGE_LENGTH):
+    """Режет длинный текст по строкам (строку длиннее limit - по символам)"""
+    parts = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        candidate = current + "\n" + line if current else line
+        if len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+def coalesce(messages, limit=MAX_MESSAGE_LENGTH):
+    """Раскладывает сообщения по порядку на как можно меньше пачек: [[часть, ...], ...].
+    Части пачки через SEPARATOR дают текст не длиннее limit"""
+    batches = []
+    current = []
+    length = 0
+    for msg in messages:
+        for part in split_message(msg, limit):
+            candidate = length + len(SEPARATOR) + len(part) if current else len(part)
+            if candidate > limit:
+                batches.append(current)
+                current = [part]
+                length = len(part)
+            else:
+                current.append(part)
+                length = candidate
+    if current:
+        batches.append(current)
+    return batches
+
+class TelegramNotifier:
+    """Очередь сообщений Telegram с фоновым потоком отправки"""
+
+    def __init__(self, token, chat_id, api="https://api.telegram.org", parse_mode="HTML",
+                 metrics=None, queue_size=QUEUE_SIZE, linger=LINGER, max_hold=MAX_HOLD):
+        self.url = f"{api}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.parse_mode = parse_mode
+        self.metrics = metrics
+        self.linger = linger
+        self.max_hold = max_hold
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closing = threading.Event()
+        self.flush_deadline = None
+        self.sent = 0
+        self.requests = 0
+        self.dropped = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="telegram", daemon=True)
+                self.thread.start()
+
+    def send(self, text):
+        """Ставит сообщение в очередь, не блокируя вызывающий поток"""
+        self.start()
+        try:
+            self.queue.put_nowait(text)
+        except queue.Full:
+            self.dropped += 1
+            print(f"[Telegram] Очередь переполнена, сообщение пропущено: {text[:60]}")
+
+    def _collect(self, carry=None):
+        """Пачка сообщений: carry или первое из очереди + все, что придет за linger"""
+        first = carry if carry is not None else self.queue.get()
+        if first is None:
+            return None
+        messages = [first]
+        length = len(first)
+        started = time.time()
+        while length < MAX_MESSAGE_LENGTH and not self.closing.is_set():
+            wait = min(self.linger, self.max_hold - (time.time() - started))
+            if wait <= 0:
+                break
+            try:
+                msg = self.queue.get(timeout=wait)
+            except queue.Empty:
+                break
+            if msg is None:
+                self.queue.put(None)   # остановка - после отправки пачки
+                break
+            messages.append(msg)
+            length += len(msg) + len(SEPARATOR)
+        # При остановке забираем все, что уже лежит в очереди
+        while self.closing.is_set():
+            try:
+                msg = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if msg is None:
+                self.queue.put(None)
+                break
+            messages.append(msg)
+        return messages
+
+    def _post(self, text, deadline=None, parse_mode=True):
+        """Один sendMessage с повторами; на 429 ждет retry_after.
+
+        Возвращает код ответа (200 - отправлено), None - не дождались ответа.
+        parse_mode=None - простой текст без разметки.
+        """
+        payload = {"chat_id": self.chat_id, "text": text}
+        if parse_mode is True:
+            parse_mode = self.parse_mode
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+        delay = RETRY_DELAY
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                self.requests += 1
+                if self.metrics is not None:
+                    with self.metrics.span("telegram"):
+                        r = self.session.post(self.url, json=payload, timeout=SEND_TIMEOUT)
+                else:
+                    r = self.session.post(self.url, json=payload, timeout=SEND_TIMEOUT)
+                if r.status_code == 200:
+                    return r.status_code
+                if r.status_code == 429:
+                    try:
+                        delay = float(r.json().get("parameters", {}).get("retry_after", delay))
+                    except ValueError:
+                        pass
+                    print(f"[Telegram] Лимит запросов, ждем {delay:.0f} сек")
+                elif r.status_code < 500:
+                    print(f"[Telegram] Ошибка отправки: {r.text}")
+                    return r.status_code
+                else:
+                    print(f"[Telegram] Ошибка сервера {r.status_code}, повтор через {delay:.0f} сек")
+            except requests.RequestException as e:
+                print(f"[Telegram] Ошибка: {e}")
+            if deadline is not None and time.time() + delay > deadline:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+        return None
+
+    def _deliver(self, parts, deadline=None):
+        """Пачка одним sendMessage; на 400 - части по одной, неразобранная - без разметки"""
+        status = self._post(SEPARATOR.join(parts), deadline)
+        if status == BAD_REQUEST and self.parse_mode:
+            if len(parts) > 1:
+                print(f"[Telegram] Пачка отклонена, отправляем {len(parts)} сообщений по одному")
+                for part in parts:
+                    self._deliver([part], deadline)
+                return
+            print("[Telegram] Разметка не разобрана, отправляем простым текстом")
+            status = self._post(parts[0], deadline, parse_mode=None)
+        if status == 200:
+            self.sent += 1
+        else:
+            self.dropped += 1
+
+    def _run(self):
+        carry = None
+        while True:
+            messages = self._collect(carry)
+            if messages is None:
+                return
+            batches = coalesce(messages)
+            carry = None
+            if len(batches) > 1 and not self.queue.empty() and not self.closing.is_set():
+                # Неполный хвост пачки склеится со следующими сообщениями
+                carry = SEPARATOR.join(batches.pop())
+            deadline = self.flush_deadline if self.closing.is_set() else None
+            for parts in batches:
+                if deadline is not None and time.time() >= deadline:
+                    self.dropped += 1
+                    continue
+                self._deliver(parts, deadline)
+
+    def close(self, deadline=FLUSH_DEADLINE):
+        """Отправляет оставшиеся сообщения, ждет не дольше deadline секунд.
+        Повторный вызов ничего не делает"""
+        if self.thread is None or self.closing.is_set():
+            return
+        self.flush_deadline = time.time() + deadline
+        self.closing.set()
+        try:
+            self.queue.put(None, timeout=deadline)
+        except queue.Full:
+            pass
+        self.thread.join(max(self.flush_deadline - time.time(), 0))
+        if self.thread.is_alive():
+            print(f"[Telegram] Не успели отправить за {deadline:.0f} сек, осталось в очереди: {self.queue.qsize()}")
+
+    def summary(self):
+        return f"Telegram: отправлено {self.sent} пачек за {self.requests} запросов, пропущено {self.dropped}"
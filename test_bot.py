@@ -1,12 +1,24 @@
 import os
 import time
-import json
-import requests
+
+STARTED_AT = time.perf_counter()   # для замера времени запуска (импорты модулей)
+
+import asyncio
 from datetime import datetime, timezone, timedelta
 
-from py_clob_client.client import ClobClient
-from py_clob_client.clob_types import OrderArgs, OrderType
-from py_clob_client.order_builder.constants import BUY
+from clob_session import ClobSession
+from gamma_client import GammaClient
+from market_cache import MarketCache
+from market_snapshot import MarketSnapshot
+from balance_provider import BalanceProvider
+import order_tracker
+from state_journal import StateJournal
+import stats_buckets
+from history_store import HistoryStore
+from run_metrics import RunMetrics
+from telegram_notifier import TelegramNotifier
+import interval_calendar
+from market_series import SeriesShard, SHARD_KEYS, market_series, parse_series, stored_series
 
 # ================== НАСТРОЙКИ ==================
 
@@ -25,6 +37,9 @@ TEST_MODE = True  # True = без реальных ставок, False = реа
 
 # 👇 НАСТРОЙКИ СТРАТЕГИИ
 LOOKBACK_INTERVALS = 2  # Анализируем последние 2 интервала
+# 👇 СЕРИИ РЫНКОВ: "актив:таймфрейм" через запятую, таймфреймы 5m, 15m, 1h
+SERIES = parse_series(os.environ.get('BOT_SERIES', "BTC:15m,ETH:15m"))
+MAX_CONCURRENT_SERIES = 8  # сколько серий обрабатывается одновременно
 
 if not PRIVATE_KEY:
     raise ValueError("PRIVATE_KEY не найден в переменных окружения!")
@@ -33,9 +48,11 @@ print("PRIVATE_KEY загружен:", PRIVATE_KEY[:10] + "..." + PRIVATE_KEY[-6
 print(f"🔧 РЕЖИМ ТЕСТИРОВАНИЯ: {'ВКЛЮЧЕН (без реальных ставок)' if TEST_MODE else 'ВЫКЛЮЧЕН (реальные ставки)'}")
 print(f"💰 НАЧАЛЬНЫЙ БАЛАНС: ${INITIAL_BALANCE}")
 print(f"📊 СТРАТЕГИЯ: Анализ последних {LOOKBACK_INTERVALS} интервалов + мартингейл")
+print(f"📈 СЕРИИ: {', '.join(series.key for series in SERIES)}")
 
 CHAIN_ID = 137
-HOST = "https://clob.polymarket.com"
+HOST = os.environ.get('CLOB_HOST', "https://clob.polymarket.com")
+TELEGRAM_API = os.environ.get('TELEGRAM_API', "https://api.telegram.org")
 
 BASE_BET = 2.0
 MAX_BET = 64.0
@@ -44,6 +61,29 @@ MAX_PRICE_FOR_OPPOSITE = 1.0 / MIN_MULTIPLIER  # ≈ 0.588
 PRICE_BUFFER = 0.01
 
 STATE_FILE = "test_bot_state.json"
+# 👇 ПОЛНАЯ ИСТОРИЯ В SQLITE (необязательно): путь к файлу БД
+HISTORY_DB = os.environ.get('HISTORY_DB')
+JOURNAL_FILE = "test_bot_state.journal"
+SHARD_DIR = "test_bot_state"   # состояние серий: {серия}.json + {серия}.journal
+MARKET_CACHE_FILE = "test_market_cache.json"
+METRICS_FILE = "test_bot_metrics.json"   # гистограммы этапов за все прогоны
+METRICS_PROM_FILE = os.environ.get('METRICS_PROM_FILE', "test_bot_metrics.prom")
+CREDS_CACHE_FILE = "test_clob_creds.enc"   # API creds CLOB (AES-GCM, ключ из PRIVATE_KEY), не коммитится
+
+# Общий клиент Gamma API (keep-alive пул + повторы)
+gamma = GammaClient()
+# Кеш рынков: memo на прогон + разрешенные рынки на диске
+market_cache = MarketCache(MARKET_CACHE_FILE)
+# Состояние: снимок STATE_FILE + журнал событий JOURNAL_FILE
+journal = StateJournal(STATE_FILE, JOURNAL_FILE)
+# Полная история ставок и исходов интервалов (если задан HISTORY_DB)
+history_store = HistoryStore(HISTORY_DB, source="test_bot") if HISTORY_DB else None
+# Время этапов прогона (span) с выгрузкой в JSON и Prometheus
+metrics = RunMetrics(METRICS_FILE, METRICS_PROM_FILE)
+# Сообщения Telegram: очередь и фоновый поток, склейка в пачки до 4096 символов
+notifier = TelegramNotifier(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_API, metrics=metrics)
+# Баланс USDC и allowance биржи из Polygon RPC (кеш BALANCE_TTL сек)
+balances = BalanceProvider(REAL_WALLET_ADDRESS)
 
 # ========== ФУНКЦИЯ ОТПРАВКИ В ТЕЛЕГРАМ ==========
 
@@ -55,72 +95,107 @@ def send_telegram(msg):
     if TEST_MODE:
         msg = "🧪 [ТЕСТ]\n" + msg
     
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": msg,
-        "parse_mode": "HTML"
-    }
-    try:
-        r = requests.post(url, json=payload, timeout=8)
-        if r.status_code != 200:
-            print(f"[Telegram] Ошибка отправки: {r.text}")
-    except Exception as e:
-        print(f"[Telegram] Ошибка: {e}")
+    # Отправка в фоне: ордер и сохранение состояния не ждут Telegram
+    notifier.send(msg)
 
 # ========== ФУНКЦИИ ДЛЯ РАБОТЫ С СОСТОЯНИЕМ ==========
+#
+# Корневое состояние (STATE_FILE) - общая статистика счета и курсор сделок.
+# Ставки, мартингейл и последние исходы каждой серии лежат в ее шарде
+# SHARD_DIR/{серия}.json + .journal (market_series.SeriesShard).
 
-def load_state():
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "r") as f:
-            data = json.load(f)
-            if "pending_bets" not in data:
-                data["pending_bets"] = {}
-            if "statistics" not in data:
-                data["statistics"] = {
-                    "total_profit": 0.0,
-                    "total_bets": 0,
-                    "wins": 0,
-                    "losses": 0,
-                    "history": [],
-                    "last_reset_date": datetime.now().strftime('%Y-%m-%d')
-                }
-            if "last_results" not in data:
-                data["last_results"] = {}
-            if "martingale" not in data:
-                data["martingale"] = {}
-            return data
+def default_state():
     return {
-        "pending_bets": {},
         "statistics": {
             "total_profit": 0.0,
             "total_bets": 0,
             "wins": 0,
             "losses": 0,
             "history": [],
+            "buckets": {},
             "last_reset_date": datetime.now().strftime('%Y-%m-%d')
         },
-        "last_results": {},
-        "martingale": {}
+        "trade_cursor": None
     }
 
-def save_state(state):
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f, indent=2)
+def load_state():
+    data = journal.load(default_state)
+    if "statistics" not in data:
+        data["statistics"] = default_state()["statistics"]
+    if "buckets" not in data["statistics"]:
+        # Миграция: почасовые агрегаты из существующей истории
+        data["statistics"]["buckets"] = stats_buckets.build_buckets(data["statistics"]["history"])
+        save_state(data)
+    if history_store:
+        history_store.migrate_state(data, STATE_FILE)
+    return data
+
+def load_shards(state):
+    """Состояния серий из SERIES и всех серий, уже сохраненных на диске
+    (их ставки рассчитываются, даже если серию убрали из настроек).
+
+    Миграция: ставки, мартингейл и исходы из старого общего состояния
+    переходят в шарды 15m своих монет.
+    """
+    legacy = {key: state[key] for key in SHARD_KEYS if key in state}
+    series_list = list(SERIES) + stored_series(SHARD_DIR)
+    for bet_key in legacy.get("pending_bets", {}):
+        series_list.append(market_series(bet_key.split('_')[0], "15m"))
+    for section in ("martingale", "last_results"):
+        series_list += [market_series(coin, "15m") for coin in legacy.get(section, {})]
+    
+    shards = {}
+    for series in series_list:
+        if series.key not in shards:
+            shards[series.key] = SeriesShard(series, SHARD_DIR)
+            shards[series.key].load()
+    
+    if legacy:
+        for bet_key, info in legacy.get("pending_bets", {}).items():
+            shards[market_series(bet_key.split('_')[0], "15m").key].state["pending_bets"].setdefault(bet_key, info)
+        for section in ("martingale", "last_results"):
+            for coin, value in legacy.get(section, {}).items():
+                shards[market_series(coin, "15m").key].state[section].setdefault(coin, value)
+        # Сначала шарды, потом корень: падение между ними повторит перенос
+        for shard in shards.values():
+            save_shard(shard)
+        for key in legacy:
+            del state[key]
+        save_state(state)
+        print(f"📦 Состояние перенесено в шарды серий: {', '.join(shards)}")
+    return shards
+
+def save_state(state, event=None, ops=None):
+    """Без ops - полный снимок состояния, с ops - одно событие в журнал"""
+    with metrics.span("state_save"):
+        if ops is None:
+            journal.compact(state)
+        else:
+            journal.append(state, event, ops)
+
+def save_shard(shard, event=None, ops=None):
+    """То же для состояния серии"""
+    with metrics.span("state_save"):
+        shard.save(event, ops)
 
-def update_statistics(state, coin, result, profit, bet_amount, direction):
-    """Обновляет статистику после завершения ставки"""
+def update_statistics(state, series, result, profit, bet_amount, direction, slug=None, outcome=None):
+    """Обновляет общую статистику после завершения ставки"""
     stats = state["statistics"]
     
     # Добавляем в историю
-    stats["history"].append({
+    entry = {
         "timestamp": datetime.now().isoformat(),
-        "coin": coin,
+        "coin": series.asset,
+        "timeframe": series.timeframe,
         "result": result,
         "profit": profit,
         "bet_amount": bet_amount,
         "direction": direction
-    })
+    }
+    stats["history"].append(entry)
+    if history_store:
+        history_store.add_bet(series.asset, result, profit, bet_amount, direction, slug, outcome,
+                              timeframe=series.timeframe)
     
     # Обновляем общую статистику
     stats["total_bets"] += 1
@@ -128,88 +203,91 @@ def update_statistics(state, coin, result, profit, bet_amount, direction):
     
     if profit > 0:
         stats["wins"] += 1
+    else:
+        stats["losses"] += 1
+    
+    # Ограничиваем историю последними 1000 записями
+    if len(stats["history"]) > 1000:
+        stats["history"] = stats["history"][-1000:]
+    
+    # Почасовые агрегаты для отчетов
+    bucket_key = stats_buckets.record_bet(stats["buckets"], profit)
+    pruned = stats_buckets.prune_buckets(stats["buckets"])
+    
+    save_state(state, "bet_settled", [
+        ["push", ["statistics", "history"], entry, 1000],
+        ["set", ["statistics", "buckets", bucket_key], stats["buckets"][bucket_key]],
+        ["set", ["statistics", "total_bets"], stats["total_bets"]],
+        ["set", ["statistics", "total_profit"], stats["total_profit"]],
+        ["set", ["statistics", "wins"], stats["wins"]],
+        ["set", ["statistics", "losses"], stats["losses"]]
+    ] + [["del", ["statistics", "buckets", key]] for key in pruned])
+
+def update_martingale(shard, coin, profit, bet_amount, direction):
+    """Мартингейл серии после завершения ставки"""
+    martingale = shard.state["martingale"]
+    if profit > 0:
         # Если выиграли - очищаем мартингейл для этой монеты
-        if coin in state["martingale"]:
-            del state["martingale"][coin]
+        if coin in martingale:
+            del martingale[coin]
             print(f"✅ Серия завершена выигрышем, мартингейл сброшен")
     else:
-        stats["losses"] += 1
         # Если проиграли - обновляем мартингейл
         next_bet = min(bet_amount * 2, MAX_BET)
-        if coin not in state["martingale"]:
-            state["martingale"][coin] = {
+        if coin not in martingale:
+            martingale[coin] = {
                 "direction": direction,
                 "next_bet": next_bet,
                 "losses_count": 1
             }
         else:
-            state["martingale"][coin]["next_bet"] = next_bet
-            state["martingale"][coin]["losses_count"] += 1
+            martingale[coin]["next_bet"] = next_bet
+            martingale[coin]["losses_count"] += 1
         print(f"📉 Проигрыш, следующая ставка: ${next_bet} на {direction}")
     
-    # Ограничиваем историю последними 1000 записями
-    if len(stats["history"]) > 1000:
-        stats["history"] = stats["history"][-1000:]
-    
-    save_state(state)
+    if coin in martingale:
+        save_shard(shard, "martingale_step", [["set", ["martingale", coin], martingale[coin]]])
+    else:
+        save_shard(shard, "martingale_step", [["del", ["martingale", coin]]])
 
-def update_last_result(state, coin, result):
-    """Сохраняет последний результат для монеты"""
-    if coin not in state["last_results"]:
-        state["last_results"][coin] = []
+def update_last_result(shard, coin, result):
+    """Сохраняет последний результат для монеты серии"""
+    last_results = shard.state["last_results"]
+    if coin not in last_results:
+        last_results[coin] = []
     
-    state["last_results"][coin].append({
+    entry = {
         "timestamp": datetime.now().isoformat(),
         "result": result
-    })
+    }
+    last_results[coin].append(entry)
     
-    if len(state["last_results"][coin]) > LOOKBACK_INTERVALS:
-        state["last_results"][coin] = state["last_results"][coin][-LOOKBACK_INTERVALS:]
+    if len(last_results[coin]) > LOOKBACK_INTERVALS:
+        last_results[coin] = last_results[coin][-LOOKBACK_INTERVALS:]
     
-    save_state(state)
+    save_shard(shard, "last_result", [["push", ["last_results", coin], entry, LOOKBACK_INTERVALS]])
 
-def get_last_results(state, coin):
-    """Получает последние результаты для монеты"""
-    if coin not in state["last_results"]:
+def get_last_results(shard, coin):
+    """Получает последние результаты для монеты серии"""
+    if coin not in shard.state["last_results"]:
         return []
-    return [r["result"] for r in state["last_results"][coin]]
+    return [r["result"] for r in shard.state["last_results"][coin]]
 
 def get_statistics_period(state, hours):
     """Получает статистику за указанный период"""
-    stats = state["statistics"]
-    now = datetime.now()
-    period_ago = now - timedelta(hours=hours)
-    
-    period_profit = 0
-    period_bets = 0
-    period_wins = 0
-    
-    for entry in stats["history"]:
-        entry_time = datetime.fromisoformat(entry["timestamp"])
-        if entry_time > period_ago:
-            period_profit += entry["profit"]
-            period_bets += 1
-            if entry["profit"] > 0:
-                period_wins += 1
-    
-    period_losses = period_bets - period_wins
-    win_rate = (period_wins / period_bets * 100) if period_bets > 0 else 0
-    
-    return {
-        "profit": period_profit,
-        "bets": period_bets,
-        "wins": period_wins,
-        "losses": period_losses,
-        "win_rate": win_rate
-    }
+    # Считается по почасовым корзинам, а не перебором всей истории
+    return stats_buckets.query_period(state["statistics"]["buckets"], hours)
 
 def get_current_balance(state):
-    """Получает текущий баланс с учетом профита"""
+    """Тестовый режим - баланс из состояния (начальный + профит),
+    реальный - доступный USDC кошелька: min(баланс, allowance биржи)"""
     if TEST_MODE:
         return INITIAL_BALANCE + state["statistics"]["total_profit"]
-    else:
-        # TODO: добавить реальную проверку баланса
-        return INITIAL_BALANCE + state["statistics"]["total_profit"]
+    try:
+        return balances.available()
+    except Exception as e:
+        print(f"Ошибка проверки баланса: {e}")
+        return None
 
 def check_midnight():
     """Проверяет, наступила ли полночь по UTC+5"""
@@ -218,235 +296,117 @@ def check_midnight():
 
 # ========== ФУНКЦИИ ДЛЯ РАБОТЫ С POLYMARKET ==========
 
-def is_new_interval(minutes=15):
-    """Проверяет, наступило ли начало интервала (в течение всей первой минуты)"""
-    now = datetime.now(timezone(timedelta(hours=5)))
-    return now.minute % minutes == 0
-
 def get_market(slug: str):
-    url = f"https://gamma-api.polymarket.com/markets?slug={slug}"
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        return data[0] if data else None
+        with metrics.span("market_fetch"):
+            return market_cache.get(slug, gamma.get_market)
     except Exception as e:
         print(f"Ошибка gamma API {slug}: {e}")
         return None
 
-def parse_prices(prices_field):
-    """Парсинг цен из API"""
-    try:
-        if isinstance(prices_field, str):
-            try:
-                prices_str = prices_field.replace('\\"', '"')
-                prices_list = json.loads(prices_str)
-                return [float(p) for p in prices_list]
-            except:
-                import re
-                numbers = re.findall(r"[\d.]+", prices_field)
-                return [float(n) for n in numbers[:2]]
-        elif isinstance(prices_field, list):
-            prices = []
-            for p in prices_field[:2]:
-                if isinstance(p, str):
-                    try:
-                        prices.append(float(p))
-                    except:
-                        prices.append(0.5)
-                elif isinstance(p, (int, float)):
-                    prices.append(float(p))
-                else:
-                    prices.append(0.5)
-            return prices
-        return [0.5, 0.5]
-    except Exception as e:
-        print(f"Ошибка парсинга цен: {e}")
-        return [0.5, 0.5]
-
-def is_market_resolved(market):
-    """Определяет, разрешен ли рынок"""
-    if not market:
-        return False
-    
-    prices = parse_prices(market.get("outcomePrices", ["0.5", "0.5"]))
-    
-    if prices[0] >= 0.85 or prices[1] >= 0.85:
-        return True
-    
-    uma_status = market.get("umaResolutionStatus")
-    if uma_status in ["resolved", "confirmed"]:
-        return True
-    
-    return False
-
-def get_winner(market):
-    """Получает победителя на рынке"""
-    if not market:
-        return None
-    
-    prices = parse_prices(market.get("outcomePrices", ["0.5", "0.5"]))
-    
-    if prices[0] >= 0.85:
-        return "Up"
-    if prices[1] >= 0.85:
-        return "Down"
-    
-    uma_status = market.get("umaResolutionStatus")
-    if uma_status in ["resolved", "confirmed"]:
-        return "Up" if prices[0] > prices[1] else "Down"
-    
-    return None
-
-def get_token_id_and_price(market, direction: str):
-    """Получение token ID и цены"""
-    clob_ids = market.get("clobTokenIds", [])
-    
-    if isinstance(clob_ids, str):
-        try:
-            clob_ids = json.loads(clob_ids)
-        except:
-            clob_ids = []
-    
-    prices = parse_prices(market.get("outcomePrices", ["0.5", "0.5"]))
-    
-    index = 0 if direction == "Up" else 1
-    
-    if index >= len(clob_ids):
-        return None, prices[index] if index < len(prices) else 0.5
-    
-    return clob_ids[index], prices[index]
-
 def get_current_et_time():
-    """Получает текущее время в ET для отображения"""
-    now_utc5 = datetime.now(timezone(timedelta(hours=5)))
-    et_now = now_utc5 - timedelta(hours=10)
-    return et_now
+    """Получает текущее время в ET для отображения (с учетом летнего времени)"""
+    return interval_calendar.now_et()
 
-def get_current_interval_timestamp(coin):
-    """Получает правильный timestamp для текущего интервала (на основе UTC)"""
-    # Текущее время в UTC
-    now_utc = datetime.now(timezone.utc)
-    
-    # Округляем до начала 15-минутного интервала в UTC
-    current_minute = now_utc.minute
-    interval_start = (current_minute // 15) * 15
-    interval_time_utc = now_utc.replace(minute=interval_start, second=0, microsecond=0)
-    
+def prefetch_run_markets(shards):
+    """Загружает все рынки прогона одним пакетным запросом.
+
+    Для каждой серии - два предыдущих интервала и текущий, плюс все slug-и
+    из активных ставок всех серий. Дальнейшие поиски рынков берут их из кеша.
+    """
+    slugs = []
+    for series in SERIES:
+        for intervals_ago in (1, 2, 0):
+            slugs.append(series.slug(series.interval_start(intervals_ago)))
+    slugs += [info["slug"] for info in pending_view(shards).values()]
+    try:
+        with metrics.span("market_prefetch"):
+            markets = market_cache.get_many(slugs, gamma.get_markets_by_slugs)
+    except Exception as e:
+        print(f"Ошибка пакетной загрузки рынков: {e}")
+        return {}
+    missing = [slug for slug, market in markets.items() if market is None]
+    print(f"📦 Загружено рынков: {len(markets) - len(missing)} из {len(markets)}")
+    if missing:
+        print(f"   Не найдены: {', '.join(missing)}")
+    return markets
+
+def get_interval_timestamp(series, intervals_ago=0):
+    """Получает timestamp интервала серии intervals_ago интервалов назад (на основе UTC)"""
     # Timestamp - это просто Unix время начала интервала в UTC
-    timestamp = int(interval_time_utc.timestamp())
+    timestamp = series.interval_start(intervals_ago)
+    interval_time_utc = interval_calendar.to_utc(timestamp)
     
     # Для отладки покажем соответствие времени
-    interval_time_et = interval_time_utc - timedelta(hours=5)
+    interval_time_et = interval_calendar.to_et(timestamp)
     
-    print(f"Текущий интервал UTC: {interval_time_utc.hour}:{interval_time_utc.minute:02d}")
+    print(f"Интервал {series.key} UTC: {interval_time_utc.hour}:{interval_time_utc.minute:02d}")
     print(f"Соответствует ET: {interval_time_et.hour}:{interval_time_et.minute:02d}")
     print(f"Timestamp: {timestamp}")
     
     return timestamp, interval_time_et
 
-def get_interval_timestamp(coin, minutes_ago):
-    """Получает timestamp для интервала, который был minutes_ago минут назад"""
-    now_utc = datetime.now(timezone.utc)
-    
-    # Отнимаем нужное количество минут
-    target_time_utc = now_utc - timedelta(minutes=minutes_ago)
-    
-    # Округляем до начала 15-минутного интервала
-    target_minute = target_time_utc.minute
-    interval_start = (target_minute // 15) * 15
-    interval_time_utc = target_time_utc.replace(minute=interval_start, second=0, microsecond=0)
-    
-    timestamp = int(interval_time_utc.timestamp())
-    
-    interval_time_et = interval_time_utc - timedelta(hours=5)
-    print(f"Интервал UTC: {interval_time_utc.hour}:{interval_time_utc.minute:02d}")
-    print(f"Соответствует ET: {interval_time_et.hour}:{interval_time_et.minute:02d}")
-    print(f"Timestamp: {timestamp}")
-    
-    return timestamp, interval_time_et
-
-def get_market_by_timestamp(coin, timestamp):
-    """Получает рынок по timestamp"""
+def get_market_by_timestamp(series, timestamp):
+    """Получает рынок серии по timestamp"""
     try:
-        if coin == "BTC":
-            slug = f"btc-updown-15m-{timestamp}"
-        else:
-            slug = f"eth-updown-15m-{timestamp}"
+        slug = series.slug(timestamp)
         
         print(f"Ищем рынок по slug: {slug}")
-        url = f"https://gamma-api.polymarket.com/markets?slug={slug}"
-        resp = requests.get(url, timeout=10)
+        try:
+            with metrics.span("market_fetch"):
+                market = market_cache.get(slug, gamma.get_market)
+        except Exception as e:
+            print(f"Ошибка gamma API {slug}: {e}")
+            market = None
         
-        if resp.status_code == 200:
-            markets = resp.json()
-            if markets:
-                market = markets[0]
-                print(f"✅ Найден рынок: {market.get('question')}")
-                return market
+        if market:
+            print(f"✅ Найден рынок: {market.question}")
+            return market
         
         # Если не нашли по точному slug, пробуем найти по времени в названии
         print(f"❌ Рынок по slug не найден, пробуем альтернативный поиск...")
+        print(f"Ищем по времени: {interval_calendar.question_time(timestamp)}")
         
-        # Конвертируем timestamp обратно в время ET для поиска в названиях
-        dt_utc = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-        dt_et = dt_utc - timedelta(hours=5)
-        hour = dt_et.hour
-        minute = dt_et.minute
-        day = dt_et.day
-        
-        ampm = "AM" if hour < 12 else "PM"
-        hour_12 = hour if hour <= 12 else hour - 12
-        if hour_12 == 0:
-            hour_12 = 12
-        
-        month = dt_et.strftime("%B")
-        time_str = f"{month} {day}, {hour_12}:{minute:02d} {ampm}"
+        markets = gamma.list_markets(limit=100)
         
-        print(f"Ищем по времени: {time_str}")
-        
-        url = f"https://gamma-api.polymarket.com/markets?limit=100"
-        resp = requests.get(url, timeout=10)
-        
-        if resp.status_code == 200:
-            markets = resp.json()
-            
-            for market in markets:
-                question = market.get('question', '')
-                if coin in question and "15 min" in question.lower() and time_str in question:
-                    print(f"✅ Найден по времени: {question}")
-                    return market
+        for market in markets:
+            question = market.get('question', '')
+            if series.question_matches(question, timestamp):
+                print(f"✅ Найден по времени: {question}")
+                return MarketSnapshot.from_market(market)
         
         return None
     except Exception as e:
         print(f"Ошибка получения рынка по timestamp: {e}")
         return None
 
-def get_interval_result(coin, minutes_ago):
+def get_interval_result(series, intervals_ago):
     """
-    Получает результат для интервала, который был minutes_ago минут назад
+    Получает результат для интервала серии, который был intervals_ago интервалов назад
     """
     try:
-        print(f"\n=== Получение результата для {coin}, {minutes_ago} минут назад ===")
+        print(f"\n=== Получение результата для {series.key}, интервал -{intervals_ago} ===")
         
         # Получаем timestamp на основе UTC
-        timestamp, interval_time_et = get_interval_timestamp(coin, minutes_ago)
+        timestamp, interval_time_et = get_interval_timestamp(series, intervals_ago)
         
         # Получаем рынок
-        market = get_market_by_timestamp(coin, timestamp)
+        market = get_market_by_timestamp(series, timestamp)
         
         if not market:
             print(f"❌ Рынок для интервала не найден")
             return None
         
         # Только проверка разрешен ли рынок, без проверки времени
-        if not is_market_resolved(market):
+        if not market.resolved:
             print(f"⏳ Рынок для интервала еще не разрешен")
             return None
         
-        winner = get_winner(market)
+        winner = market.winner
         if winner:
             print(f"✅ Результат: {winner}")
+            if history_store:
+                history_store.add_interval(market.slug, series.asset, timestamp, winner, series.timeframe)
             return winner
         else:
             print(f"❌ Не удалось определить победителя")
@@ -456,24 +416,25 @@ def get_interval_result(coin, minutes_ago):
         print(f"Ошибка получения результата интервала: {e}")
         return None
 
-def determine_bet_direction(coin, state):
+def determine_bet_direction(series, shard):
     """
-    Определяет направление ставки на основе последних результатов и мартингейла
+    Определяет направление ставки серии на основе последних результатов и мартингейла
     Возвращает (direction, bet_amount) или (None, None)
     """
+    coin = series.asset
     print(f"\n{'='*50}")
-    print(f"АНАЛИЗ ДЛЯ {coin}")
+    print(f"АНАЛИЗ ДЛЯ {series.key}")
     print(f"{'='*50}")
     
     # Проверяем, есть ли активная ставка
     bet_key = f"{coin}_last"
-    if bet_key in state.get("pending_bets", {}):
+    if bet_key in shard.state["pending_bets"]:
         print(f"⏸️ Есть активная ставка, ждем ее завершения")
         return None, None
     
     # Проверяем мартингейл (были ли проигрыши подряд)
-    if coin in state["martingale"]:
-        martingale = state["martingale"][coin]
+    if coin in shard.state["martingale"]:
+        martingale = shard.state["martingale"][coin]
         print(f"📉 Продолжаем серию мартингейла:")
         print(f"   Направление: {martingale['direction']}")
         print(f"   Ставка: ${martingale['next_bet']}")
@@ -481,12 +442,13 @@ def determine_bet_direction(coin, state):
         return martingale['direction'], martingale['next_bet']
     
     # Получаем результаты последних двух интервалов для начала новой серии
-    result_minus_1 = get_interval_result(coin, 15)  # Предыдущий (15 мин назад)
-    result_minus_2 = get_interval_result(coin, 30)  # Позапрошлый (30 мин назад)
+    with metrics.span("resolution_check"):
+        result_minus_1 = get_interval_result(series, 1)  # Предыдущий
+        result_minus_2 = get_interval_result(series, 2)  # Позапрошлый
     
-    print(f"\n📊 Результаты анализа:")
-    print(f"   Интервал -1 (15 мин назад): {result_minus_1 if result_minus_1 else 'Нет данных'}")
-    print(f"   Интервал -2 (30 мин назад): {result_minus_2 if result_minus_2 else 'Нет данных'}")
+    print(f"\n📊 Результаты анализа {series.key}:")
+    print(f"   Интервал -1: {result_minus_1 if result_minus_1 else 'Нет данных'}")
+    print(f"   Интервал -2: {result_minus_2 if result_minus_2 else 'Нет данных'}")
     
     # Если два последних исхода одинаковые - начинаем новую серию
     if result_minus_1 and result_minus_2 and result_minus_1 == result_minus_2:
@@ -498,46 +460,40 @@ def determine_bet_direction(coin, state):
     print(f"\n⏸️ Нет двух одинаковых исходов подряд, пропускаем ставку")
     return None, None
 
-def place_bet(client, coin, direction, bet_amount, state):
-    """Размещает ставку на текущий интервал"""
+def place_bet(client, series, direction, bet_amount, state):
+    """Размещает ставку на текущий интервал серии. Возвращает (успех, поля ордера для pending_bets)"""
+    label = series.key
     try:
         print(f"\n{'='*50}")
-        print(f"РАЗМЕЩЕНИЕ СТАВКИ {coin} {direction}")
+        print(f"РАЗМЕЩЕНИЕ СТАВКИ {label} {direction}")
         print(f"{'='*50}")
         
         # Получаем правильный timestamp для текущего интервала
-        timestamp, interval_time_et = get_current_interval_timestamp(coin)
+        timestamp, interval_time_et = get_interval_timestamp(series)
         
         print(f"Интервал ET для ставки: {interval_time_et.hour}:{interval_time_et.minute:02d}")
         
         # Получаем рынок
-        market = get_market_by_timestamp(coin, timestamp)
+        market = get_market_by_timestamp(series, timestamp)
         
         if not market:
-            print(f"❌ {coin} → рынок для текущего интервала не найден")
+            print(f"❌ {label} → рынок для текущего интервала не найден")
             return False, None
         
-        print(f"Найден рынок: {market.get('question')}")
+        print(f"Найден рынок: {market.question}")
         
-        if is_market_resolved(market):
-            print(f"❌ {coin} → рынок уже разрешен, нельзя ставить")
+        if market.resolved:
+            print(f"❌ {label} → рынок уже разрешен, нельзя ставить")
             return False, None
         
-        clob_ids = market.get("clobTokenIds", [])
-        if isinstance(clob_ids, str):
-            try:
-                clob_ids = json.loads(clob_ids)
-            except:
-                clob_ids = []
-        
-        if len(clob_ids) < 2:
-            print(f"❌ {coin} → нет токенов для торговли")
+        if not market.tradable:
+            print(f"❌ {label} → нет токенов для торговли")
             return False, None
         
-        token_id, price = get_token_id_and_price(market, direction)
+        token_id, price = market.token_and_price(direction)
         
         if token_id is None:
-            print(f"❌ {coin} → не удалось получить token ID для {direction}")
+            print(f"❌ {label} → не удалось получить token ID для {direction}")
             return False, None
         
         print(f"💰 Цена {direction}: {price:.4f}")
@@ -546,7 +502,11 @@ def place_bet(client, coin, direction, bet_amount, state):
             print(f"❌ Цена слишком высокая ({price:.4f} > {MAX_PRICE_FOR_OPPOSITE:.4f})")
             return False, None
         
-        current_balance = get_current_balance(state)
+        with metrics.span("balance_check"):
+            current_balance = get_current_balance(state)
+        if current_balance is None:
+            print("❌ Не удалось проверить баланс, ставка отменена")
+            return False, None
         print(f"💵 Текущий баланс: ${current_balance:.2f}")
         
         if current_balance < bet_amount:
@@ -557,10 +517,14 @@ def place_bet(client, coin, direction, bet_amount, state):
             print("🧪 ТЕСТОВЫЙ РЕЖИМ: ставка не отправляется на биржу")
             mock_order_id = f"test_order_{int(time.time())}"
             print(f"✅ Тестовая ставка размещена (ID: {mock_order_id})")
-            return True, mock_order_id
+            return True, order_tracker.order_record(mock_order_id, token_id, price, bet_amount)
         else:
+            # Стек подписи нужен только для реального ордера
+            from py_clob_client.clob_types import OrderArgs, OrderType
+            from py_clob_client.order_builder.constants import BUY
+            
             bet_price = min(0.99, price + PRICE_BUFFER)
-            print(f"📤 Размещаем реальный ордер: {coin} {direction}, цена {bet_price:.4f}, размер ${bet_amount}")
+            print(f"📤 Размещаем реальный ордер: {label} {direction}, цена {bet_price:.4f}, размер ${bet_amount}")
             
             order_args = OrderArgs(
                 token_id=token_id,
@@ -569,18 +533,26 @@ def place_bet(client, coin, direction, bet_amount, state):
                 size=bet_amount
             )
             
-            signed = client.create_order(order_args)
-            resp = client.post_order(signed, OrderType.GTC)
+            with metrics.span("sign_order"):
+                signed = client.create_order(order_args)
+            with metrics.span("post_order"):
+                resp = client.post_order(signed, OrderType.GTC)
+            balances.refresh()
             
             print(f"Ответ от биржи: {resp}")
             
+            order_id = None
             if isinstance(resp, dict):
-                if "id" in resp:
-                    return True, resp["id"]
+                if resp.get("orderID"):
+                    order_id = resp["orderID"]
+                elif "id" in resp:
+                    order_id = resp["id"]
                 elif resp.get("status") in ("success", "placed"):
-                    return True, resp.get("order", {}).get("id")
+                    order_id = resp.get("order", {}).get("id")
             
-            return False, None
+            if not order_id:
+                return False, None
+            return True, order_tracker.order_record(order_id, token_id, bet_price, bet_amount, resp)
         
     except Exception as e:
         print(f"❌ Ошибка при размещении ставки: {e}")
@@ -588,29 +560,220 @@ def place_bet(client, coin, direction, bet_amount, state):
         traceback.print_exc()
         return False, None
 
+# ========== ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА СЕРИЙ ==========
+
+async def process_series(client, series, shard, state, semaphore, state_lock, reserved, utc5_now):
+    """Анализ и ставка для одной серии.
+
+    Сетевые вызовы идут в потоках (asyncio.to_thread), изменения state -
+    только под state_lock. Сумма уже отправляемых ставок резервируется,
+    чтобы параллельные серии не потратили один и тот же баланс.
+    """
+    async with semaphore:
+        direction, bet_amount = await asyncio.to_thread(determine_bet_direction, series, shard)
+        
+        if not direction or not bet_amount:
+            return
+        
+        coin = series.asset
+        bet_key = f"{coin}_last"
+        
+        # Баланс запрашивается до state_lock, чтобы серии не ждали RPC друг
+        # друга; под блокировкой - только вычет резерва параллельных ставок
+        current_balance = await asyncio.to_thread(get_current_balance, state)
+        if current_balance is None:
+            print(f"❌ Не удалось проверить баланс для {series.key}")
+            return
+        async with state_lock:
+            current_balance -= reserved["amount"]
+            if current_balance < bet_amount:
+                print(f"❌ Недостаточно средств для {series.key}: баланс ${current_balance:.2f}, нужно ${bet_amount}")
+                return
+            reserved["amount"] += bet_amount
+        
+        try:
+            with metrics.span("place_bet"):
+                success, order = await asyncio.to_thread(place_bet, client, series, direction, bet_amount, state)
+        finally:
+            async with state_lock:
+                reserved["amount"] -= bet_amount
+        
+        if not success:
+            return
+        
+        async with state_lock:
+            now_str = utc5_now.strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Определяем, новая это серия или продолжение
+            if coin in shard.state["martingale"]:
+                series_info = f"(продолжение серии, {shard.state['martingale'][coin]['losses_count']} проигрыш)"
+            else:
+                series_info = "(новая серия)"
+            
+            msg = f"💰 Ставка: {coin} {series.timeframe} → {direction} | ${bet_amount:.1f} {series_info}"
+            if TEST_MODE:
+                msg = "🧪 [ТЕСТ] " + msg
+            print(msg)
+            
+            timestamp, _ = get_interval_timestamp(series)
+            
+            shard.state["pending_bets"][bet_key] = {
+                "slug": series.slug(timestamp),
+                "ends_at": timestamp + series.seconds,
+                "direction": direction,
+                "amount": bet_amount,
+                "placed_at": now_str,
+                **order
+            }
+            save_shard(shard, "bet_placed", [["set", ["pending_bets", bet_key], shard.state["pending_bets"][bet_key]]])
+        
+        await asyncio.to_thread(send_telegram, msg)
+
+async def run_series_async(client, state, shards, due, utc5_now):
+    """Обрабатывает серии due одновременно (не больше MAX_CONCURRENT_SERIES сразу)"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SERIES)
+    state_lock = asyncio.Lock()
+    reserved = {"amount": 0.0}
+    results = await asyncio.gather(
+        *(process_series(client, series, shards[series.key], state, semaphore, state_lock, reserved, utc5_now)
+          for series in due),
+        return_exceptions=True
+    )
+    for series, result in zip(due, results):
+        if isinstance(result, Exception):
+            print(f"❌ Ошибка обработки {series.key}: {result}")
+
 # ========== ГЛАВНАЯ ФУНКЦИЯ ==========
 
+def pending_view(shards):
+    """Активные ставки всех серий одним словарем: "{серия}/{ключ ставки}" -> запись.
+
+    Записи те же, что в шардах, поэтому ордера и сделки всех серий
+    проверяются одним запросом, а изменения сохраняет save_pending.
+    """
+    return {f"{key}/{bet_key}": info
+            for key, shard in shards.items()
+            for bet_key, info in shard.state["pending_bets"].items()}
+
+def save_pending(shards, view_key, event):
+    key, bet_key = view_key.split("/", 1)
+    shard = shards[key]
+    save_shard(shard, event, [["set", ["pending_bets", bet_key], shard.state["pending_bets"][bet_key]]])
+
+def track_pending_orders(client, shards):
+    """Исполнение ордеров ставок всех серий (один запрос).
+
+    Разовый прогон начинается после закрытия прошлого интервала, поэтому
+    остаток не снимается (cancel_before_lock - только в демоне bot.py).
+    """
+    pending = pending_view(shards)
+    try:
+        changed = order_tracker.poll_orders(client, pending)
+    except Exception as e:
+        print(f"❌ Ошибка проверки ордеров: {e}")
+        return
+    for key in changed:
+        info = pending[key]
+        print(f"📋 Ордер {key}: {info['order_status']}, исполнено {info['filled']} из {info['size']}")
+        save_pending(shards, key, "order_update")
+
+def reconcile_fills(client, state, shards):
+    """Цена и объем ставок по фактическим сделкам, только новые сделки после курсора"""
+    pending = pending_view(shards)
+    try:
+        changed, cursor = order_tracker.reconcile_trades(client, pending, state.get("trade_cursor"))
+    except Exception as e:
+        print(f"Ошибка сверки сделок: {e}")
+        return
+    for key in changed:
+        info = pending[key]
+        print(f"🧾 Сделки {key}: исполнено {info['filled']} по средней цене {info['price']}")
+        save_pending(shards, key, "trade_fills")
+    if cursor != state.get("trade_cursor"):
+        state["trade_cursor"] = cursor
+        save_state(state, "trade_cursor", [["set", ["trade_cursor"], cursor]])
+
+def settle_pending_bets(state, shards):
+    """Проверяет разрешение рынков активных ставок всех серий и записывает результаты"""
+    for shard in shards.values():
+        series = shard.series
+        pending = shard.state["pending_bets"]
+        for bet_key in list(pending.keys()):
+            info = pending[bet_key]
+            slug = info["slug"]
+            direction = info["direction"]
+            coin = series.asset
+            label = f"{coin} {series.timeframe}"
+            
+            print(f"Проверка ставки: {series.key}/{bet_key}")
+            
+            status = info.get("order_status")
+            if status in order_tracker.OPEN_STATUSES:
+                print(f"   Ордер еще в стакане ({status}), ждем")
+                continue
+            if order_tracker.never_filled(info):
+                msg = f"⚪ Ордер {label} → {direction} не исполнен и снят, ставки не было"
+                print(msg)
+                send_telegram(msg)
+                del pending[bet_key]
+                save_shard(shard, "pending_removed", [["del", ["pending_bets", bet_key]]])
+                continue
+            
+            # Реальная позиция: исполненный объем по цене исполнения
+            cost, payout = order_tracker.bet_exposure(info)
+            stake = order_tracker.bet_stake(info)
+            
+            m = get_market(slug)
+            if m and m.resolved:
+                w = m.winner
+                if w:
+                    if w == direction:
+                        # Выигрыш
+                        profit = payout - cost
+                        msg = f"✅ Выиграна ставка {label} → {direction} | +${profit:.2f}"
+                        print(msg)
+                        send_telegram(msg)
+                        update_statistics(state, series, "win", profit, stake, direction, slug, w)
+                    else:
+                        # Проигрыш
+                        profit = -cost
+                        msg = f"❌ Проиграна ставка {label} → {direction} | убыток -${cost:.2f}"
+                        print(msg)
+                        send_telegram(msg)
+                        update_statistics(state, series, "loss", profit, stake, direction, slug, w)
+                    update_martingale(shard, coin, profit, stake, direction)
+                    update_last_result(shard, coin, w)
+                    
+                    del pending[bet_key]
+                    save_shard(shard, "pending_removed", [["del", ["pending_bets", bet_key]]])
+                    
+                    # Отправляем обновленный баланс
+                    new_balance = get_current_balance(state)
+                    if new_balance is not None:
+                        send_telegram(f"💰 Баланс: ${new_balance:.2f}")
+
 def main():
     print("Запуск бота Polymarket...")
     et_now = get_current_et_time()
     utc5_now = datetime.now(timezone(timedelta(hours=5)))
     print(f"Время ET: {et_now.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Время сервера (UTC+5): {utc5_now.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Интервал: 15 минут")
-    
-    client = ClobClient(
-        host=HOST,
-        key=PRIVATE_KEY,
-        chain_id=CHAIN_ID,
-        signature_type=1,
-        funder=None
-    )
-
-    generated_address = client.get_address()
-    print(f"Адрес из приватного ключа: {generated_address}")
-    print(f"Реальный адрес кошелька: {REAL_WALLET_ADDRESS}")
-    
-    state = load_state()
+    print(f"Серии: {', '.join(series.key for series in SERIES)}")
+    metrics.record("startup", time.perf_counter() - STARTED_AT)
+    
+    # py_clob_client импортируется, а API creds загружаются (CREDS_CACHE_FILE)
+    # только при первом запросе к бирже - в тестовом режиме ни разу
+    client = ClobSession(HOST, PRIVATE_KEY, CHAIN_ID, CREDS_CACHE_FILE,
+                         signature_type=1, funder=None, metrics=metrics)
+    # Серии разных таймфреймов начинают интервал в разное время
+    due = [series for series in SERIES if series.is_boundary()]
+    if due and not TEST_MODE:
+        # Импорт py_clob_client и creds - параллельно с проверкой рынков
+        client.warm_up()
+    
+    with metrics.span("state_load"):
+        state = load_state()
+        shards = load_shards(state)
     
     # Проверка баланса
     print("\n=== ПРОВЕРКА БАЛАНСА ===")
@@ -624,15 +787,6 @@ def main():
     print(f"💰 Текущий баланс: ${current_balance:.2f}")
     send_telegram(f"💰 Баланс: ${current_balance:.2f}")
 
-    try:
-        api_creds = client.create_or_derive_api_creds()
-        client.set_api_creds(api_creds)
-        print("✅ API creds получены")
-    except Exception as e:
-        print("❌ Ошибка API creds:", str(e))
-        send_telegram(f"❌ Ошибка API creds: {str(e)}")
-        return
-
     # Проверка полночи для статистики
     if check_midnight():
         print("\n" + "="*50)
@@ -645,14 +799,15 @@ def main():
         
         # Информация о текущих сериях мартингейла
         martingale_info = ""
-        for coin, mg in state["martingale"].items():
-            martingale_info += f"\n{coin}: {mg['losses_count']} проигрышей, следующая ${mg['next_bet']} на {mg['direction']}"
+        for shard in shards.values():
+            for coin, mg in shard.state["martingale"].items():
+                martingale_info += f"\n{coin} {shard.series.timeframe}: {mg['losses_count']} проигрышей, следующая ${mg['next_bet']} на {mg['direction']}"
         
         msg = f"""📊 <b>Статистика за 6 часов:</b>
 💰 Профит: ${six_hours['profit']:.2f}
 🎲 Ставок: {six_hours['bets']} | ✅ {six_hours['wins']} | ❌ {six_hours['losses']}
 📈 Винрейт: {six_hours['win_rate']:.1f}%
-💰 Баланс: ${get_current_balance(state):.2f}
+💰 Баланс: ${current_balance:.2f}
 
 📊 <b>Статистика за 24 часа:</b>
 💰 Профит: ${daily['profit']:.2f}
@@ -669,114 +824,59 @@ def main():
         print(msg)
         send_telegram(msg)
     
+    # Все рынки прогона одним запросом
+    prefetch_run_markets(shards)
+    
     # Проверка результатов текущих ставок
     print("\n" + "="*50)
     print("ПРОВЕРКА ТЕКУЩИХ СТАВОК")
     print("="*50)
     
-    for coin_key in list(state.get("pending_bets", {}).keys()):
-        info = state["pending_bets"][coin_key]
-        slug = info["slug"]
-        direction = info["direction"]
-        amount = info["amount"]
-        price = info.get("price", 0.5)
-        coin = coin_key.split('_')[0]
-        
-        print(f"Проверка ставки: {coin_key}")
-        
-        m = get_market(slug)
-        if m and is_market_resolved(m):
-            w = get_winner(m)
-            if w:
-                if w == direction:
-                    # Выигрыш
-                    profit = amount * (1 / price - 1) if price > 0 else 0
-                    msg = f"✅ Выиграна ставка {coin_key} → {direction} | +${profit:.2f}"
-                    print(msg)
-                    send_telegram(msg)
-                    update_statistics(state, coin, "win", profit, amount, direction)
-                    update_last_result(state, coin, w)
-                    
-                else:
-                    # Проигрыш
-                    profit = -amount
-                    msg = f"❌ Проиграна ставка {coin_key} → {direction} | убыток -${amount:.2f}"
-                    print(msg)
-                    send_telegram(msg)
-                    update_statistics(state, coin, "loss", -amount, amount, direction)
-                    update_last_result(state, coin, w)
-                
-                del state["pending_bets"][coin_key]
-                save_state(state)
-                
-                # Отправляем обновленный баланс
-                new_balance = get_current_balance(state)
-                send_telegram(f"💰 Баланс: ${new_balance:.2f}")
+    if not TEST_MODE:
+        with metrics.span("order_tracking"):
+            track_pending_orders(client, shards)
+        with metrics.span("trade_reconcile"):
+            reconcile_fills(client, state, shards)
+    with metrics.span("settlement"):
+        settle_pending_bets(state, shards)
 
     # Проверка нового интервала
     print("\n" + "="*50)
-    print("ПРОВЕРКА НОВОГО 15-МИНУТНОГО ИНТЕРВАЛА")
+    print("ПРОВЕРКА НОВЫХ ИНТЕРВАЛОВ")
     print("="*50)
     
-    if is_new_interval(15):
-        print("✅ НАЧАЛО ИНТЕРВАЛА - выполняем анализ...")
+    if due:
+        print(f"✅ НАЧАЛО ИНТЕРВАЛА: {', '.join(series.key for series in due)} - выполняем анализ...")
         
-        for coin in ["BTC", "ETH"]:
-            direction, bet_amount = determine_bet_direction(coin, state)
-            
-            if not direction or not bet_amount:
-                continue
-            
-            bet_key = f"{coin}_last"
-            
-            # Проверяем баланс
-            current_balance = get_current_balance(state)
-            if current_balance < bet_amount:
-                print(f"❌ Недостаточно средств для {coin}: баланс ${current_balance:.2f}, нужно ${bet_amount}")
-                continue
-            
-            success, order_id = place_bet(client, coin, direction, bet_amount, state)
-            
-            if success:
-                now_str = utc5_now.strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Определяем, новая это серия или продолжение
-                if coin in state["martingale"]:
-                    series_info = f"(продолжение серии, {state['martingale'][coin]['losses_count']} проигрыш)"
-                else:
-                    series_info = "(новая серия)"
-                
-                msg = f"💰 Ставка: {coin} 15m → {direction} | ${bet_amount:.1f} {series_info}"
-                if TEST_MODE:
-                    msg = "🧪 [ТЕСТ] " + msg
-                print(msg)
-                send_telegram(msg)
-                
-                if "pending_bets" not in state:
-                    state["pending_bets"] = {}
-                
-                timestamp, _ = get_current_interval_timestamp(coin)
-                
-                state["pending_bets"][bet_key] = {
-                    "slug": f"{coin.lower()}-updown-15m-{timestamp}",
-                    "direction": direction,
-                    "amount": bet_amount,
-                    "price": 0.5,
-                    "placed_at": now_str
-                }
-                save_state(state)
+        with metrics.span("series"):
+            asyncio.run(run_series_async(client, state, shards, due, utc5_now))
     else:
         current_minute = utc5_now.minute
-        et_hour = get_current_et_time().hour
-        et_minute = get_current_et_time().minute
-        next_interval = ((et_minute // 15) + 1) * 15
-        if next_interval >= 60:
-            next_interval = 0
-        print(f"⏳ Сейчас {current_minute} минут, ET {et_hour}:{et_minute:02d}, следующий интервал в {et_hour}:{next_interval:02d}")
-    
+        et_now = get_current_et_time()
+        nearest = min(SERIES, key=lambda series: series.next_start())
+        next_interval = interval_calendar.to_et(nearest.next_start())
+        print(f"⏳ Сейчас {current_minute} минут, ET {et_now.hour}:{et_now.minute:02d}, следующий интервал {nearest.key} в {next_interval.hour}:{next_interval.minute:02d}")
+    
+    market_cache.save()
+    # Очередь Telegram дописывается до выгрузки метрик, чтобы в них попали
+    # время отправки (span telegram) и число отправленных пачек
+    notifier.close()
+    
+    print(f"\n{gamma.latency_summary()}")
+    print(market_cache.summary())
+    print(balances.summary())
+    print(client.summary())
+    print(notifier.summary())
+    metrics.record("total", time.perf_counter() - STARTED_AT)
+    metrics.print_summary(metrics.export())
     print("\n" + "="*50)
     print("Бот завершил работу")
     print("="*50)
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # Демон и прерванный прогон: очередь Telegram дописывается с
+        # ограничением по времени (после close() в main() ничего не делает)
+        notifier.close()
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backtest
+
+
+def test_bet_sizes_are_shares():
+    # Up, Up -> ставка Down по 0.40 (+ буфер 0.01): 2 акции стоят $0.82
+    outcomes = np.array([1, 1, -1], dtype=np.int8)
+    up = np.array([0.5, 0.5, 0.6])
+    down = np.array([0.5, 0.5, 0.4])
+    result = backtest.run_backtest(outcomes, up, down, base_bet=2.0, price_buffer=0.01)
+
+    assert result["bets"] == 1 and result["wins"] == 1
+    assert result["profit"] == pytest.approx(2.0 - 2.0 * 0.41)
+    assert result["max_capital_at_risk"] == pytest.approx(2.0 * 0.41)
+
+
+def test_price_cap_applies_only_to_down():
+    # Ставка Up по 0.70 проходит, ставка Down по 0.70 - нет (порог 1/1.7)
+    outcomes = np.array([-1, -1, 1, 1, 1], dtype=np.int8)
+    up = np.array([0.5, 0.5, 0.7, 0.5, 0.3])
+    down = np.array([0.5, 0.5, 0.3, 0.5, 0.7])
+    result = backtest.run_backtest(outcomes, up, down, base_bet=1.0, price_buffer=0.0)
+
+    assert result["bets"] == 1 and result["wins"] == 1
+    assert result["skipped_by_price"] == 1
+
+
+def test_loaders_without_entry_prices_are_reported(tmp_path):
+    path = tmp_path / "outcomes.csv"
+    path.write_text("timestamp,outcome\n0,Up\n900,Down\n")
+    outcomes, up, down = backtest.load_data(str(path))
+
+    assert backtest.missing_entry_prices(outcomes, up, down) == 2
+    assert backtest.run_backtest(outcomes, up, down)["bets"] == 0
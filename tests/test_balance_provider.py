@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balance_provider import BalanceProvider
+
+
+class FakeProvider(BalanceProvider):
+    def __init__(self, results):
+        super().__init__("0x" + "11" * 20)
+        self.results = list(results)
+
+    def fetch(self):
+        self.fetches += 1
+        return self.results.pop(0)
+
+
+def test_available_is_min_of_balance_and_allowance():
+    provider = FakeProvider([(10.0, 4.0)])
+    assert provider.available() == 4.0
+    assert provider.available() == 4.0
+    assert provider.fetches == 1
+
+
+def test_refresh_refetches_after_order():
+    provider = FakeProvider([(10.0, 10.0), (7.5, 10.0)])
+    assert provider.available() == 10.0
+    assert provider.refresh() == (7.5, 10.0)
+    assert provider.available() == 7.5
+    assert provider.fetches == 2
+
+
+def test_refresh_error_leaves_cache_empty():
+    provider = FakeProvider([(10.0, 10.0)])
+    provider.available()
+    assert provider.refresh() is None
+    assert provider.cached is None
@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from market_cache import MarketCache
+
+
+def closed_market(slug):
+    return {
+        "slug": slug,
+        "question": f"{slug}?",
+        "outcomePrices": '["1", "0"]',
+        "clobTokenIds": '["up-token", "down-token"]',
+        "closed": True,
+        "umaResolutionStatus": "resolved",
+        "description": "x" * 500,
+    }
+
+
+def test_only_snapshot_fields_are_saved(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = MarketCache(path)
+    cache.put("btc-1", closed_market("btc-1"))
+    cache.save()
+
+    with open(path) as f:
+        entry = json.load(f)["markets"]["btc-1"]
+    assert set(entry) == {"snapshot", "last_used"}
+    assert "description" not in entry["snapshot"]
+
+    snapshot = MarketCache(path).lookup("btc-1")
+    assert snapshot.winner == "Up" and snapshot.final
+    assert snapshot.up_token == "up-token"
+
+
+def test_read_only_hit_does_not_rewrite_file(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = MarketCache(path)
+    cache.put("btc-1", closed_market("btc-1"))
+    cache.save()
+
+    cache = MarketCache(path)
+    assert cache.lookup("btc-1") is not None
+    assert not cache.dirty
+
+
+def test_legacy_gamma_entries_are_converted(tmp_path):
+    path = str(tmp_path / "cache.json")
+    with open(path, "w") as f:
+        json.dump({"markets": {"btc-1": {"market": closed_market("btc-1"), "cached_at": 1, "last_used": 2e9}}}, f)
+
+    cache = MarketCache(path)
+    assert cache.dirty
+    cache.save()
+    with open(path) as f:
+        assert "market" not in json.load(f)["markets"]["btc-1"]
+    assert MarketCache(path).lookup("btc-1").winner == "Up"
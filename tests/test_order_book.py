@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_book import BookFeed
+
+
+def subscribed(feed):
+    message = feed.subscription()
+    return message["assets_ids"] if message else []
+
+
+def test_three_series_and_pending_bets_stay_subscribed():
+    feed = BookFeed()
+    pending = ["btc-15m-bet", "eth-5m-bet"]
+    feed.subscribe(pending)
+    # Подготовка следующего интервала трех серий (prepare_series_orders)
+    series_tokens = [["btc-up", "btc-down"], ["eth-up", "eth-down"], ["sol-up", "sol-down"]]
+    for tokens in series_tokens:
+        feed.subscribe(tokens)
+
+    assert subscribed(feed) == pending + [t for tokens in series_tokens for t in tokens]
+
+
+def test_settled_and_unused_tokens_are_released():
+    feed = BookFeed()
+    feed.subscribe(["btc-15m-bet", "eth-5m-bet"])
+    feed.subscribe(["btc-up", "btc-down", "eth-up", "eth-down", "sol-up", "sol-down"])
+    feed.books["btc-15m-bet"] = object()
+
+    # Ставка BTC рассчитана, на границе поставили ETH Up
+    feed.unsubscribe(["btc-15m-bet"])
+    feed.retain(["eth-5m-bet", "eth-up"])
+
+    assert subscribed(feed) == ["eth-5m-bet", "eth-up"]
+    assert "btc-15m-bet" not in feed.books
+
+
+def test_subscribe_ignores_duplicates_and_empty_tokens():
+    feed = BookFeed()
+    feed.subscribe(["a", None, "a", "b"])
+    feed.subscribe(["b", ""])
+
+    assert subscribed(feed) == ["a", "b"]
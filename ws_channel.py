@@ -0,0 +1,106 @@
+import json
+import time
+import threading
+
+# ================== НАСТРОЙКИ ==================
+
+WS_HOST = "wss://ws-subscriptions-clob.polymarket.com/ws"
+PING_PERIOD = 10          # сервер закрывает соединение без PING
+RECV_TIMEOUT = 1.0        # как часто поток проверяет остановку и смену подписки
+CONNECT_TIMEOUT = 5
+RECONNECT_MIN = 1
+RECONNECT_MAX = 30
+
+# ========== ПОТОК WEBSOCKET-КАНАЛА CLOB ==========
+#
+# Общий цикл для каналов market и user: подключение, сообщение подписки,
+# PING каждые PING_PERIOD сек, переподключение с удвоением паузы.
+# websocket-client импортируется только в потоке - без него бот работает
+# по REST, как раньше.
+
+class ChannelFeed(threading.Thread):
+    """Поток канала CLOB. Наследник задает subscription() и handle_message()"""
+
+    label = "WS"
+
+    def __init__(self, url, name):
+        super().__init__(name=name, daemon=True)
+        self.url = url
+        self.lock = threading.Lock()
+        self.updated = threading.Condition(self.lock)
+        self.resubscribe = threading.Event()
+        self.stop_event = threading.Event()
+        self.connected = False
+        self.messages = 0
+        self.reconnects = 0
+
+    def subscription(self):
+        """Сообщение подписки или None, если подписываться пока не на что"""
+        raise NotImplementedError
+
+    def handle_message(self, raw):
+        raise NotImplementedError
+
+    def on_disconnect(self):
+        """Вызывается под self.lock после потери соединения"""
+
+    def _disconnected(self):
+        with self.updated:
+            self.connected = False
+            self.on_disconnect()
+            self.updated.notify_all()
+
+    def run(self):
+        try:
+            import websocket
+        except ImportError:
+            print(f"[{self.label}] websocket-client не установлен, работаем по REST")
+            return
+
+        delay = RECONNECT_MIN
+        while not self.stop_event.is_set():
+            self.resubscribe.clear()
+            message = self.subscription()
+            if message is None:
+                self.resubscribe.wait(RECV_TIMEOUT)
+                continue
+
+            ws = None
+            try:
+                ws = websocket.create_connection(self.url, timeout=CONNECT_TIMEOUT)
+                ws.settimeout(RECV_TIMEOUT)
+                ws.send(json.dumps(message))
+                with self.updated:
+                    self.connected = True
+                last_ping = time.time()
+                # Смена подписки - переподключение с новым сообщением подписки
+                while not self.stop_event.is_set() and not self.resubscribe.is_set():
+                    try:
+                        raw = ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        raw = None
+                    if raw and raw not in ("PONG", "PING"):
+                        self.handle_message(raw)
+                    if time.time() - last_ping >= PING_PERIOD:
+                        ws.send("PING")
+                        last_ping = time.time()
+                delay = RECONNECT_MIN
+            except Exception as e:
+                print(f"[{self.label}] Соединение потеряно: {e}")
+                self.reconnects += 1
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+            finally:
+                self._disconnected()
+                if ws is not None:
+                    try:
+                        ws.close()
+                    except Exception:
+                        pass
+
+    def stop(self):
+        self.stop_event.set()
+        self.resubscribe.set()
+
+    def summary(self):
+        return f"{self.label}: сообщений {self.messages}, переподключений {self.reconnects}"